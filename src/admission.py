@@ -0,0 +1,196 @@
+"""
+Admission Control
+Giới hạn số message được xử lý đồng thời (toàn cục, theo user, theo conversation)
+với hàng đợi có giới hạn, để một đợt burst không tạo ra vô hạn lời gọi Backend/LLM
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+
+from resilience import LatencyTracker
+from deadline import stage_timeout
+
+logger = logging.getLogger(__name__)
+
+# Lý do từ chối
+REJECT_QUEUE_FULL = "queue_full"
+REJECT_QUEUE_TIMEOUT = "queue_timeout"
+REJECT_USER_LIMIT = "user_limit"
+REJECT_CONVERSATION_LIMIT = "conversation_limit"
+
+
+class AdmissionRejected(Exception):
+    """Exception khi message bị từ chối vì hệ thống đang quá tải"""
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+class AdmissionController:
+    """
+    - Tối đa `max_concurrent` message được xử lý cùng lúc; message đến sau chờ
+      trong hàng đợi FIFO tối đa `max_queue` phần tử và `queue_timeout` giây
+    - Mỗi user / conversation chỉ có tối đa `max_per_user` / `max_per_conversation`
+      message đang chờ hoặc đang xử lý
+    - Vượt giới hạn → AdmissionRejected ngay lập tức (không chờ)
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = 50,
+        max_queue: int = 200,
+        queue_timeout: float = 10.0,
+        max_per_user: int = 2,
+        max_per_conversation: int = 3,
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_per_user = max_per_user
+        self.max_per_conversation = max_per_conversation
+
+        self._active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._per_user: Dict[str, int] = {}
+        self._per_conversation: Dict[str, int] = {}
+        self._wait_times = LatencyTracker()
+        self._stats: Dict[str, Any] = {
+            "admitted": 0,
+            "queued": 0,
+            "peak_active": 0,
+            "peak_queue_depth": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+            "rejected": {
+                REJECT_QUEUE_FULL: 0,
+                REJECT_QUEUE_TIMEOUT: 0,
+                REJECT_USER_LIMIT: 0,
+                REJECT_CONVERSATION_LIMIT: 0,
+            },
+        }
+
+    def _reject(self, reason: str, message: str) -> AdmissionRejected:
+        self._stats["rejected"][reason] += 1
+        logger.warning(f"Admission rejected ({reason}): active={self._active}, queue={len(self._waiters)}")
+        return AdmissionRejected(reason, message)
+
+    @asynccontextmanager
+    async def admit(self, user_id: Optional[str], conversation_id: Optional[str]) -> AsyncIterator[None]:
+        """
+        Chờ tới lượt xử lý message
+
+        Args:
+            user_id: User gửi message
+            conversation_id: Conversation chứa message
+
+        Raises:
+            AdmissionRejected: Nếu vượt giới hạn hoặc chờ quá lâu
+        """
+        if user_id and self._per_user.get(user_id, 0) >= self.max_per_user:
+            raise self._reject(
+                REJECT_USER_LIMIT,
+                "⏳ Bạn đang có câu hỏi đang được xử lý, vui lòng chờ câu trả lời trước khi hỏi tiếp."
+            )
+        if conversation_id and self._per_conversation.get(conversation_id, 0) >= self.max_per_conversation:
+            raise self._reject(
+                REJECT_CONVERSATION_LIMIT,
+                "⏳ Cuộc trò chuyện này đang có nhiều câu hỏi chờ xử lý, vui lòng thử lại sau giây lát."
+            )
+
+        _increment(self._per_user, user_id)
+        _increment(self._per_conversation, conversation_id)
+        try:
+            await self._acquire()
+            try:
+                yield
+            finally:
+                self._release()
+        finally:
+            _decrement(self._per_user, user_id)
+            _decrement(self._per_conversation, conversation_id)
+
+    async def _acquire(self) -> None:
+        if self._active < self.max_concurrent and not self._waiters:
+            self._take_slot(0.0)
+            return
+        if len(self._waiters) >= self.max_queue:
+            raise self._reject(
+                REJECT_QUEUE_FULL,
+                "⏳ Hệ thống đang xử lý quá nhiều yêu cầu, vui lòng thử lại sau ít phút."
+            )
+
+        # Không chờ quá thời gian còn lại của activity
+        timeout = stage_timeout("admission", self.queue_timeout)
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        self._stats["queued"] += 1
+        self._stats["peak_queue_depth"] = max(self._stats["peak_queue_depth"], len(self._waiters))
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(future, timeout=timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # Slot đã được chuyển cho request này đúng lúc timeout/cancel → trả lại
+                self._release()
+            else:
+                future.cancel()
+                try:
+                    self._waiters.remove(future)
+                except ValueError:
+                    pass
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._reject(
+                    REJECT_QUEUE_TIMEOUT,
+                    "⏳ Hệ thống đang bận, vui lòng thử lại sau ít phút."
+                )
+            raise
+        # Slot được chuyển trực tiếp từ request vừa xong (_active không đổi)
+        self._record_admitted(time.monotonic() - started)
+
+    def _take_slot(self, waited: float) -> None:
+        self._active += 1
+        self._record_admitted(waited)
+
+    def _record_admitted(self, waited: float) -> None:
+        self._stats["admitted"] += 1
+        self._stats["peak_active"] = max(self._stats["peak_active"], self._active)
+        self._stats["wait_seconds_total"] += waited
+        self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], waited)
+        self._wait_times.record(waited)
+
+    def _release(self) -> None:
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+        self._active -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Số message đang xử lý, độ dài hàng đợi, thời gian chờ và số lần từ chối"""
+        stats: Dict[str, Any] = dict(self._stats)
+        stats["rejected"] = dict(self._stats["rejected"])
+        stats["active"] = self._active
+        stats["queue_depth"] = len(self._waiters)
+        stats["wait_p50"] = self._wait_times.percentile(50)
+        stats["wait_p95"] = self._wait_times.percentile(95)
+        return stats
+
+
+def _increment(counts: Dict[str, int], key: Optional[str]) -> None:
+    if key:
+        counts[key] = counts.get(key, 0) + 1
+
+
+def _decrement(counts: Dict[str, int], key: Optional[str]) -> None:
+    if not key:
+        return
+    remaining = counts.get(key, 0) - 1
+    if remaining > 0:
+        counts[key] = remaining
+    else:
+        counts.pop(key, None)
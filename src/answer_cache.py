@@ -0,0 +1,196 @@
+"""
+Answer Cache
+Cache answer của Backend HR API theo câu hỏi đã chuẩn hoá, tenant và
+cờ cacheable do Backend trả về (TTL + giới hạn LRU)
+"""
+import logging
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from backend_models import HRQueryResponse
+
+logger = logging.getLogger(__name__)
+
+# Scope cache do Backend trả về trong metadata
+SCOPE_TENANT = "tenant"
+SCOPE_USER = "user"
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = re.compile(r"[\s?!.,;:…]+$")
+
+CacheKey = Tuple[str, str, str]
+
+
+def normalize_query(query: str) -> str:
+    """
+    Chuẩn hoá câu hỏi để các cách gõ khác nhau dùng chung cache
+    (Unicode NFC, không phân biệt hoa thường, gộp khoảng trắng, bỏ dấu câu cuối)
+    """
+    text = unicodedata.normalize("NFC", query or "").casefold()
+    text = _WHITESPACE.sub(" ", text).strip()
+    return _TRAILING_PUNCTUATION.sub("", text)
+
+
+def get_cache_policy(response: HRQueryResponse) -> Tuple[Optional[str], Optional[float]]:
+    """
+    Đọc chính sách cache từ response của Backend
+
+    Backend đánh dấu trong `metadata` (hoặc ở top-level):
+        "cacheable": true/false
+        "cache_scope": "tenant" | "public" | "user" | "personal" | "none"
+        "cache_ttl": số giây (optional)
+
+    Response không có cờ cacheable được coi là không cache được, để answer
+    mang thông tin cá nhân không bao giờ bị dùng chung.
+
+    Returns:
+        (scope, ttl) - scope None nghĩa là không cache
+    """
+    cacheable = response.cacheable
+    scope = response.cache_scope
+    ttl = response.cache_ttl
+
+    if cacheable is False or scope == "none":
+        return None, None
+    if scope in ("user", "personal"):
+        scope = SCOPE_USER
+    elif scope in ("tenant", "public") or cacheable is True:
+        scope = SCOPE_TENANT
+    else:
+        return None, None
+
+    try:
+        ttl = float(ttl) if ttl is not None else None
+    except (TypeError, ValueError):
+        ttl = None
+    return scope, ttl
+
+
+@dataclass
+class _CacheEntry:
+    response: HRQueryResponse
+    expires_at: float
+
+
+class AnswerCache:
+    """
+    Cache TTL + LRU cho answer của Backend
+
+    Key = (tenant_id, user_id hoặc "" nếu dùng chung cả tenant, câu hỏi đã chuẩn hoá).
+    Answer có scope "user" chỉ được trả lại cho chính user đó.
+    """
+
+    def __init__(self, max_entries: int = 5000, default_ttl: float = 600.0, max_ttl: float = 86400.0):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.max_ttl = max_ttl
+        self._entries: "OrderedDict[CacheKey, _CacheEntry]" = OrderedDict()
+        self._stats: Dict[str, int] = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "uncacheable": 0,
+            "expired": 0,
+            "evicted": 0,
+            "invalidations": 0,
+        }
+
+    def get(self, tenant_id: str, user_id: str, query: str) -> Optional[HRQueryResponse]:
+        """
+        Tìm answer đã cache (ưu tiên answer riêng của user, sau đó answer chung của tenant)
+
+        Returns:
+            Response đã cache hoặc None
+        """
+        normalized = normalize_query(query)
+        now = time.monotonic()
+        for key in ((tenant_id or "", user_id or "", normalized), (tenant_id or "", "", normalized)):
+            entry = self._entries.get(key)
+            if entry is None:
+                continue
+            if entry.expires_at <= now:
+                del self._entries[key]
+                self._stats["expired"] += 1
+                continue
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry.response
+        self._stats["misses"] += 1
+        return None
+
+    def put(self, tenant_id: str, user_id: str, query: str, response: HRQueryResponse) -> bool:
+        """
+        Lưu answer nếu Backend cho phép cache
+
+        Returns:
+            True nếu answer được cache
+        """
+        scope, ttl = get_cache_policy(response)
+        if scope is None or not response.answer:
+            self._stats["uncacheable"] += 1
+            return False
+        if scope == SCOPE_USER and not user_id:
+            self._stats["uncacheable"] += 1
+            return False
+
+        ttl = min(ttl if ttl is not None else self.default_ttl, self.max_ttl)
+        if ttl <= 0:
+            self._stats["uncacheable"] += 1
+            return False
+
+        key = (tenant_id or "", user_id if scope == SCOPE_USER else "", normalize_query(query))
+        self._entries[key] = _CacheEntry(response=response, expires_at=time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        self._stats["stores"] += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evicted"] += 1
+        return True
+
+    def invalidate(
+        self,
+        tenant_id: Optional[str] = None,
+        query: Optional[str] = None,
+        user_id: Optional[str] = None
+    ) -> int:
+        """
+        Xoá answer khỏi cache (ví dụ khi chính sách HR thay đổi)
+
+        Args:
+            tenant_id: Chỉ xoá answer của tenant này (optional)
+            query: Chỉ xoá answer của câu hỏi này (optional)
+            user_id: Chỉ xoá answer riêng của user này (optional)
+
+        Returns:
+            Số entry bị xoá
+        """
+        normalized = normalize_query(query) if query is not None else None
+        removed = 0
+        for key in list(self._entries):
+            if tenant_id is not None and key[0] != tenant_id:
+                continue
+            if user_id is not None and key[1] != user_id:
+                continue
+            if normalized is not None and key[2] != normalized:
+                continue
+            del self._entries[key]
+            removed += 1
+        self._stats["invalidations"] += removed
+        return removed
+
+    def clear(self) -> None:
+        """Xoá toàn bộ cache"""
+        self._stats["invalidations"] += len(self._entries)
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Thống kê hit rate và số entry"""
+        stats: Dict[str, Any] = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["entries"] = len(self._entries)
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
@@ -1,26 +1,85 @@
+import startup  # Import đầu tiên: mốc thời gian startup, bind port trước các import nặng
+
 import asyncio
+import hmac
 import os
-import logging
+import sys
+import time
+from contextlib import nullcontext
+from functools import lru_cache
+
+from config import Config
+
+import workers
+
+config = Config()
+
+# WORKERS > 1 → process này là supervisor: bind port rồi start các worker (chính file này), không import SDK
+if __name__ == "__main__" and config.WORKERS > 1 and workers.worker_slot() is None:
+    sys.exit(workers.run_supervisor(config))
+
+# Chạy trực tiếp → listen ngay, trước khi import Teams SDK/OpenAI (phần lớn thời gian cold start);
+# worker dùng socket supervisor đã bind
+early_listener = (
+    (workers.inherited_listener() or (startup.bind_listener(config.PORT) if config.STARTUP_EARLY_BIND else None))
+    if __name__ == "__main__"
+    else None
+)
+startup.mark("config")
 
-from azure.identity import ManagedIdentityCredential
-from microsoft.teams.ai import ChatPrompt, ListMemory
+from microsoft.teams.ai import ChatPrompt, ListMemory, Message
 from microsoft.teams.ai.ai_model import AIModel
 from microsoft.teams.apps import App, ActivityContext
-from microsoft.teams.openai import OpenAICompletionsAIModel
-from microsoft.teams.api import MessageActivity, MessageActivityInput, MessageSubmitActionInvokeActivity, InvokeActivity
+from microsoft.teams.api import MessageActivity, MessageActivityInput, MessageSubmitActionInvokeActivity, InvokeActivity, GetUserTokenParams
+
+from structured_logging import setup_logging, stop_logging, get_logger, get_logging_stats
+from fastapi import Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 
-from config import Config
 from backend_service import (
-    call_backend_hr_api,
     send_teams_token_to_backend,
+    start_backend_client,
+    close_backend_client,
     BackendServiceError,
-    AuthenticationError
+    AuthenticationError,
+    get_backend_client_stats,
+    get_backend_resilience_stats,
+    warm_backend_connections
+)
+from backend_models import HRQueryResponse, Source
+from backend_session import (
+    invalidate_session,
+    remember_session,
+    session_enabled,
+    stream_with_backend_session,
+    get_backend_session_stats
 )
+from json_codec import get_json_codec_stats
+import hr_query
+from hr_query import query_hr_backend, get_cached_answer, remember_answer
+from managed_identity import ManagedIdentityTokenProvider
+from conversation_store import ConversationStore, BoundedListMemory
+from conversation_storage import create_conversation_storage
+from summarizing_memory import SummarizingMemory, format_transcript, get_summarizing_memory_stats
+from resilience import CircuitBreaker
+from metrics import registry, request_outcomes, requests_in_flight, stage_duration, track_stage
+from admission import AdmissionController, AdmissionRejected
+from request_tracker import RequestTracker
+from deadline import Deadline, DeadlineExceeded, use_deadline, with_deadline, get_deadline_stats
+from stream_coalescer import StreamCoalescer, get_stream_coalescer_stats
+from trace_capture import TraceRecorder, annotate_trace
+from warmup import Warmup
+from shared_state import get_shared_state
 
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+startup.mark("imports")
 
-config = Config()
+setup_logging(
+    level=config.LOG_LEVEL,
+    fmt=config.LOG_FORMAT,
+    debug_sample_rate=config.LOG_DEBUG_SAMPLE_RATE,
+    queue_size=config.LOG_QUEUE_SIZE
+)
+logger = get_logger(__name__)
 
 # Load instructions from file
 def load_instructions() -> str:
@@ -31,80 +90,337 @@ def load_instructions() -> str:
     except FileNotFoundError:
         return "You are a helpful assistant."
 
-INSTRUCTIONS = load_instructions()
+@lru_cache(maxsize=None)
+def get_instructions() -> str:
+    """Instructions được đọc khi LLM được gọi lần đầu, không đọc lúc start"""
+    return load_instructions()
+
+managed_identity_provider: ManagedIdentityTokenProvider | None = None
 
 def create_token_factory():
-    def get_token(scopes, tenant_id=None):
-        credential = ManagedIdentityCredential(client_id=config.APP_ID)
-        if isinstance(scopes, str):
-            scopes_list = [scopes]
-        else:
-            scopes_list = scopes
-        token = credential.get_token(*scopes_list)
-        return token.token
-    return get_token
+    """
+    Token factory cho Managed Identity: dùng chung một credential,
+    cache token theo scope và không block event loop
+    """
+    global managed_identity_provider
+    if managed_identity_provider is None:
+        managed_identity_provider = ManagedIdentityTokenProvider(client_id=config.APP_ID)
+    return managed_identity_provider.get_token
 
-app = App(
-    token=create_token_factory() if config.APP_TYPE == "UserAssignedMsi" else None
-)
+def create_app() -> App:
+    """App Teams; khi đã bind port sớm thì HttpPlugin chạy uvicorn trên socket đó"""
+    token = create_token_factory() if config.APP_TYPE == "UserAssignedMsi" else None
+    if early_listener is None:
+        return App(token=token)
+    # app_id giống cách App tự tạo HttpPlugin: có CLIENT_ID → bật JWT validation
+    http_plugin = startup.create_http_plugin(early_listener, config.APP_ID or None)
+    return App(token=token, plugins=[http_plugin])
+
+app = create_app()
+startup.mark("app_init")
+
+@app.event("start")
+async def handle_app_start(event):
+    """Khởi tạo HTTP client dùng chung cho Backend khi app start"""
+    await start_backend_client()
+    startup.milestone("http_ready")
+    startup.log_startup_report()
+    # Thường đã được start trong __main__, song song với khởi động HTTP server
+    warmup.start()
+    if worker_health is not None:
+        worker_health.start()
+
+@app.event("stop")
+async def handle_app_stop(event):
+    """Đóng connection pool tới Backend (và LiteLLM embedding) khi app shutdown"""
+    await close_backend_client()
+    if hr_query.semantic_cache is not None:
+        await hr_query.semantic_cache.aclose()
+    await conversation_store.close()
+    if trace_recorder is not None:
+        trace_recorder.close()
+    warmup.cancel()
+    if worker_health is not None:
+        await worker_health.stop()
+    if shared_state is not None:
+        await shared_state.close()
+    if managed_identity_provider is not None:
+        await managed_identity_provider.close()
+    stop_logging()
+
+def create_litellm_model() -> AIModel:
+    """Model qua LiteLLM Proxy (OpenAI-compatible)"""
+    from microsoft.teams.openai import OpenAICompletionsAIModel
 
-# Khởi tạo model - ưu tiên LiteLLM nếu được cấu hình
-if config.USE_LITELLM:
-    # Sử dụng LiteLLM Proxy (OpenAI-compatible)
     # LiteLLM proxy hoạt động như OpenAI API, có thể sử dụng azure_endpoint với custom URL
-    logger.info(f"Sử dụng LiteLLM Proxy: {config.LITELLM_BASE_URL}")
-    model = OpenAICompletionsAIModel(
+    return OpenAICompletionsAIModel(
         key=config.LITELLM_API_KEY,
         model=config.LITELLM_DEFAULT_CHAT_MODEL,
         azure_endpoint=config.LITELLM_BASE_URL.rstrip('/'),  # LiteLLM base URL
         api_version="2024-10-21"  # LiteLLM thường hỗ trợ Azure API format
     )
-else:
-    # Fallback về Azure OpenAI trực tiếp
-    if not config.AZURE_OPENAI_API_KEY or not config.AZURE_OPENAI_ENDPOINT:
-        raise ValueError(
-            "Cần cấu hình AZURE_OPENAI_API_KEY và AZURE_OPENAI_ENDPOINT "
-            "hoặc LITELLM_API_KEY, LITELLM_BASE_URL, và LITELLM_DEFAULT_CHAT_MODEL"
-        )
-    logger.info(f"Sử dụng Azure OpenAI trực tiếp: {config.AZURE_OPENAI_ENDPOINT}")
-    model = OpenAICompletionsAIModel(
+
+def create_azure_openai_model() -> AIModel:
+    """Model gọi Azure OpenAI trực tiếp"""
+    from microsoft.teams.openai import OpenAICompletionsAIModel
+
+    return OpenAICompletionsAIModel(
         key=config.AZURE_OPENAI_API_KEY,
         model=config.AZURE_OPENAI_MODEL_DEPLOYMENT_NAME,
         azure_endpoint=config.AZURE_OPENAI_ENDPOINT,
         api_version="2024-10-21"
     )
- 
 
-conversation_store: dict[str, ListMemory] = {}
+def create_model() -> AIModel:
+    """Khởi tạo model - ưu tiên LiteLLM nếu được cấu hình"""
+    if config.USE_LITELLM and has_azure_openai and config.MODEL_ROUTING_ENABLED:
+        from model_router import ModelRouter, ModelEndpoint
+
+        def create_model_endpoint(name: str, endpoint_model: AIModel) -> ModelEndpoint:
+            return ModelEndpoint(
+                name=name,
+                model=endpoint_model,
+                breaker=CircuitBreaker(
+                    f"llm-{name}",
+                    failure_threshold=config.MODEL_BREAKER_FAILURE_THRESHOLD,
+                    recovery_timeout=config.MODEL_BREAKER_RECOVERY_SECONDS
+                )
+            )
+
+        # Cấu hình cả hai → router chọn endpoint theo latency/lỗi, LiteLLM là endpoint ưu tiên
+        logger.info(f"Định tuyến LLM giữa LiteLLM Proxy ({config.LITELLM_BASE_URL}) và Azure OpenAI ({config.AZURE_OPENAI_ENDPOINT})")
+        return ModelRouter(
+            [
+                create_model_endpoint("litellm", create_litellm_model()),
+                create_model_endpoint("azure_openai", create_azure_openai_model()),
+            ],
+            switch_ratio=config.MODEL_ROUTING_SWITCH_RATIO,
+            probe_rate=config.MODEL_ROUTING_PROBE_RATE
+        )
+    if config.USE_LITELLM:
+        # Sử dụng LiteLLM Proxy (OpenAI-compatible)
+        logger.info(f"Sử dụng LiteLLM Proxy: {config.LITELLM_BASE_URL}")
+        return create_litellm_model()
+    # Fallback về Azure OpenAI trực tiếp
+    logger.info(f"Sử dụng Azure OpenAI trực tiếp: {config.AZURE_OPENAI_ENDPOINT}")
+    return create_azure_openai_model()
+
+# Kiểm tra cấu hình LLM ngay lúc start, còn model (OpenAI client, ~0.5s import) được tạo khi dùng lần đầu
+has_azure_openai = bool(config.AZURE_OPENAI_API_KEY and config.AZURE_OPENAI_ENDPOINT)
+if not config.USE_LITELLM and not has_azure_openai:
+    raise ValueError(
+        "Cần cấu hình AZURE_OPENAI_API_KEY và AZURE_OPENAI_ENDPOINT "
+        "hoặc LITELLM_API_KEY, LITELLM_BASE_URL, và LITELLM_DEFAULT_CHAT_MODEL"
+    )
+
+_model: AIModel | None = None
+
+def get_model() -> AIModel:
+    global _model
+    if _model is None:
+        _model = create_model()
+    return _model
+
+def get_llm_router_stats() -> dict | None:
+    """Stats của ModelRouter (None khi model chưa được tạo hoặc chỉ có một endpoint)"""
+    stats = getattr(_model, "stats", None)
+    return stats() if callable(stats) else None
+
+
+# State dùng chung giữa các worker (None khi chỉ chạy một process)
+shared_state = get_shared_state()
+
+def get_user_teams_token(ctx: ActivityContext) -> str | None:
+    """
+    Teams token của user: SDK đã hỏi token service (ctx.connection_name) khi nhận activity,
+    không có token nghĩa là user chưa sign in. Không cache thêm - token luôn là bản SDK vừa lấy
+    (không dùng lại token đã bị revoke / user đã sign out)
+    """
+    return ctx.user_token or None
+
+async def fetch_signed_in_token(ctx: ActivityContext) -> str | None:
+    """
+    Token của user từ token service (sau khi SSO vừa hoàn tất, ctx.user_token có thể chưa có)
+
+    Returns:
+        Token hoặc None nếu user chưa sign in
+    """
+    if ctx.user_token:
+        return ctx.user_token
+    try:
+        token_response = await ctx.api.users.token.get(GetUserTokenParams(
+            channel_id=ctx.activity.channel_id,
+            user_id=ctx.activity.from_.id,
+            connection_name=ctx.connection_name
+        ))
+    except Exception as e:
+        logger.info(f"Chưa lấy được token của user: {e}")
+        return None
+    return token_response.token or None
+
+SUMMARY_INSTRUCTIONS = (
+    "Bạn tóm tắt cuộc trò chuyện giữa user và HR assistant. "
+    "Giữ lại các sự kiện, con số, quyết định và câu hỏi còn mở; bỏ lời chào và chi tiết thừa. "
+    "Trả lời bằng ngôn ngữ của cuộc trò chuyện, tối đa 200 từ."
+)
+
+async def summarize_conversation(previous_summary: str | None, messages: list[Message]) -> str:
+    """Gộp các lượt cũ vào bản tóm tắt của conversation (chạy nền)"""
+    prompt = ""
+    if previous_summary:
+        prompt += f"Bản tóm tắt hiện tại:\n{previous_summary}\n\n"
+    prompt += f"Các lượt tiếp theo:\n{format_transcript(messages)}\n\nViết bản tóm tắt mới."
+    chat_result = await ChatPrompt(get_model()).send(input=prompt, memory=ListMemory(), instructions=SUMMARY_INSTRUCTIONS)
+    return chat_result.response.content or ""
+
+def create_conversation_memory(max_messages: int, **kwargs) -> BoundedListMemory:
+    """Memory cho mỗi conversation: giới hạn token + tóm tắt nếu được bật"""
+    if not config.CONVERSATION_SUMMARY_ENABLED:
+        return BoundedListMemory(max_messages, **kwargs)
+    return SummarizingMemory(
+        max_messages,
+        summarize=summarize_conversation,
+        token_budget=config.CONVERSATION_TOKEN_BUDGET,
+        keep_turns=config.CONVERSATION_KEEP_TURNS,
+        # Worker khác nhận lượt tiếp theo dùng lại bản tóm tắt thay vì gọi LLM tóm tắt lại
+        shared=shared_state,
+        shared_ttl=config.CONVERSATION_IDLE_TTL_SECONDS,
+        **kwargs
+    )
+
+conversation_store = ConversationStore(
+    max_conversations=config.CONVERSATION_MAX_CONVERSATIONS,
+    idle_ttl=config.CONVERSATION_IDLE_TTL_SECONDS,
+    max_messages=config.CONVERSATION_MAX_MESSAGES,
+    storage=create_conversation_storage(config.CONVERSATION_STORAGE, config.CONVERSATION_SQLITE_PATH),
+    memory_factory=create_conversation_memory
+)
+
+admission_controller = AdmissionController(
+    max_concurrent=config.ADMISSION_MAX_CONCURRENT,
+    max_queue=config.ADMISSION_MAX_QUEUE,
+    queue_timeout=config.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+    max_per_user=config.ADMISSION_MAX_PER_USER,
+    max_per_conversation=config.ADMISSION_MAX_PER_CONVERSATION
+)
+
+request_tracker = RequestTracker(grace_period=config.REQUEST_SUPERSEDE_GRACE_SECONDS)
+
+trace_recorder = TraceRecorder(
+    # Mỗi worker ghi file trace riêng
+    workers.worker_path(config.TRACE_CAPTURE_PATH),
+    sample_rate=config.TRACE_CAPTURE_SAMPLE_RATE,
+    salt=config.TRACE_CAPTURE_SALT or None
+) if config.TRACE_CAPTURE_PATH else None
 
-def get_or_create_conversation_memory(conversation_id: str) -> ListMemory:
+AUTH_COMMANDS = ["auth", "authenticate", "login", "đăng nhập", "xác thực"]
+
+def is_auth_command(text: str | None) -> bool:
+    return bool(text) and text.lower().strip() in AUTH_COMMANDS
+
+def record_outcome(handler: str, outcome: str) -> None:
+    """Đếm kết quả xử lý (metrics) và ghi vào trace event của message"""
+    request_outcomes.inc(handler=handler, outcome=outcome)
+    annotate_trace(outcome=outcome)
+
+def get_or_create_conversation_memory(conversation_id: str) -> BoundedListMemory:
     """Get or create conversation memory for a specific conversation"""
-    if conversation_id not in conversation_store:
-        conversation_store[conversation_id] = ListMemory()
-    return conversation_store[conversation_id]
+    return conversation_store.get_or_create(conversation_id)
+
+async def send_activity(ctx: ActivityContext, activity: MessageActivityInput):
+    """ctx.send có đo latency (stage "send")"""
+    with track_stage("send"):
+        return await ctx.send(activity)
+
+NO_ANSWER_TEXT = "Xin lỗi, tôi không thể trả lời câu hỏi này."
+
+def format_sources(sources: list[Source]) -> str:
+    """Format sources (tối đa 3) để nối vào cuối answer"""
+    if not sources:
+        return ""
+    text = "\n\n📚 Nguồn tham khảo:"
+    for i, source in enumerate(sources[:3], 1):  # Chỉ hiển thị 3 sources đầu
+        doc_title = source.document_title or "Document"
+        text += f"\n{i}. {doc_title}"
+    return text
+
+def format_answer(response: HRQueryResponse) -> str:
+    """Answer kèm sources để gửi cho user"""
+    return (response.answer or NO_ANSWER_TEXT) + format_sources(response.sources)
+
+def get_tenant_id(ctx: ActivityContext) -> str:
+    """Tenant ID của activity (fallback về tenant cấu hình cho bot)"""
+    conversation = ctx.activity.conversation
+    return (getattr(conversation, "tenant_id", None) if conversation else None) or config.APP_TENANTID
+
+def create_stream_coalescer(ctx: ActivityContext[MessageActivity]) -> StreamCoalescer:
+    """Gộp chunk trước khi emit qua ctx.stream để giảm số update gửi lên Teams"""
+    return StreamCoalescer(
+        ctx.stream.emit,
+        interval=config.STREAM_FLUSH_INTERVAL_SECONDS,
+        max_chars=config.STREAM_FLUSH_MAX_CHARS
+    )
+
+async def relay_backend_stream(
+    ctx: ActivityContext[MessageActivity],
+    teams_token: str,
+    user_id: str,
+    conversation_id: str | None
+) -> None:
+    """
+    Relay answer streaming từ Backend qua ctx.stream, sources được nối ở cuối.
+    Nếu Backend không stream thì gửi toàn bộ answer như bình thường.
+    """
+    tenant_id = get_tenant_id(ctx)
+    cached = await get_cached_answer(ctx.activity.text, tenant_id, user_id)
+    if cached is not None:
+        await send_activity(ctx, MessageActivityInput(text=format_answer(cached)))
+        return
+    
+    streamed = False
+    backend_response = HRQueryResponse()
+    with create_stream_coalescer(ctx) as coalescer, track_stage("backend_stream"):
+        async for event in stream_with_backend_session(
+            query=ctx.activity.text,
+            teams_token=teams_token,
+            user_id=user_id,
+            conversation_id=conversation_id,
+            tenant_id=tenant_id
+        ):
+            if event["type"] == "delta":
+                coalescer.push(event["text"])
+                streamed = True
+            else:
+                backend_response = event["response"]
+        
+        sources_text = format_sources(backend_response.sources)
+        if streamed and sources_text:
+            coalescer.push(sources_text)
+    
+    if not streamed:
+        await send_activity(ctx, MessageActivityInput(text=format_answer(backend_response)))
+    
+    await remember_answer(ctx.activity.text, tenant_id, user_id, backend_response)
 
 async def handle_hr_query_with_backend(ctx: ActivityContext[MessageActivity]) -> None:
     """
     Handle HR query bằng cách gọi Backend API
     """
+    user_id = None
     try:
-        user_id = ctx.activity.from_property.id if ctx.activity.from_property else None
+        user_id = ctx.activity.from_.id if ctx.activity.from_ else None
         if not user_id:
-            await ctx.send(MessageActivityInput(
+            await send_activity(ctx, MessageActivityInput(
                 text="❌ Không thể xác định user. Vui lòng authenticate bằng cách gõ 'auth'"
             ))
             return
         
         # Lấy Teams token
-        token_result = await app.get_user_token(
-            ctx,
-            config.APP_ID,
-            "User.Read"
-        )
+        teams_token = get_user_teams_token(ctx)
         
-        if not token_result or not token_result.token:
+        if not teams_token:
             # Chưa authenticate → yêu cầu user authenticate
-            await ctx.send(MessageActivityInput(
+            await send_activity(ctx, MessageActivityInput(
                 text="🔐 Bạn cần xác thực trước. Vui lòng gõ 'auth' hoặc 'đăng nhập' để xác thực."
             ))
             return
@@ -113,45 +429,56 @@ async def handle_hr_query_with_backend(ctx: ActivityContext[MessageActivity]) ->
         conversation_id = ctx.activity.conversation.id if ctx.activity.conversation else None
         
         logger.info(
-            f"Gọi Backend HR API",
+            "Gọi Backend HR API",
             query=ctx.activity.text[:100],
             user_id=user_id,
             conversation_id=conversation_id
         )
         
-        backend_response = await call_backend_hr_api(
+        # Group chat không hỗ trợ streaming → luôn gửi answer đầy đủ
+        is_group = bool(ctx.activity.conversation and ctx.activity.conversation.is_group)
+        if config.BACKEND_STREAMING and not is_group:
+            await relay_backend_stream(ctx, teams_token, user_id, conversation_id)
+            record_outcome("hr_query", "ok")
+            return
+        
+        backend_response = await query_hr_backend(
             query=ctx.activity.text,
-            teams_token=token_result.token,
+            teams_token=teams_token,
             user_id=user_id,
-            conversation_id=conversation_id
+            conversation_id=conversation_id,
+            tenant_id=get_tenant_id(ctx)
         )
         
-        # Trả về response cho user
-        answer = backend_response.get("answer", "Xin lỗi, tôi không thể trả lời câu hỏi này.")
-        
-        # Format response với sources nếu có
-        sources = backend_response.get("sources", [])
-        if sources and len(sources) > 0:
-            answer += "\n\n📚 Nguồn tham khảo:"
-            for i, source in enumerate(sources[:3], 1):  # Chỉ hiển thị 3 sources đầu
-                doc_title = source.get("document_title", "Document")
-                answer += f"\n{i}. {doc_title}"
-        
-        await ctx.send(MessageActivityInput(text=answer))
+        # Trả về answer (kèm sources nếu có) cho user
+        await send_activity(ctx, MessageActivityInput(text=format_answer(backend_response)))
+        record_outcome("hr_query", "ok")
         
     except AuthenticationError as e:
+        record_outcome("hr_query", "authentication_error")
         logger.warning(f"Authentication error: {e}")
-        await ctx.send(MessageActivityInput(
+        # Token bị Backend từ chối → bỏ session đã đổi từ token đó
+        if user_id:
+            invalidate_session(user_id)
+        await send_activity(ctx, MessageActivityInput(
             text=f"🔐 {str(e)}"
         ))
+    except DeadlineExceeded as e:
+        record_outcome("hr_query", "deadline_exceeded")
+        logger.warning(f"HR query hết thời gian: {e}")
+        await send_activity(ctx, MessageActivityInput(
+            text="⏱️ Câu hỏi cần nhiều thời gian hơn dự kiến, vui lòng thử lại sau."
+        ))
     except BackendServiceError as e:
+        record_outcome("hr_query", "backend_error")
         logger.error(f"Backend service error: {e}")
-        await ctx.send(MessageActivityInput(
+        await send_activity(ctx, MessageActivityInput(
             text=f"⚠️ {str(e)}"
         ))
     except Exception as e:
+        record_outcome("hr_query", "unexpected_error")
         logger.error(f"Unexpected error: {e}", exc_info=True)
-        await ctx.send(MessageActivityInput(
+        await send_activity(ctx, MessageActivityInput(
             text="❌ Đã có lỗi xảy ra. Vui lòng thử lại sau hoặc liên hệ admin."
         ))
 
@@ -163,22 +490,23 @@ async def handle_stateful_conversation(model: AIModel, ctx: ActivityContext[Mess
 
     # Get existing messages for logging
     existing_messages = await memory.get_all()
-    print(f"Existing messages before sending to prompt: {len(existing_messages)} messages")
+    logger.debug("Existing messages before sending to prompt", messages=len(existing_messages))
 
     # Create ChatPrompt with conversation-specific memory
     chat_prompt = ChatPrompt(model)
 
-    chat_result = await chat_prompt.send(
-        input=ctx.activity.text, 
-        memory=memory,
-        instructions=INSTRUCTIONS,
-        on_chunk=lambda chunk: ctx.stream.emit(chunk)
-    )
+    with create_stream_coalescer(ctx) as coalescer, track_stage("llm"):
+        chat_result = await with_deadline("llm", chat_prompt.send(
+            input=ctx.activity.text, 
+            memory=memory,
+            instructions=get_instructions(),
+            on_chunk=coalescer
+        ))
 
     if ctx.activity.conversation.is_group:
         # If the conversation is a group chat, we need to send the final response
         # back to the group chat
-        await ctx.send(MessageActivityInput(text=chat_result.response.content).add_ai_generated().add_feedback())
+        await send_activity(ctx, MessageActivityInput(text=chat_result.response.content).add_ai_generated().add_feedback())
     else:
         ctx.stream.emit(MessageActivityInput().add_ai_generated().add_feedback())
 
@@ -187,7 +515,7 @@ async def handle_message_feedback(ctx: ActivityContext[MessageSubmitActionInvoke
     """Handle feedback submission events"""
     activity = ctx.activity
 
-    print(f"your feedback is {activity.value.action_value}")
+    logger.info("Nhận feedback", action_value=activity.value.action_value)
 
 # TODO: Sửa cách đăng ký SSO handlers - tạm thời comment để test
 # @app.on_invoke("signin/verifyState")
@@ -198,7 +526,7 @@ async def handle_sso_verify_state(ctx: ActivityContext[InvokeActivity]):
     """
     try:
         # Lấy user ID từ activity
-        user_id = ctx.activity.from_property.id if ctx.activity.from_property else None
+        user_id = ctx.activity.from_.id if ctx.activity.from_ else None
         
         if not user_id:
             logger.error("Không thể lấy user ID từ activity")
@@ -207,37 +535,35 @@ async def handle_sso_verify_state(ctx: ActivityContext[InvokeActivity]):
         # Lấy token từ Teams SSO
         # Microsoft Teams SDK sẽ tự động xử lý SSO flow
         # Token sẽ được lấy thông qua OAuth flow
-        token_result = await app.get_user_token(
-            ctx,
-            config.APP_ID,
-            "User.Read"  # Scope cần thiết cho Graph API
-        )
+        teams_token = await fetch_signed_in_token(ctx)
         
-        if token_result and token_result.token:
+        if teams_token:
             logger.info(f"Đã lấy token thành công cho user: {user_id}")
-            
             # Gửi token xuống backend
             backend_response = await send_teams_token_to_backend(
                 user_id=user_id,
-                token=token_result.token,
-                tenant_id=config.APP_TENANTID,
+                token=teams_token,
+                tenant_id=get_tenant_id(ctx),
                 additional_data={
                     "conversation_id": ctx.activity.conversation.id if ctx.activity.conversation else None,
                     "channel_id": ctx.activity.channel_id if hasattr(ctx.activity, 'channel_id') else None
-                }
+                },
+                issue_session=session_enabled()
             )
             
-            if "error" not in backend_response:
+            if backend_response.ok:
                 logger.info(f"Đã gửi token xuống backend thành công: {backend_response}")
+                # Token mới → dùng session Backend vừa cấp (hoặc bỏ session cũ)
+                await remember_session(user_id, backend_response, get_tenant_id(ctx))
                 return {
                     "type": "message",
                     "text": "✅ Đã xác thực thành công và gửi token xuống backend!"
                 }
             else:
-                logger.error(f"Lỗi từ backend: {backend_response.get('error')}")
+                logger.error(f"Lỗi từ backend: {backend_response.error}")
                 return {
                     "type": "message",
-                    "text": f"⚠️ Đã lấy token nhưng có lỗi khi gửi xuống backend: {backend_response.get('error')}"
+                    "text": f"⚠️ Đã lấy token nhưng có lỗi khi gửi xuống backend: {backend_response.error}"
                 }
         else:
             # Nếu chưa có token, cần initiate SSO flow
@@ -263,7 +589,7 @@ async def handle_sso_token_exchange(ctx: ActivityContext[InvokeActivity]):
     Được gọi khi Teams trả về token sau khi user đồng ý
     """
     try:
-        user_id = ctx.activity.from_property.id if ctx.activity.from_property else None
+        user_id = ctx.activity.from_.id if ctx.activity.from_ else None
         
         if not user_id:
             logger.error("Không thể lấy user ID từ activity")
@@ -271,37 +597,35 @@ async def handle_sso_token_exchange(ctx: ActivityContext[InvokeActivity]):
         
         # Lấy token từ token exchange response
         # Token sẽ có trong ctx.activity.value hoặc có thể lấy lại
-        token_result = await app.get_user_token(
-            ctx,
-            config.APP_ID,
-            "User.Read"
-        )
+        teams_token = await fetch_signed_in_token(ctx)
         
-        if token_result and token_result.token:
+        if teams_token:
             logger.info(f"Token exchange thành công cho user: {user_id}")
-            
             # Gửi token xuống backend
             backend_response = await send_teams_token_to_backend(
                 user_id=user_id,
-                token=token_result.token,
-                tenant_id=config.APP_TENANTID,
+                token=teams_token,
+                tenant_id=get_tenant_id(ctx),
                 additional_data={
                     "conversation_id": ctx.activity.conversation.id if ctx.activity.conversation else None,
                     "channel_id": ctx.activity.channel_id if hasattr(ctx.activity, 'channel_id') else None
-                }
+                },
+                issue_session=session_enabled()
             )
             
-            if "error" not in backend_response:
+            if backend_response.ok:
                 logger.info(f"Đã gửi token xuống backend thành công: {backend_response}")
+                # Token mới → dùng session Backend vừa cấp (hoặc bỏ session cũ)
+                await remember_session(user_id, backend_response, get_tenant_id(ctx))
                 return {
                     "type": "message",
                     "text": "✅ Đã xác thực thành công và gửi token xuống backend!"
                 }
             else:
-                logger.error(f"Lỗi từ backend: {backend_response.get('error')}")
+                logger.error(f"Lỗi từ backend: {backend_response.error}")
                 return {
                     "type": "message",
-                    "text": f"⚠️ Đã lấy token nhưng có lỗi khi gửi xuống backend: {backend_response.get('error')}"
+                    "text": f"⚠️ Đã lấy token nhưng có lỗi khi gửi xuống backend: {backend_response.error}"
                 }
         else:
             logger.error("Không thể lấy token từ token exchange")
@@ -321,57 +645,208 @@ async def handle_sso_token_exchange(ctx: ActivityContext[InvokeActivity]):
 @app.on_message
 async def handle_message(ctx: ActivityContext[MessageActivity]):
     """Handle messages using stateful conversation"""
+    user_id = ctx.activity.from_.id if ctx.activity.from_ else None
+    conversation_id = ctx.activity.conversation.id if ctx.activity.conversation else None
+
+    async def admit_and_process() -> None:
+        started = time.perf_counter()
+        async with admission_controller.admit(user_id, conversation_id):
+            stage_duration.observe(time.perf_counter() - started, stage="admission")
+            await process_message(ctx)
+
+    trace = trace_recorder.capture(
+        "auth" if is_auth_command(ctx.activity.text) else "hr",
+        user_id,
+        conversation_id,
+        ctx.activity.text
+    ) if trace_recorder is not None else nullcontext()
+
+    with trace:
+        try:
+            # Deadline (và trace event) được copy vào task xử lý message qua contextvars
+            with use_deadline(Deadline(config.REQUEST_DEADLINE_SECONDS)), requests_in_flight.track(handler="message"):
+                if config.REQUEST_SUPERSEDE_ENABLED and conversation_id:
+                    # Message mới (ví dụ user sửa câu hỏi) huỷ request cũ chưa xong của cùng user
+                    if not await request_tracker.run((conversation_id, user_id), admit_and_process):
+                        record_outcome("message", "superseded")
+                else:
+                    await admit_and_process()
+        except AdmissionRejected as e:
+            # Quá tải → trả lời ngay thay vì xếp hàng gọi Backend/LLM
+            record_outcome("message", f"rejected_{e.reason}")
+            await send_activity(ctx, MessageActivityInput(text=str(e)))
+
+async def process_message(ctx: ActivityContext[MessageActivity]) -> None:
+    """Xử lý message sau khi đã qua admission control"""
     # Kiểm tra nếu user muốn authenticate
-    if ctx.activity.text and ctx.activity.text.lower().strip() in ["auth", "authenticate", "login", "đăng nhập", "xác thực"]:
+    if is_auth_command(ctx.activity.text):
         try:
-            user_id = ctx.activity.from_property.id if ctx.activity.from_property else None
+            user_id = ctx.activity.from_.id if ctx.activity.from_ else None
             if user_id:
                 # Thử lấy token
-                token_result = await app.get_user_token(
-                    ctx,
-                    config.APP_ID,
-                    "User.Read"
-                )
+                teams_token = get_user_teams_token(ctx)
                 
-                if token_result and token_result.token:
+                if teams_token:
                     # Gửi token xuống backend
                     backend_response = await send_teams_token_to_backend(
                         user_id=user_id,
-                        token=token_result.token,
-                        tenant_id=config.APP_TENANTID,
+                        token=teams_token,
+                        tenant_id=get_tenant_id(ctx),
                         additional_data={
                             "conversation_id": ctx.activity.conversation.id if ctx.activity.conversation else None,
-                        }
+                        },
+                        issue_session=session_enabled()
                     )
                     
-                    if "error" not in backend_response:
-                        user_info = backend_response.get("user", {})
-                        user_name = user_info.get("full_name", user_info.get("email", "User"))
-                        await ctx.send(MessageActivityInput(
-                            text=f"✅ Đã xác thực thành công!\n\nXin chào {user_name}! Bạn có thể hỏi tôi về HR policies, leave policies, benefits, và nhiều hơn nữa."
+                    if backend_response.ok:
+                        await remember_session(user_id, backend_response, get_tenant_id(ctx))
+                        await send_activity(ctx, MessageActivityInput(
+                            text=f"✅ Đã xác thực thành công!\n\nXin chào {backend_response.user_name}! Bạn có thể hỏi tôi về HR policies, leave policies, benefits, và nhiều hơn nữa."
                         ))
                     else:
-                        await ctx.send(MessageActivityInput(
-                            text=f"⚠️ Đã lấy token nhưng có lỗi khi gửi xuống backend: {backend_response.get('error')}"
+                        invalidate_session(user_id)
+                        await send_activity(ctx, MessageActivityInput(
+                            text=f"⚠️ Đã lấy token nhưng có lỗi khi gửi xuống backend: {backend_response.error}"
                         ))
                 else:
                     # Initiate SSO flow
-                    await ctx.send(MessageActivityInput(
+                    await send_activity(ctx, MessageActivityInput(
                         text="Đang khởi tạo quá trình xác thực..."
                     ))
             else:
-                await ctx.send(MessageActivityInput(
+                await send_activity(ctx, MessageActivityInput(
                     text="❌ Không thể xác định user"
                 ))
         except Exception as e:
             logger.error(f"Lỗi khi xử lý authentication command: {e}", exc_info=True)
-            await ctx.send(MessageActivityInput(
+            await send_activity(ctx, MessageActivityInput(
                 text=f"❌ Lỗi: {str(e)}"
             ))
     else:
         # Xử lý message bình thường - gọi Backend HR API
         await handle_hr_query_with_backend(ctx)
 
+async def warm_llm() -> None:
+    """Tạo model (import OpenAI client) và mở connection tới các endpoint LLM"""
+    import openai
+
+    llm = get_model()
+    endpoint_models = [endpoint.model for endpoint in llm.endpoints] if hasattr(llm, "endpoints") else [llm]
+
+    async def open_connection(endpoint_model: AIModel) -> None:
+        # SDK không public OpenAI client → best-effort, bỏ qua nếu không có
+        client = getattr(endpoint_model, "_client", None)
+        if client is None:
+            return
+        try:
+            # GET /models không tốn token; client copy dùng chung httpx client (connection pool)
+            await client.with_options(max_retries=0).models.list()
+        except openai.APIStatusError:
+            # Endpoint đã trả lời (401/404...) → DNS + TLS đã xong
+            pass
+
+    await asyncio.gather(*(open_connection(endpoint_model) for endpoint_model in endpoint_models))
+
+async def warm_bot_token() -> None:
+    """Lấy trước bot token (MSAL / Managed Identity) dùng khi gửi activity"""
+    # SDK không public token manager; _get_bot_token là hàm App dùng cho API client
+    await app._get_bot_token()
+
+def create_warmup() -> Warmup:
+    """Các bước warm-up chạy song song khi start"""
+    steps = Warmup(timeout=config.WARMUP_TIMEOUT_SECONDS, enabled=config.WARMUP_ENABLED)
+    if config.BACKEND_URL:
+        steps.add("backend", lambda: warm_backend_connections(config.WARMUP_BACKEND_CONNECTIONS))
+    steps.add("llm", warm_llm)
+    if config.APP_ID:
+        steps.add("bot_token", warm_bot_token)
+    return steps
+
+warmup = create_warmup()
+
+@app.http.get("/ready")
+async def readiness_endpoint():
+    """Readiness: 503 cho đến khi warm-up xong (hoặc hết WARMUP_TIMEOUT_SECONDS)"""
+    return JSONResponse(warmup.status(), status_code=200 if warmup.ready else 503)
+
+def collect_worker_health() -> dict:
+    """Health của worker này, ghi vào shared state cho supervisor và /workers"""
+    admission = admission_controller.stats()
+    return {
+        "ready": warmup.ready,
+        "warmup": warmup.status()["state"],
+        "active": admission["active"],
+        "queue_depth": admission["queue_depth"],
+        "max_rss_kb": workers.max_rss_kb(),
+    }
+
+worker_health = workers.WorkerHealthReporter(
+    shared_state,
+    workers.worker_slot(),
+    interval=config.WORKER_HEARTBEAT_SECONDS,
+    collect=collect_worker_health
+) if shared_state is not None and workers.worker_slot() is not None else None
+
+def is_admin_request(request: Request) -> bool:
+    """/metrics, /workers chạy cùng port public với /api/messages → chỉ cho ADMIN_TOKEN hoặc ADMIN_ALLOWED_HOSTS"""
+    if config.ADMIN_TOKEN:
+        authorization = request.headers.get("authorization", "").encode("utf-8")
+        return hmac.compare_digest(authorization, f"Bearer {config.ADMIN_TOKEN}".encode("utf-8"))
+    return request.client is not None and request.client.host in config.ADMIN_ALLOWED_HOSTS
+
+def admin_forbidden() -> JSONResponse:
+    return JSONResponse({"error": "forbidden"}, status_code=403)
+
+@app.http.get("/workers")
+async def workers_endpoint(request: Request):
+    """Health của tất cả worker (multi-worker mode)"""
+    if not is_admin_request(request):
+        return admin_forbidden()
+    if shared_state is None:
+        return JSONResponse({"workers": []})
+    return JSONResponse({"worker": workers.worker_slot(), "workers": await shared_state.list_workers()})
+
+def register_metrics() -> None:
+    """Đăng ký stats() của các component để render ở /metrics"""
+    registry.register_stats("admission", admission_controller.stats)
+    registry.register_stats("request_tracker", request_tracker.stats)
+    registry.register_stats("backend_client", get_backend_client_stats)
+    registry.register_stats("backend", get_backend_resilience_stats)
+    registry.register_stats("json_codec", get_json_codec_stats)
+    registry.register_stats("answer_cache", hr_query.answer_cache.stats)
+    registry.register_stats("backend_single_flight", hr_query.backend_single_flight.stats)
+    if hr_query.semantic_cache is not None:
+        registry.register_stats("semantic_cache", hr_query.semantic_cache.stats)
+    registry.register_stats("backend_session", get_backend_session_stats)
+    registry.register_stats("conversation_store", conversation_store.stats)
+    registry.register_stats(
+        "managed_identity",
+        lambda: managed_identity_provider.stats() if managed_identity_provider is not None else None
+    )
+    registry.register_stats("llm_router", get_llm_router_stats)
+    registry.register_stats("deadline", get_deadline_stats)
+    registry.register_stats("stream", get_stream_coalescer_stats)
+    registry.register_stats("conversation_memory", get_summarizing_memory_stats)
+    registry.register_stats("logging", get_logging_stats)
+    if trace_recorder is not None:
+        registry.register_stats("trace_capture", trace_recorder.stats)
+    registry.register_stats("startup", startup.get_startup_stats)
+    registry.register_stats("warmup", warmup.stats)
+    if shared_state is not None:
+        registry.register_stats("shared_state", shared_state.stats)
+    if worker_health is not None:
+        registry.register_stats("worker", worker_health.stats)
+
+if config.METRICS_ENABLED:
+    register_metrics()
+
+    @app.http.get("/metrics")
+    async def metrics_endpoint(request: Request):
+        """Prometheus metrics: latency theo stage, kết quả xử lý và stats của các component"""
+        if not is_admin_request(request):
+            return admin_forbidden()
+        return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     # Đảm bảo PORT environment variable được set đúng (3978 cho bot, không phải 8386 cho backend)
     # Microsoft Teams SDK có thể đọc PORT từ environment variable trực tiếp
@@ -386,4 +861,11 @@ if __name__ == "__main__":
     logger.info(f"📍 Backend URL: {config.BACKEND_URL}")
     logger.info(f"💡 Lưu ý: Bot Teams chạy trên port {config.PORT}, Backend API chạy trên port khác (8386)")
     
-    asyncio.run(app.start())
+    startup.mark("module_init")
+
+    async def main() -> None:
+        # Warm-up chạy song song với khởi động HTTP server, /ready chuyển 200 khi xong
+        warmup.start()
+        await app.start(config.PORT)
+
+    asyncio.run(main())
@@ -0,0 +1,209 @@
+"""
+Backend Models
+Response của Backend (HR query, auth) dạng class có __slots__: parse JSON một lần,
+chuẩn hoá các field bot dùng (answer, sources, cache policy...) thay vì dò `.get()` trên dict
+ở từng lớp cache / handler
+"""
+import time
+from typing import Any, Dict, List, Optional
+
+import json_codec
+from user_token_cache import decode_jwt_exp
+
+
+def _as_dict(value: Any) -> Dict[str, Any]:
+    return value if isinstance(value, dict) else {}
+
+
+def _slots_repr(obj: Any) -> str:
+    fields = ", ".join(f"{name}={getattr(obj, name)!r}" for name in obj.__slots__)
+    return f"{type(obj).__name__}({fields})"
+
+
+class Source:
+    """Tài liệu nguồn của answer"""
+
+    __slots__ = ("document_title", "url")
+
+    def __init__(self, document_title: Optional[str] = None, url: Optional[str] = None):
+        self.document_title = document_title
+        self.url = url
+
+    @classmethod
+    def from_dict(cls, data: Any) -> "Source":
+        if not isinstance(data, dict):
+            return cls()
+        return cls(data.get("document_title"), data.get("url"))
+
+    def to_dict(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {}
+        if self.document_title is not None:
+            data["document_title"] = self.document_title
+        if self.url is not None:
+            data["url"] = self.url
+        return data
+
+    __repr__ = _slots_repr
+
+
+class HRQueryResponse:
+    """
+    Response của /api/v1/hr/query
+
+    Cờ cache (cacheable, cache_scope, cache_ttl) lấy từ `metadata`, fallback về top-level,
+    được đọc một lần lúc parse.
+    """
+
+    __slots__ = ("answer", "conversation_id", "sources", "metadata", "cacheable", "cache_scope", "cache_ttl")
+
+    def __init__(
+        self,
+        answer: Optional[str] = None,
+        conversation_id: Optional[str] = None,
+        sources: Optional[List[Source]] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        cacheable: Optional[bool] = None,
+        cache_scope: Optional[str] = None,
+        cache_ttl: Any = None,
+    ):
+        self.answer = answer
+        self.conversation_id = conversation_id
+        self.sources = sources or []
+        self.metadata = metadata or {}
+        self.cacheable = cacheable
+        self.cache_scope = cache_scope
+        self.cache_ttl = cache_ttl
+
+    @classmethod
+    def from_dict(cls, data: Any) -> "HRQueryResponse":
+        """
+        Raises:
+            ValueError: Response không phải JSON object
+        """
+        if not isinstance(data, dict):
+            raise ValueError(f"Response của Backend không phải JSON object: {type(data).__name__}")
+        metadata = _as_dict(data.get("metadata"))
+        return cls(
+            answer=data.get("answer"),
+            conversation_id=data.get("conversation_id"),
+            sources=[Source.from_dict(source) for source in data.get("sources") or ()],
+            metadata=metadata,
+            cacheable=metadata.get("cacheable", data.get("cacheable")),
+            cache_scope=metadata.get("cache_scope", data.get("cache_scope")),
+            cache_ttl=metadata.get("cache_ttl", data.get("cache_ttl")),
+        )
+
+    @classmethod
+    def from_json(cls, data: bytes) -> "HRQueryResponse":
+        return cls.from_dict(json_codec.loads(data))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Dạng JSON (cho shared state), from_dict(to_dict()) cho lại cùng giá trị"""
+        data: Dict[str, Any] = {
+            "answer": self.answer,
+            "conversation_id": self.conversation_id,
+            "sources": [source.to_dict() for source in self.sources],
+            "metadata": self.metadata,
+        }
+        for name in ("cacheable", "cache_scope", "cache_ttl"):
+            value = getattr(self, name)
+            if value is not None:
+                data[name] = value
+        return data
+
+    __repr__ = _slots_repr
+
+
+def _session_expires_at(data: Dict[str, Any], session_token: str) -> Optional[float]:
+    """Hết hạn của session: expires_at (epoch), expires_in (giây) hoặc claim `exp` nếu session là JWT"""
+    try:
+        if data.get("expires_at") is not None:
+            return float(data["expires_at"])
+        if data.get("expires_in") is not None:
+            return time.time() + float(data["expires_in"])
+    except (TypeError, ValueError):
+        pass
+    return decode_jwt_exp(session_token)
+
+
+class AuthResponse:
+    """
+    Response của BACKEND_AUTH_ENDPOINT (hoặc lỗi khi gửi token xuống Backend)
+
+    Khi bot xin session (`issue_session`), Backend trả thêm `session_token` kèm
+    `expires_in` (giây) hoặc `expires_at` (epoch).
+    """
+
+    __slots__ = ("success", "message", "user", "error", "status_code", "session_token", "session_expires_at")
+
+    def __init__(
+        self,
+        success: Optional[bool] = None,
+        message: Optional[str] = None,
+        user: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+        status_code: Optional[int] = None,
+        session_token: Optional[str] = None,
+        session_expires_at: Optional[float] = None,
+    ):
+        self.success = success
+        self.message = message
+        self.user = user or {}
+        self.error = error
+        self.status_code = status_code
+        self.session_token = session_token
+        self.session_expires_at = session_expires_at
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @property
+    def user_name(self) -> str:
+        return self.user.get("full_name", self.user.get("email", "User"))
+
+    @property
+    def unauthorized(self) -> bool:
+        """Backend từ chối Teams token (401)"""
+        return self.status_code == 401
+
+    @classmethod
+    def failed(cls, error: str, status_code: Optional[int] = None) -> "AuthResponse":
+        return cls(success=False, error=error, status_code=status_code)
+
+    @classmethod
+    def from_dict(cls, data: Any) -> "AuthResponse":
+        if not isinstance(data, dict):
+            return cls.failed("Response của Backend không hợp lệ")
+        error = data.get("error")
+        session_token = data.get("session_token") or None
+        return cls(
+            success=data.get("success"),
+            message=data.get("message"),
+            user=_as_dict(data.get("user")),
+            error=str(error) if error is not None else None,
+            session_token=session_token,
+            session_expires_at=_session_expires_at(data, session_token) if session_token else None,
+        )
+
+    @classmethod
+    def from_json(cls, data: bytes) -> "AuthResponse":
+        return cls.from_dict(json_codec.loads(data))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Dạng dict trước khi có AuthResponse: {"error": ...} khi lỗi, nếu không thì các field Backend trả về"""
+        if self.error is not None:
+            return {"error": self.error}
+        data: Dict[str, Any] = {"success": self.success, "message": self.message, "user": self.user}
+        if self.session_token:
+            data["session_token"] = self.session_token
+            data["expires_at"] = self.session_expires_at
+        return data
+
+    def __repr__(self) -> str:
+        # Không log session token
+        return (
+            f"AuthResponse(success={self.success!r}, message={self.message!r}, user={self.user!r}, "
+            f"error={self.error!r}, status_code={self.status_code!r}, "
+            f"session_token={'***' if self.session_token else None}, session_expires_at={self.session_expires_at!r})"
+        )
@@ -2,13 +2,23 @@
 Backend Service
 Service để gọi Backend API từ Bot Teams
 """
+import asyncio
+import gzip
 import httpx
-import logging
-from typing import Optional, Dict, Any
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any, AsyncIterator, Tuple
 from config import Config
+import json_codec
+from backend_models import AuthResponse, HRQueryResponse, Source
+from resilience import CircuitBreaker, LatencyTracker, backoff_delay, hedged_call
+from deadline import DeadlineExceeded, current_deadline, deadline_headers, stage_timeout
+from trace_capture import annotate_trace
+from structured_logging import get_logger
 
 config = Config()
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
 
 class BackendServiceError(Exception):
@@ -21,37 +31,246 @@ class AuthenticationError(BackendServiceError):
     pass
 
 
-async def call_backend_hr_api(
-    query: str,
-    teams_token: str,
-    user_id: str,
-    conversation_id: Optional[str] = None
-) -> Dict[str, Any]:
-    """
-    Gọi Backend HR API để xử lý query
+class SessionExpiredError(AuthenticationError):
+    """Exception khi Backend từ chối session token (401) - cần đổi Teams token lấy session mới"""
+    pass
+
+
+class BackendUnavailableError(BackendServiceError):
+    """Exception khi Backend tạm thời không khả dụng (timeout, lỗi kết nối, 5xx)"""
     
-    Args:
-        query: Câu hỏi của user
-        teams_token: Teams token để authenticate
-        user_id: User ID
-        conversation_id: Conversation ID (optional)
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class CircuitOpenError(BackendUnavailableError):
+    """Exception khi circuit breaker đang mở - không gọi xuống Backend"""
+    
+    def __init__(self, message: str):
+        super().__init__(message, retryable=False)
+
+
+# Status code được coi là lỗi tạm thời, có thể retry
+_RETRYABLE_STATUS_CODES = {429, 502, 503, 504}
+# Backend chắc chắn chưa xử lý request → retry an toàn kể cả khi không có Idempotency-Key
+_UNPROCESSED_STATUS_CODES = {429, 503}
+
+backend_breaker = CircuitBreaker(
+    "backend",
+    failure_threshold=config.BACKEND_BREAKER_FAILURE_THRESHOLD,
+    recovery_timeout=config.BACKEND_BREAKER_RECOVERY_SECONDS
+)
+backend_latency = LatencyTracker()
+
+_resilience_stats: Dict[str, int] = {
+    "retries": 0,
+    "hedges": 0,
+    "short_circuited": 0,
+}
+
+
+# HTTP client dùng chung cho toàn bộ process - giữ connection pool (keep-alive)
+# để mỗi HR query không phải mở lại TCP + TLS handshake tới BACKEND_URL
+_backend_client: Optional[httpx.AsyncClient] = None
+
+_client_stats: Dict[str, int] = {
+    "clients_created": 0,
+    "requests_total": 0,
+    "requests_in_flight": 0,
+    "peak_in_flight": 0,
+    "request_bytes": 0,
+    "request_bytes_sent": 0,
+    "requests_compressed": 0,
+    "response_bytes": 0,
+    "response_bytes_received": 0,
+}
+
+
+def _resolve_compression(value: str, setting: str, allowed: Tuple[str, ...]) -> str:
+    """Chuẩn hoá cấu hình nén, br fallback về gzip khi chưa cài package brotli"""
+    value = (value or "none").lower()
+    if value not in allowed:
+        raise ValueError(f"{setting} không hợp lệ: {value} (hỗ trợ: {', '.join(allowed)})")
+    if value == "br":
+        try:
+            import brotli  # noqa: F401
+        except ImportError:
+            logger.warning(f"{setting}=br nhưng chưa cài package 'brotli', dùng gzip")
+            return "gzip"
+    return value
+
+
+_request_compression = _resolve_compression(
+    config.BACKEND_REQUEST_COMPRESSION, "BACKEND_REQUEST_COMPRESSION", ("none", "gzip", "br")
+)
+# auto → không set header, httpx tự gửi Accept-Encoding theo các decoder đã cài
+_accept_encoding = {"auto": None, "none": "identity", "gzip": "gzip", "br": "br, gzip"}[
+    _resolve_compression(config.BACKEND_RESPONSE_COMPRESSION, "BACKEND_RESPONSE_COMPRESSION", ("auto", "none", "gzip", "br"))
+]
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        import brotli
+
+        # Quality mặc định (11) quá chậm cho request online
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+
+def _encode_body(payload: Dict[str, Any], headers: Dict[str, str]) -> bytes:
+    """
+    Encode payload một lần (retry / hedged request dùng lại cùng bytes),
+    nén nếu được bật và body đủ lớn - set Content-Encoding vào `headers`
+    """
+    body = json_codec.dumps(payload)
+    _client_stats["request_bytes"] += len(body)
+    if _request_compression != "none" and len(body) >= config.BACKEND_REQUEST_COMPRESSION_MIN_BYTES:
+        body = _compress(body, _request_compression)
+        headers["Content-Encoding"] = _request_compression
+        _client_stats["requests_compressed"] += 1
+    _client_stats["request_bytes_sent"] += len(body)
+    return body
+
+
+def _record_response_body(response: httpx.Response) -> bytes:
+    """Body đã giải nén của response (đếm cả số byte thực nhận qua mạng)"""
+    content = response.content
+    _client_stats["response_bytes"] += len(content)
+    _client_stats["response_bytes_received"] += response.num_bytes_downloaded
+    return content
+
+
+def _create_backend_client() -> httpx.AsyncClient:
+    """Tạo AsyncClient với connection pool theo cấu hình"""
+    http2 = config.BACKEND_HTTP2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("BACKEND_HTTP2 được bật nhưng chưa cài package 'h2', dùng HTTP/1.1")
+            http2 = False
+
+    limits = httpx.Limits(
+        max_connections=config.BACKEND_MAX_CONNECTIONS,
+        max_keepalive_connections=config.BACKEND_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=config.BACKEND_KEEPALIVE_EXPIRY,
+    )
+    _client_stats["clients_created"] += 1
+    return httpx.AsyncClient(
+        limits=limits,
+        http2=http2,
+        timeout=httpx.Timeout(60.0, connect=config.BACKEND_CONNECT_TIMEOUT),
+        headers={"Accept-Encoding": _accept_encoding} if _accept_encoding else None,
+    )
+
+
+async def start_backend_client() -> httpx.AsyncClient:
+    """
+    Khởi tạo HTTP client dùng chung (gọi khi app start)
     
     Returns:
-        Response từ Backend với format:
-        {
-            "answer": "...",
-            "conversation_id": "...",
-            "sources": [...],
-            "metadata": {...}
-        }
+        AsyncClient dùng chung cho Backend
+    """
+    global _backend_client
+    if _backend_client is None or _backend_client.is_closed:
+        _backend_client = _create_backend_client()
+        logger.info(
+            f"Đã khởi tạo Backend HTTP client (max_connections={config.BACKEND_MAX_CONNECTIONS}, "
+            f"keepalive={config.BACKEND_MAX_KEEPALIVE_CONNECTIONS}, http2={config.BACKEND_HTTP2})"
+        )
+    return _backend_client
+
+
+async def close_backend_client() -> None:
+    """Đóng HTTP client dùng chung và giải phóng connection pool (gọi khi app stop)"""
+    global _backend_client
+    if _backend_client is not None and not _backend_client.is_closed:
+        await _backend_client.aclose()
+        logger.info("Đã đóng Backend HTTP client")
+    _backend_client = None
+
+
+def get_backend_client() -> httpx.AsyncClient:
+    """
+    Lấy HTTP client dùng chung
     
-    Raises:
-        AuthenticationError: Nếu token invalid (401)
-        BackendServiceError: Nếu có lỗi khác
+    Nếu app chưa gọi start_backend_client() (ví dụ khi chạy script test),
+    client sẽ được tạo lazily ở lần gọi đầu tiên.
+    """
+    global _backend_client
+    if _backend_client is None or _backend_client.is_closed:
+        _backend_client = _create_backend_client()
+    return _backend_client
+
+
+async def warm_backend_connections(count: int) -> int:
+    """
+    Mở sẵn `count` connection (DNS + TCP + TLS) tới Backend trong pool dùng chung
+
+    Mọi HTTP response (kể cả 404) đều có nghĩa là connection đã mở và được giữ lại trong pool
+
+    Returns:
+        Số connection mở thành công
     """
     if not config.BACKEND_URL:
-        raise BackendServiceError("BACKEND_URL chưa được cấu hình")
+        return 0
+    url = f"{config.BACKEND_URL.rstrip('/')}{config.BACKEND_WARMUP_PATH}"
+    client = await start_backend_client()
+    # Gửi đồng thời → pool phải mở `count` connection riêng
+    results = await asyncio.gather(*(client.get(url) for _ in range(count)), return_exceptions=True)
+    errors = [result for result in results if isinstance(result, Exception)]
+    if errors and len(errors) == len(results):
+        raise BackendUnavailableError(f"Không kết nối được tới Backend: {errors[0]!r}")
+    return len(results) - len(errors)
+
+
+def get_backend_client_stats() -> Dict[str, Any]:
+    """
+    Thống kê sử dụng connection pool của Backend HTTP client
     
+    Returns:
+        Dict gồm số request, request đang chạy, và số connection trong pool
+    """
+    stats: Dict[str, Any] = dict(_client_stats)
+    stats["connections_total"] = 0
+    stats["connections_idle"] = 0
+    stats["connections_active"] = 0
+
+    # httpx không public connection pool → đọc best-effort từ httpcore
+    transport = getattr(_backend_client, "_transport", None) if _backend_client else None
+    pool = getattr(transport, "_pool", None)
+    for connection in getattr(pool, "connections", None) or []:
+        stats["connections_total"] += 1
+        if connection.is_idle():
+            stats["connections_idle"] += 1
+        else:
+            stats["connections_active"] += 1
+    return stats
+
+
+@asynccontextmanager
+async def _tracked_request() -> AsyncIterator[httpx.AsyncClient]:
+    """Đếm request đang chạy trên client dùng chung"""
+    client = get_backend_client()
+    _client_stats["requests_total"] += 1
+    _client_stats["requests_in_flight"] += 1
+    _client_stats["peak_in_flight"] = max(_client_stats["peak_in_flight"], _client_stats["requests_in_flight"])
+    try:
+        yield client
+    finally:
+        _client_stats["requests_in_flight"] -= 1
+
+
+def _hr_query_request(
+    query: str,
+    teams_token: str,
+    user_id: str,
+    conversation_id: Optional[str],
+    session_token: Optional[str] = None
+) -> Tuple[str, Dict[str, Any], Dict[str, str]]:
+    """Endpoint, payload và headers cho HR query (session token của Backend nếu có, nếu không thì Teams token)"""
     endpoint = f"{config.BACKEND_URL.rstrip('/')}/api/v1/hr/query"
     
     payload = {
@@ -62,53 +281,391 @@ async def call_backend_hr_api(
         "include_metadata": True
     }
     
-    headers = {
-        "X-Teams-Token": teams_token,  # ✅ Gửi Teams token trong header riêng
-        "Content-Type": "application/json"
-    }
+    headers = {"Content-Type": "application/json"}
+    if session_token:
+        headers["Authorization"] = f"Bearer {session_token}"
+    else:
+        headers["X-Teams-Token"] = teams_token  # ✅ Gửi Teams token trong header riêng
+    if config.BACKEND_IDEMPOTENCY_KEY_ENABLED:
+        # Một key cho mỗi lời gọi: retry / hedged request dùng lại cùng headers → Backend xử lý lượt hội thoại một lần
+        headers["Idempotency-Key"] = uuid.uuid4().hex
+    return endpoint, payload, headers
+
+
+def _idempotent(headers: Dict[str, str]) -> bool:
+    """Request có Idempotency-Key → gửi lại được kể cả khi Backend có thể đã xử lý"""
+    return "Idempotency-Key" in headers
+
+
+def _unauthorized_error(headers: Dict[str, str]) -> AuthenticationError:
+    """401 với session token → đổi session mới; 401 với Teams token → user cần authenticate lại"""
+    if "Authorization" in headers:
+        return SessionExpiredError("Session của Backend hết hạn")
+    return AuthenticationError("Token không hợp lệ, vui lòng authenticate lại bằng cách gõ 'auth'")
+
+
+async def _post_hr_query(endpoint: str, body: bytes, headers: Dict[str, str]) -> HRQueryResponse:
+    """
+    Một lần gọi HR query (không retry), cập nhật circuit breaker và latency
     
+    Raises:
+        AuthenticationError: Nếu token invalid (401)
+        BackendUnavailableError: Timeout, lỗi kết nối, 429/5xx
+        BackendServiceError: Các lỗi khác
+    """
+    started = time.monotonic()
     try:
-        async with httpx.AsyncClient(timeout=60.0) as client:  # 60s timeout cho HR query
+        # Timeout tối đa 60s nhưng không vượt quá thời gian còn lại của activity
+        timeout = stage_timeout("backend", 60.0)
+        async with _tracked_request() as client:
             response = await client.post(
                 endpoint,
-                json=payload,
-                headers=headers
+                content=body,
+                headers={**headers, **deadline_headers()},
+                timeout=timeout
             )
             
             if response.status_code == 401:
                 # Token invalid → cần re-authenticate
                 logger.warning("Backend trả về 401 - Token không hợp lệ")
-                raise AuthenticationError("Token không hợp lệ, vui lòng authenticate lại bằng cách gõ 'auth'")
+                # Backend vẫn phản hồi bình thường → không tính là lỗi của circuit breaker
+                backend_breaker.record_success()
+                raise _unauthorized_error(headers)
             
             response.raise_for_status()
-            return response.json()
-            
+            result = HRQueryResponse.from_json(_record_response_body(response))
+        
+        elapsed = time.monotonic() - started
+        backend_breaker.record_success()
+        backend_latency.record(elapsed)
+        annotate_trace(backend_seconds=round(elapsed, 4))
+        return result
+    
+    except BackendServiceError:
+        raise
     except httpx.HTTPStatusError as e:
-        logger.error(
-            f"Backend API error: {e.response.status_code}",
-            status_code=e.response.status_code,
-            response_text=e.response.text[:200]
-        )
-        if e.response.status_code == 401:
-            raise AuthenticationError("Token không hợp lệ, vui lòng authenticate lại")
-        raise BackendServiceError(f"Backend API error: {e.response.status_code}")
-    except httpx.TimeoutException:
+        status_code = e.response.status_code
+        logger.error("Backend API error", status_code=status_code, response_text=e.response.text[:200])
+        if status_code in _RETRYABLE_STATUS_CODES:
+            backend_breaker.record_failure()
+            raise BackendUnavailableError(
+                f"Backend API error: {status_code}",
+                retryable=status_code in _UNPROCESSED_STATUS_CODES or _idempotent(headers)
+            )
+        if status_code >= 500:
+            backend_breaker.record_failure()
+            raise BackendUnavailableError(f"Backend API error: {status_code}", retryable=False)
+        backend_breaker.record_success()
+        raise BackendServiceError(f"Backend API error: {status_code}")
+    except httpx.TimeoutException as e:
+        deadline = current_deadline()
+        if deadline is not None and deadline.expired:
+            # Hết ngân sách của activity, không phải lỗi của Backend → trả lại slot thử
+            backend_breaker.release()
+            raise deadline.exceeded("backend")
         logger.error("Backend API timeout")
-        raise BackendServiceError("Backend không phản hồi, vui lòng thử lại sau")
+        backend_breaker.record_failure()
+        # Timeout khi đang đợi response → Backend có thể đã xử lý request
+        raise BackendUnavailableError(
+            "Backend không phản hồi, vui lòng thử lại sau",
+            retryable=isinstance(e, (httpx.ConnectTimeout, httpx.PoolTimeout)) or _idempotent(headers)
+        )
     except httpx.RequestError as e:
         logger.error(f"Backend API request error: {e}")
-        raise BackendServiceError(f"Không thể kết nối đến Backend: {str(e)}")
+        backend_breaker.record_failure()
+        raise BackendUnavailableError(
+            f"Không thể kết nối đến Backend: {str(e)}",
+            retryable=isinstance(e, httpx.ConnectError) or _idempotent(headers)
+        )
+    except (asyncio.CancelledError, DeadlineExceeded):
+        # Request thử của half_open bị cancel (supersede, deadline) → trả lại slot thử
+        backend_breaker.release()
+        raise
     except Exception as e:
         logger.error(f"Unexpected error khi gọi Backend: {e}", exc_info=True)
+        backend_breaker.record_failure()
         raise BackendServiceError(f"Lỗi không mong đợi: {str(e)}")
 
 
+def _hedge_delay(headers: Dict[str, str]) -> Optional[float]:
+    """Delay trước khi gửi hedged request, dựa trên p95 latency gần đây (chỉ hedge khi có Idempotency-Key)"""
+    if not config.BACKEND_HEDGE_ENABLED or len(backend_latency) < config.BACKEND_HEDGE_MIN_SAMPLES:
+        return None
+    if not _idempotent(headers):
+        return None
+    if backend_breaker.state != "closed":
+        return None
+    return max(config.BACKEND_HEDGE_MIN_DELAY, backend_latency.percentile(95))
+
+
+def _on_hedge() -> None:
+    _resilience_stats["hedges"] += 1
+
+
+async def call_backend_hr_api(
+    query: str,
+    teams_token: str,
+    user_id: str,
+    conversation_id: Optional[str] = None,
+    session_token: Optional[str] = None
+) -> HRQueryResponse:
+    """
+    Gọi Backend HR API để xử lý query
+    
+    Có circuit breaker (fail fast khi Backend lỗi liên tục), retry với jittered
+    exponential backoff cho lỗi tạm thời, và hedged request tuỳ chọn. Không có
+    Idempotency-Key thì chỉ retry khi Backend chắc chắn chưa xử lý request
+    (lỗi kết nối, 429, 503) và không hedge.
+    
+    Args:
+        query: Câu hỏi của user
+        teams_token: Teams token để authenticate
+        user_id: User ID
+        conversation_id: Conversation ID (optional)
+        session_token: Session token của Backend, gửi thay cho Teams token (optional)
+    
+    Returns:
+        HRQueryResponse (answer, conversation_id, sources, metadata)
+    
+    Raises:
+        AuthenticationError: Nếu token invalid (401)
+        SessionExpiredError: Nếu session token bị từ chối (401)
+        CircuitOpenError: Nếu circuit breaker đang mở
+        BackendServiceError: Nếu có lỗi khác
+    """
+    if not config.BACKEND_URL:
+        raise BackendServiceError("BACKEND_URL chưa được cấu hình")
+    
+    endpoint, payload, headers = _hr_query_request(query, teams_token, user_id, conversation_id, session_token)
+    body = _encode_body(payload, headers)
+    
+    attempt = 0
+    while True:
+        if not backend_breaker.allow():
+            _resilience_stats["short_circuited"] += 1
+            raise CircuitOpenError("Backend đang gặp sự cố, vui lòng thử lại sau ít phút")
+        try:
+            return await hedged_call(
+                lambda: _post_hr_query(endpoint, body, headers),
+                _hedge_delay(headers),
+                on_hedge=_on_hedge
+            )
+        except BackendUnavailableError as e:
+            if not e.retryable or attempt >= config.BACKEND_MAX_RETRIES:
+                raise
+            delay = backoff_delay(attempt, config.BACKEND_RETRY_BASE_DELAY, config.BACKEND_RETRY_MAX_DELAY)
+            deadline = current_deadline()
+            if deadline is not None and deadline.remaining() <= delay:
+                # Không còn đủ thời gian để retry
+                raise
+            attempt += 1
+            _resilience_stats["retries"] += 1
+            logger.warning(f"Backend lỗi tạm thời ({e}), retry lần {attempt} sau {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+
+def get_backend_resilience_stats() -> Dict[str, Any]:
+    """Thống kê circuit breaker, retry, hedge và latency của Backend"""
+    stats: Dict[str, Any] = dict(_resilience_stats)
+    stats["breaker"] = backend_breaker.stats()
+    stats["latency_p50"] = backend_latency.percentile(50)
+    stats["latency_p95"] = backend_latency.percentile(95)
+    return stats
+
+
+def _parse_stream_event(data: str) -> Optional[Dict[str, Any]]:
+    """
+    Chuẩn hoá một event stream từ Backend
+    
+    Hỗ trợ các dạng:
+        {"type": "delta", "text": "..."} (hoặc "content"/"delta")
+        {"type": "sources", "sources": [...]}
+        {"type": "final"/"done", "answer": "...", "sources": [...], "metadata": {...}}
+    """
+    data = data.strip()
+    if not data or data == "[DONE]":
+        return None
+    try:
+        event = json_codec.loads(data)
+    except ValueError:
+        # Backend gửi text thuần → coi như một đoạn answer
+        return {"type": "delta", "text": data}
+    if not isinstance(event, dict):
+        return None
+
+    event_type = event.get("type") or event.get("event")
+    if event_type in ("delta", "token", "chunk"):
+        text = event.get("text") or event.get("content") or event.get("delta") or ""
+        return {"type": "delta", "text": text}
+    if event_type == "sources":
+        return {"type": "sources", "sources": event.get("sources") or []}
+    if event_type in ("final", "done", "complete") or "answer" in event:
+        return {"type": "final", "response": event}
+    return None
+
+
+async def stream_backend_hr_api(
+    query: str,
+    teams_token: str,
+    user_id: str,
+    conversation_id: Optional[str] = None,
+    session_token: Optional[str] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Gọi Backend HR API ở chế độ streaming (SSE hoặc NDJSON)
+    
+    Nếu Backend trả về JSON thông thường (không hỗ trợ streaming), chỉ yield
+    một event "final" với toàn bộ response - giống call_backend_hr_api.
+    
+    Args:
+        query: Câu hỏi của user
+        teams_token: Teams token để authenticate
+        user_id: User ID
+        conversation_id: Conversation ID (optional)
+        session_token: Session token của Backend, gửi thay cho Teams token (optional)
+    
+    Yields:
+        {"type": "delta", "text": "..."} cho từng đoạn answer, và cuối cùng
+        {"type": "final", "response": HRQueryResponse}
+    
+    Raises:
+        AuthenticationError: Nếu token invalid (401)
+        BackendServiceError: Nếu có lỗi khác
+    """
+    if not config.BACKEND_URL:
+        raise BackendServiceError("BACKEND_URL chưa được cấu hình")
+    
+    endpoint, payload, headers = _hr_query_request(query, teams_token, user_id, conversation_id, session_token)
+    payload["stream"] = True
+    headers["Accept"] = "text/event-stream, application/x-ndjson, application/json"
+    
+    # Hết deadline thì dừng trước khi lấy slot của circuit breaker
+    timeout = stage_timeout("backend", 60.0)
+    # Streaming không retry (answer có thể đã gửi một phần) nhưng vẫn fail fast khi Backend lỗi
+    if not backend_breaker.allow():
+        _resilience_stats["short_circuited"] += 1
+        raise CircuitOpenError("Backend đang gặp sự cố, vui lòng thử lại sau ít phút")
+    
+    headers.update(deadline_headers())
+    body = _encode_body(payload, headers)
+    started = time.monotonic()
+    # Circuit breaker đã nhận kết quả chưa - nếu chưa (cancel, supersede, hết deadline) thì trả lại slot thử
+    reported = False
+    
+    try:
+        async with _tracked_request() as client:
+            async with client.stream("POST", endpoint, content=body, headers=headers, timeout=timeout) as response:
+                if response.status_code == 401:
+                    logger.warning("Backend trả về 401 - Token không hợp lệ")
+                    # Backend vẫn phản hồi bình thường → không tính là lỗi của circuit breaker
+                    backend_breaker.record_success()
+                    reported = True
+                    raise _unauthorized_error(headers)
+                
+                if response.status_code >= 400:
+                    await response.aread()
+                response.raise_for_status()
+                
+                content_type = response.headers.get("content-type", "")
+                if "text/event-stream" not in content_type and "ndjson" not in content_type:
+                    # Backend không stream → trả về toàn bộ response như call_backend_hr_api
+                    await response.aread()
+                    result = HRQueryResponse.from_json(_record_response_body(response))
+                    backend_breaker.record_success()
+                    reported = True
+                    annotate_trace(backend_seconds=round(time.monotonic() - started, 4))
+                    yield {"type": "final", "response": result}
+                    return
+                
+                answer_parts = []
+                sources = []
+                final_response: Optional[Dict[str, Any]] = None
+                sse = "text/event-stream" in content_type
+                data_lines = []
+                
+                async for line in response.aiter_lines():
+                    if sse:
+                        # SSE: gom các dòng "data:" cho đến dòng trống
+                        if line.startswith("data:"):
+                            data_lines.append(line[5:].lstrip())
+                            continue
+                        if line.strip() or not data_lines:
+                            continue
+                        data = "\n".join(data_lines)
+                        data_lines = []
+                    else:
+                        data = line
+                    
+                    event = _parse_stream_event(data)
+                    if event is None:
+                        continue
+                    if event["type"] == "delta":
+                        if event["text"]:
+                            answer_parts.append(event["text"])
+                            yield event
+                    elif event["type"] == "sources":
+                        sources = event["sources"]
+                    else:
+                        final_response = event["response"]
+                
+                if sse and data_lines:
+                    event = _parse_stream_event("\n".join(data_lines))
+                    if event and event["type"] == "delta" and event["text"]:
+                        answer_parts.append(event["text"])
+                        yield event
+                    elif event and event["type"] == "final":
+                        final_response = event["response"]
+                
+                result = HRQueryResponse.from_dict(final_response or {})
+                if not result.answer:
+                    result.answer = "".join(answer_parts)
+                if not result.sources:
+                    result.sources = [Source.from_dict(source) for source in sources]
+                backend_breaker.record_success()
+                reported = True
+                annotate_trace(backend_seconds=round(time.monotonic() - started, 4))
+                yield {"type": "final", "response": result}
+    
+    except (BackendServiceError, DeadlineExceeded):
+        raise
+    except httpx.HTTPStatusError as e:
+        status_code = e.response.status_code
+        logger.error("Backend API error", status_code=status_code, response_text=e.response.text[:200])
+        reported = True
+        if status_code >= 500 or status_code in _RETRYABLE_STATUS_CODES:
+            backend_breaker.record_failure()
+            raise BackendUnavailableError(f"Backend API error: {status_code}", retryable=False)
+        backend_breaker.record_success()
+        raise BackendServiceError(f"Backend API error: {status_code}")
+    except httpx.TimeoutException:
+        deadline = current_deadline()
+        if deadline is not None and deadline.expired:
+            raise deadline.exceeded("backend")
+        logger.error("Backend API timeout (streaming)")
+        backend_breaker.record_failure()
+        reported = True
+        raise BackendUnavailableError("Backend không phản hồi, vui lòng thử lại sau", retryable=False)
+    except httpx.RequestError as e:
+        logger.error(f"Backend API request error: {e}")
+        backend_breaker.record_failure()
+        reported = True
+        raise BackendUnavailableError(f"Không thể kết nối đến Backend: {str(e)}", retryable=False)
+    except Exception as e:
+        logger.error(f"Unexpected error khi stream từ Backend: {e}", exc_info=True)
+        backend_breaker.record_failure()
+        reported = True
+        raise BackendServiceError(f"Lỗi không mong đợi: {str(e)}")
+    finally:
+        if not reported:
+            backend_breaker.release()
+
 async def send_teams_token_to_backend(
     user_id: str,
     token: str,
     tenant_id: Optional[str] = None,
-    additional_data: Optional[Dict[str, Any]] = None
-) -> Dict[str, Any]:
+    additional_data: Optional[Dict[str, Any]] = None,
+    issue_session: bool = False
+) -> AuthResponse:
     """
     Gửi Teams token xuống Backend để authenticate
     
@@ -117,21 +674,14 @@ async def send_teams_token_to_backend(
         token: Access token từ Teams SSO
         tenant_id: Tenant ID (optional)
         additional_data: Dữ liệu bổ sung (optional)
+        issue_session: Xin session token ngắn hạn để dùng cho các HR query sau
     
     Returns:
-        Response từ Backend với format:
-        {
-            "success": True,
-            "message": "...",
-            "user": {...}
-        }
-    
-    Raises:
-        BackendServiceError: Nếu có lỗi
+        AuthResponse (success, message, user, session_token); lỗi được trả về trong `error`, không raise
     """
     if not config.BACKEND_URL:
         logger.warning("BACKEND_URL chưa được cấu hình, không thể gửi token xuống backend")
-        return {"error": "Backend URL not configured"}
+        return AuthResponse.failed("Backend URL not configured")
     
     endpoint = f"{config.BACKEND_URL.rstrip('/')}{config.BACKEND_AUTH_ENDPOINT}"
     
@@ -143,36 +693,43 @@ async def send_teams_token_to_backend(
     
     if additional_data:
         payload.update(additional_data)
+    if issue_session:
+        payload["issue_session"] = True
+    
+    timeout = stage_timeout("backend_auth", 30.0)
+    headers = {"Content-Type": "application/json"}
+    body = _encode_body(payload, headers)
     
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with _tracked_request() as client:
             response = await client.post(
                 endpoint,
-                json=payload,
-                headers={"Content-Type": "application/json"}
+                content=body,
+                headers={**headers, **deadline_headers()},
+                timeout=timeout
             )
             
             if response.status_code == 401:
                 logger.warning("Backend trả về 401 khi gửi Teams token")
-                return {"error": "Token không hợp lệ"}
+                return AuthResponse.failed("Token không hợp lệ", status_code=401)
             
             response.raise_for_status()
-            return response.json()
+            return AuthResponse.from_json(_record_response_body(response))
             
     except httpx.HTTPStatusError as e:
         logger.error(
-            f"Lỗi khi gửi token xuống backend: {e.response.status_code}",
+            "Lỗi khi gửi token xuống backend",
             status_code=e.response.status_code,
             response_text=e.response.text[:200]
         )
-        return {"error": f"Backend error: {e.response.status_code}"}
+        return AuthResponse.failed(f"Backend error: {e.response.status_code}", status_code=e.response.status_code)
     except httpx.TimeoutException:
         logger.error("Backend timeout khi gửi token")
-        return {"error": "Backend không phản hồi"}
+        return AuthResponse.failed("Backend không phản hồi")
     except httpx.RequestError as e:
         logger.error(f"Lỗi khi kết nối đến backend: {e}")
-        return {"error": f"Không thể kết nối đến Backend: {str(e)}"}
+        return AuthResponse.failed(f"Không thể kết nối đến Backend: {str(e)}")
     except Exception as e:
         logger.error(f"Lỗi không mong đợi: {e}", exc_info=True)
-        return {"error": str(e)}
+        return AuthResponse.failed(str(e))
 
@@ -0,0 +1,205 @@
+"""
+Backend Session
+Đổi Teams token lấy session token ngắn hạn của Backend (BACKEND_SESSION_ENABLED) và cache theo user
+đến gần lúc hết hạn. HR query gửi session token thay cho Teams token để Backend không phải verify
+JWT của Microsoft mỗi câu hỏi; Backend từ chối session (401) → đổi session mới và gọi lại một lần.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+from config import Config
+from backend_models import AuthResponse
+from backend_service import (
+    AuthenticationError,
+    SessionExpiredError,
+    send_teams_token_to_backend,
+    stream_backend_hr_api
+)
+from metrics import track_stage
+from shared_state import get_shared_state
+from user_token_cache import UserTokenCache
+
+config = Config()
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+SESSION_CONNECTION = "backend"
+# Session cấp cho một tenant → cache theo (user, tenant)
+SESSION_SCOPE = "session"
+
+session_cache = UserTokenCache(
+    safety_margin=config.BACKEND_SESSION_MARGIN_SECONDS,
+    max_entries=config.USER_TOKEN_CACHE_MAX_ENTRIES,
+    shared=get_shared_state(),
+    local_ttl=config.SHARED_STATE_LOCAL_TTL_SECONDS,
+    namespace="backend_session"
+)
+
+_stats: Dict[str, int] = {
+    "exchanges": 0,
+    "exchange_errors": 0,
+    "exchanges_skipped": 0,
+    "reexchanges": 0,
+    "unsupported": 0,
+}
+# Backend không trả về session_token → dùng Teams token như trước đến mốc này (time.monotonic()) rồi thử lại
+_unsupported_until = 0.0
+# (user, tenant) vừa đổi session lỗi → dùng Teams token, không gọi Backend đổi lại đến mốc này
+_failed_until: Dict[Tuple[str, str], float] = {}
+
+
+def session_enabled() -> bool:
+    return config.BACKEND_SESSION_ENABLED and time.monotonic() >= _unsupported_until
+
+
+def _session_scope(tenant_id: Optional[str]) -> str:
+    return f"{SESSION_SCOPE}:{tenant_id or ''}"
+
+
+def _remember_failure(key: Tuple[str, str]) -> None:
+    now = time.monotonic()
+    if len(_failed_until) >= config.USER_TOKEN_CACHE_MAX_ENTRIES:
+        for stale in [k for k, until in _failed_until.items() if until <= now]:
+            del _failed_until[stale]
+        if len(_failed_until) >= config.USER_TOKEN_CACHE_MAX_ENTRIES:
+            del _failed_until[next(iter(_failed_until))]
+    _failed_until[key] = now + config.BACKEND_SESSION_FAILURE_TTL_SECONDS
+
+
+async def _exchange(user_id: str, teams_token: str, tenant_id: Optional[str]) -> Optional[Tuple[str, float]]:
+    """
+    Đổi Teams token lấy session của tenant, None nếu không đổi được (HR query dùng Teams token)
+
+    Raises:
+        AuthenticationError: Backend từ chối Teams token
+    """
+    global _unsupported_until
+    _stats["exchanges"] += 1
+    with track_stage("backend_session"):
+        response = await send_teams_token_to_backend(
+            user_id=user_id,
+            token=teams_token,
+            tenant_id=tenant_id,
+            issue_session=True
+        )
+    if response.unauthorized:
+        raise AuthenticationError("Token không hợp lệ, vui lòng authenticate lại bằng cách gõ 'auth'")
+    if not response.ok:
+        _stats["exchange_errors"] += 1
+        _remember_failure((user_id, tenant_id or ""))
+        logger.warning(f"Không đổi được session của Backend, dùng Teams token: {response.error}")
+        return None
+    if not response.session_token:
+        _stats["unsupported"] += 1
+        _unsupported_until = time.monotonic() + config.BACKEND_SESSION_UNSUPPORTED_BACKOFF_SECONDS
+        logger.warning(
+            "Backend không trả về session_token, dùng Teams token trong "
+            f"{config.BACKEND_SESSION_UNSUPPORTED_BACKOFF_SECONDS:.0f}s"
+        )
+        return None
+    return response.session_token, _expires_at(response)
+
+
+def _expires_at(response: AuthResponse) -> float:
+    if response.session_expires_at is not None:
+        return response.session_expires_at
+    return time.time() + config.BACKEND_SESSION_DEFAULT_TTL_SECONDS
+
+
+async def get_backend_session(user_id: str, teams_token: str, tenant_id: Optional[str] = None) -> Optional[str]:
+    """Session token còn hạn của user trong tenant (đổi mới nếu chưa có), None khi không dùng session"""
+    if not session_enabled():
+        return None
+    failed_until = _failed_until.get((user_id, tenant_id or ""))
+    if failed_until is not None:
+        if time.monotonic() < failed_until:
+            _stats["exchanges_skipped"] += 1
+            return None
+        del _failed_until[(user_id, tenant_id or "")]
+    return await session_cache.get_token(
+        user_id, SESSION_CONNECTION, _session_scope(tenant_id), lambda: _exchange(user_id, teams_token, tenant_id)
+    )
+
+
+async def remember_session(user_id: str, response: AuthResponse, tenant_id: Optional[str] = None) -> None:
+    """Lưu session Backend trả về khi user authenticate (lệnh auth / SSO)"""
+    _failed_until.pop((user_id, tenant_id or ""), None)
+    if response.session_token:
+        await session_cache.put(
+            user_id, SESSION_CONNECTION, _session_scope(tenant_id), response.session_token, _expires_at(response)
+        )
+    else:
+        invalidate_session(user_id, tenant_id)
+
+
+def invalidate_session(user_id: str, tenant_id: Optional[str] = None) -> Optional[asyncio.Task]:
+    """Bỏ session của user trong tenant, hoặc mọi session của user (Teams token mới / bị từ chối)"""
+    if tenant_id is None:
+        return session_cache.invalidate(user_id, SESSION_CONNECTION)
+    return session_cache.invalidate(user_id, SESSION_CONNECTION, _session_scope(tenant_id))
+
+
+async def _renew_session(user_id: str, teams_token: str, tenant_id: Optional[str]) -> Optional[str]:
+    _stats["reexchanges"] += 1
+    logger.info("Session của Backend hết hạn, đổi session mới")
+    task = invalidate_session(user_id, tenant_id)
+    if task is not None:
+        # Chờ xoá xong trong shared state, nếu không sẽ đọc lại đúng session vừa bị từ chối
+        await task
+    return await get_backend_session(user_id, teams_token, tenant_id)
+
+
+async def with_backend_session(
+    user_id: str,
+    teams_token: str,
+    call: Callable[[Optional[str]], Awaitable[T]],
+    tenant_id: Optional[str] = None
+) -> T:
+    """
+    Gọi `call(session_token)`; Backend từ chối session → đổi session mới và gọi lại một lần
+
+    Raises:
+        AuthenticationError: Backend từ chối Teams token (hoặc từ chối cả session vừa đổi)
+    """
+    session_token = await get_backend_session(user_id, teams_token, tenant_id)
+    try:
+        return await call(session_token)
+    except SessionExpiredError:
+        return await call(await _renew_session(user_id, teams_token, tenant_id))
+
+
+async def stream_with_backend_session(
+    query: str,
+    teams_token: str,
+    user_id: str,
+    conversation_id: Optional[str] = None,
+    tenant_id: Optional[str] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """stream_backend_hr_api có dùng session (401 xảy ra trước event đầu tiên nên gọi lại được)"""
+    session_token = await get_backend_session(user_id, teams_token, tenant_id)
+    for attempt in range(2):
+        try:
+            async for event in stream_backend_hr_api(
+                query=query,
+                teams_token=teams_token,
+                user_id=user_id,
+                conversation_id=conversation_id,
+                session_token=session_token
+            ):
+                yield event
+            return
+        except SessionExpiredError:
+            if attempt:
+                raise
+            session_token = await _renew_session(user_id, teams_token, tenant_id)
+
+
+def get_backend_session_stats() -> Dict[str, Any]:
+    stats: Dict[str, Any] = dict(_stats)
+    stats["enabled"] = int(session_enabled())
+    stats["failed_users"] = len(_failed_until)
+    stats["cache"] = session_cache.stats()
+    return stats
@@ -32,6 +32,10 @@ class Config:
         )
         # Tự động sửa về 3978 nếu phát hiện port 8386
         PORT = 3978
+
+    # Số worker process dùng chung port (1 = một process như trước)
+    WORKERS = int(os.environ.get("WORKERS", "1"))
+
     APP_ID = os.environ.get("CLIENT_ID", "")
     APP_PASSWORD = os.environ.get("CLIENT_SECRET", "")
     APP_TYPE = os.environ.get("BOT_TYPE", "")
@@ -54,3 +58,129 @@ class Config:
     # Backend configuration for token forwarding
     BACKEND_URL = os.environ.get("BACKEND_URL", "") # Backend API URL để gửi token
     BACKEND_AUTH_ENDPOINT = os.environ.get("BACKEND_AUTH_ENDPOINT", "/api/auth/teams-token") # Endpoint để gửi token
+
+    # Đổi Teams token lấy session token ngắn hạn của Backend (Backend không phải verify JWT của Microsoft mỗi câu hỏi)
+    BACKEND_SESSION_ENABLED = os.environ.get("BACKEND_SESSION_ENABLED", "false").lower() in ("1", "true", "yes") # Backend phải trả về session_token
+    BACKEND_SESSION_MARGIN_SECONDS = float(os.environ.get("BACKEND_SESSION_MARGIN_SECONDS", "30")) # Đổi session mới trước khi hết hạn
+    BACKEND_SESSION_DEFAULT_TTL_SECONDS = float(os.environ.get("BACKEND_SESSION_DEFAULT_TTL_SECONDS", "300")) # Khi Backend không trả về expires_in/expires_at
+    BACKEND_SESSION_UNSUPPORTED_BACKOFF_SECONDS = float(os.environ.get("BACKEND_SESSION_UNSUPPORTED_BACKOFF_SECONDS", "300")) # Backend không trả về session_token → dùng Teams token trong thời gian này rồi thử lại
+    BACKEND_SESSION_FAILURE_TTL_SECONDS = float(os.environ.get("BACKEND_SESSION_FAILURE_TTL_SECONDS", "30")) # Đổi session của user lỗi → không đổi lại trong thời gian này
+
+    # Connection pool cho HTTP client dùng chung khi gọi Backend
+    BACKEND_MAX_CONNECTIONS = int(os.environ.get("BACKEND_MAX_CONNECTIONS", "100")) # Tổng số connection tối đa
+    BACKEND_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("BACKEND_MAX_KEEPALIVE_CONNECTIONS", "20")) # Số connection idle được giữ lại
+    BACKEND_KEEPALIVE_EXPIRY = float(os.environ.get("BACKEND_KEEPALIVE_EXPIRY", "30")) # Giây trước khi đóng connection idle
+    BACKEND_CONNECT_TIMEOUT = float(os.environ.get("BACKEND_CONNECT_TIMEOUT", "5")) # Timeout khi mở connection mới
+    BACKEND_HTTP2 = os.environ.get("BACKEND_HTTP2", "false").lower() in ("1", "true", "yes") # Bật HTTP/2 (cần package h2)
+
+    # Nén body khi gọi Backend: none, gzip, br (br cần package brotli)
+    BACKEND_REQUEST_COMPRESSION = os.environ.get("BACKEND_REQUEST_COMPRESSION", "none") # Nén request body (Backend phải hỗ trợ Content-Encoding)
+    BACKEND_REQUEST_COMPRESSION_MIN_BYTES = int(os.environ.get("BACKEND_REQUEST_COMPRESSION_MIN_BYTES", "1024")) # Body nhỏ hơn không nén
+    BACKEND_RESPONSE_COMPRESSION = os.environ.get("BACKEND_RESPONSE_COMPRESSION", "auto") # Accept-Encoding: auto (mặc định của httpx), none, gzip, br
+
+    # Số entry tối đa của cache token trong process (session Backend)
+    USER_TOKEN_CACHE_MAX_ENTRIES = int(os.environ.get("USER_TOKEN_CACHE_MAX_ENTRIES", "10000"))
+
+    # Giới hạn conversation memory trong process
+    CONVERSATION_MAX_CONVERSATIONS = int(os.environ.get("CONVERSATION_MAX_CONVERSATIONS", "5000")) # Số conversation giữ trong memory (LRU)
+    CONVERSATION_IDLE_TTL_SECONDS = float(os.environ.get("CONVERSATION_IDLE_TTL_SECONDS", "3600")) # Bỏ conversation idle quá thời gian này
+    CONVERSATION_MAX_MESSAGES = int(os.environ.get("CONVERSATION_MAX_MESSAGES", "50")) # Số message tối đa mỗi conversation
+
+    # Backend lưu conversation history: none (chỉ trong process), memory, sqlite
+    # Nhiều worker → mặc định sqlite để các worker thấy cùng history
+    CONVERSATION_STORAGE = os.environ.get("CONVERSATION_STORAGE", "sqlite" if WORKERS > 1 else "none")
+    CONVERSATION_SQLITE_PATH = os.environ.get("CONVERSATION_SQLITE_PATH", str(Path(__file__).parent.parent / "data" / "conversations.db"))
+
+    # Stream answer từ Backend (SSE/NDJSON) thay vì chờ toàn bộ JSON
+    BACKEND_STREAMING = os.environ.get("BACKEND_STREAMING", "false").lower() in ("1", "true", "yes")
+
+    # Cache answer của Backend HR API (chỉ answer được Backend đánh dấu cacheable)
+    ANSWER_CACHE_ENABLED = os.environ.get("ANSWER_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+    ANSWER_CACHE_TTL_SECONDS = float(os.environ.get("ANSWER_CACHE_TTL_SECONDS", "600")) # TTL mặc định nếu Backend không trả về cache_ttl
+    ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", "5000"))
+
+    # Semantic cache: câu hỏi gần nghĩa dùng lại answer (cần LITELLM_DEFAULT_EMBEDDING_MODEL)
+    SEMANTIC_CACHE_ENABLED = os.environ.get("SEMANTIC_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+    SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.92")) # Cosine similarity tối thiểu
+    SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get("SEMANTIC_CACHE_MAX_ENTRIES", "2000"))
+    SEMANTIC_CACHE_TIMEOUT_SECONDS = float(os.environ.get("SEMANTIC_CACHE_TIMEOUT_SECONDS", "0.3")) # Embedding chậm hơn → bỏ qua semantic cache
+
+    # Gộp các HR query giống nhau đang chờ Backend thành một lời gọi
+    BACKEND_SINGLE_FLIGHT_ENABLED = os.environ.get("BACKEND_SINGLE_FLIGHT_ENABLED", "true").lower() in ("1", "true", "yes")
+
+    # Resilience cho Backend: circuit breaker, retry, hedged request
+    BACKEND_BREAKER_FAILURE_THRESHOLD = int(os.environ.get("BACKEND_BREAKER_FAILURE_THRESHOLD", "5")) # Số lỗi liên tiếp trước khi mở circuit
+    BACKEND_BREAKER_RECOVERY_SECONDS = float(os.environ.get("BACKEND_BREAKER_RECOVERY_SECONDS", "30")) # Thời gian fail fast trước khi thử lại
+    BACKEND_MAX_RETRIES = int(os.environ.get("BACKEND_MAX_RETRIES", "2")) # Số lần retry cho lỗi tạm thời (lỗi kết nối, 429, 503; thêm timeout, 502, 504 khi có Idempotency-Key)
+    BACKEND_RETRY_BASE_DELAY = float(os.environ.get("BACKEND_RETRY_BASE_DELAY", "0.2"))
+    BACKEND_RETRY_MAX_DELAY = float(os.environ.get("BACKEND_RETRY_MAX_DELAY", "2"))
+    BACKEND_HEDGE_ENABLED = os.environ.get("BACKEND_HEDGE_ENABLED", "false").lower() in ("1", "true", "yes") # Gửi request thứ hai khi request đầu chậm hơn p95
+    BACKEND_HEDGE_MIN_SAMPLES = int(os.environ.get("BACKEND_HEDGE_MIN_SAMPLES", "20"))
+    BACKEND_HEDGE_MIN_DELAY = float(os.environ.get("BACKEND_HEDGE_MIN_DELAY", "0.5"))
+    BACKEND_IDEMPOTENCY_KEY_ENABLED = os.environ.get("BACKEND_IDEMPOTENCY_KEY_ENABLED", "false").lower() in ("1", "true", "yes") # Backend bỏ qua HR query trùng Idempotency-Key → được retry sau timeout/502/504 và hedge
+
+    # Admission control: giới hạn số message xử lý đồng thời
+    ADMISSION_MAX_CONCURRENT = int(os.environ.get("ADMISSION_MAX_CONCURRENT", "50")) # Số message xử lý cùng lúc (toàn bot)
+    ADMISSION_MAX_QUEUE = int(os.environ.get("ADMISSION_MAX_QUEUE", "200")) # Số message chờ tối đa, vượt quá → trả lời "bận"
+    ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT_SECONDS", "10"))
+    ADMISSION_MAX_PER_USER = int(os.environ.get("ADMISSION_MAX_PER_USER", "2"))
+    ADMISSION_MAX_PER_CONVERSATION = int(os.environ.get("ADMISSION_MAX_PER_CONVERSATION", "3"))
+
+    # Message mới trong cùng conversation huỷ request cũ còn đang chạy
+    REQUEST_SUPERSEDE_ENABLED = os.environ.get("REQUEST_SUPERSEDE_ENABLED", "true").lower() in ("1", "true", "yes")
+    REQUEST_SUPERSEDE_GRACE_SECONDS = float(os.environ.get("REQUEST_SUPERSEDE_GRACE_SECONDS", "1")) # Thời gian chờ request cũ dừng hẳn
+
+    # Ngân sách thời gian end-to-end cho mỗi message (token, Backend, LLM dùng chung)
+    REQUEST_DEADLINE_SECONDS = float(os.environ.get("REQUEST_DEADLINE_SECONDS", "45"))
+
+    # Gộp chunk streaming trước khi emit qua ctx.stream
+    STREAM_FLUSH_INTERVAL_SECONDS = float(os.environ.get("STREAM_FLUSH_INTERVAL_SECONDS", "0.5")) # Khoảng cách tối thiểu giữa hai update (HttpStream của SDK debounce 0.5s)
+    STREAM_FLUSH_MAX_CHARS = int(os.environ.get("STREAM_FLUSH_MAX_CHARS", "500")) # Flush sớm khi buffer vượt quá số ký tự này
+
+    # Giới hạn token của history gửi cho LLM, các lượt cũ được tóm tắt chạy nền
+    CONVERSATION_SUMMARY_ENABLED = os.environ.get("CONVERSATION_SUMMARY_ENABLED", "true").lower() in ("1", "true", "yes")
+    CONVERSATION_TOKEN_BUDGET = int(os.environ.get("CONVERSATION_TOKEN_BUDGET", "3000")) # Token tối đa của history (ước lượng ~4 ký tự/token)
+    CONVERSATION_KEEP_TURNS = int(os.environ.get("CONVERSATION_KEEP_TURNS", "4")) # Số lượt hỏi-đáp gần nhất giữ nguyên văn
+
+    # Định tuyến LLM giữa LiteLLM và Azure OpenAI khi cấu hình cả hai
+    MODEL_ROUTING_ENABLED = os.environ.get("MODEL_ROUTING_ENABLED", "true").lower() in ("1", "true", "yes")
+    MODEL_ROUTING_SWITCH_RATIO = float(os.environ.get("MODEL_ROUTING_SWITCH_RATIO", "1.5")) # Chuyển endpoint khi endpoint ưu tiên chậm hơn N lần
+    MODEL_ROUTING_PROBE_RATE = float(os.environ.get("MODEL_ROUTING_PROBE_RATE", "0.05")) # Tỉ lệ request gửi tới endpoint phụ để đo latency
+    MODEL_BREAKER_FAILURE_THRESHOLD = int(os.environ.get("MODEL_BREAKER_FAILURE_THRESHOLD", "3"))
+    MODEL_BREAKER_RECOVERY_SECONDS = float(os.environ.get("MODEL_BREAKER_RECOVERY_SECONDS", "30"))
+
+    # Route /metrics (Prometheus text format) chạy cùng port với /api/messages
+    METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+    # /metrics và /workers: cần header "Authorization: Bearer <ADMIN_TOKEN>", hoặc (ADMIN_TOKEN trống) client thuộc ADMIN_ALLOWED_HOSTS
+    ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+    ADMIN_ALLOWED_HOSTS = [host.strip() for host in os.environ.get("ADMIN_ALLOWED_HOSTS", "127.0.0.1,::1").split(",") if host.strip()]
+
+    # Logging: ghi qua queue + thread nền, format text hoặc JSON lines
+    LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+    LOG_FORMAT = os.environ.get("LOG_FORMAT", "text") # text | json
+    LOG_DEBUG_SAMPLE_RATE = float(os.environ.get("LOG_DEBUG_SAMPLE_RATE", "0.1")) # Tỉ lệ log DEBUG được giữ lại
+    LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000")) # Số log chờ ghi tối đa, vượt quá thì bỏ
+
+    # Ghi trace ẩn danh của traffic (độ dài câu hỏi, khoảng cách message, latency Backend) để replay benchmark
+    TRACE_CAPTURE_PATH = os.environ.get("TRACE_CAPTURE_PATH", "") # Để trống → không ghi trace
+    TRACE_CAPTURE_SAMPLE_RATE = float(os.environ.get("TRACE_CAPTURE_SAMPLE_RATE", "1.0")) # Tỉ lệ conversation được ghi
+    TRACE_CAPTURE_SALT = os.environ.get("TRACE_CAPTURE_SALT", "") # Salt để hash user/conversation ID (trống → ngẫu nhiên mỗi process)
+
+    # Bind port ngay khi process start (trước khi import Teams SDK), request tới sớm chờ thay vì bị từ chối
+    STARTUP_EARLY_BIND = os.environ.get("STARTUP_EARLY_BIND", "true").lower() in ("1", "true", "yes")
+
+    # State dùng chung giữa các worker: none (chỉ trong process) hoặc sqlite (answer cache, session Backend, health của worker)
+    SHARED_STATE = os.environ.get("SHARED_STATE", "sqlite" if WORKERS > 1 else "none")
+    SHARED_STATE_PATH = os.environ.get("SHARED_STATE_PATH", str(Path(__file__).parent.parent / "data" / "shared_state.db"))
+    SHARED_STATE_LOCAL_TTL_SECONDS = float(os.environ.get("SHARED_STATE_LOCAL_TTL_SECONDS", "5")) # Thời gian cache trong process được dùng trước khi đọc lại shared state
+
+    # Supervisor của multi-worker mode
+    WORKER_HEARTBEAT_SECONDS = float(os.environ.get("WORKER_HEARTBEAT_SECONDS", "5")) # Chu kỳ worker ghi health
+    WORKER_HEARTBEAT_TIMEOUT_SECONDS = float(os.environ.get("WORKER_HEARTBEAT_TIMEOUT_SECONDS", "30")) # Quá thời gian này không có heartbeat → restart worker
+    WORKER_SHUTDOWN_GRACE_SECONDS = float(os.environ.get("WORKER_SHUTDOWN_GRACE_SECONDS", "30")) # Chờ worker xử lý xong request trước khi kill
+
+    # Warm-up khi start: mở connection tới Backend/LLM, lấy bot token; /ready chỉ trả 200 khi warm-up xong
+    WARMUP_ENABLED = os.environ.get("WARMUP_ENABLED", "true").lower() in ("1", "true", "yes")
+    WARMUP_TIMEOUT_SECONDS = float(os.environ.get("WARMUP_TIMEOUT_SECONDS", "20")) # Quá thời gian này vẫn chuyển sang ready
+    WARMUP_BACKEND_CONNECTIONS = int(os.environ.get("WARMUP_BACKEND_CONNECTIONS", "4")) # Số connection mở sẵn tới Backend
+    BACKEND_WARMUP_PATH = os.environ.get("BACKEND_WARMUP_PATH", "/health") # Endpoint nhẹ của Backend dùng để warm-up
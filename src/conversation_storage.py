@@ -0,0 +1,358 @@
+"""
+Conversation Storage
+Backend lưu conversation history phía sau ConversationStore:
+- InMemoryConversationStorage: lưu trong process (dùng cho dev/test)
+- SQLiteConversationStorage: SQLite WAL, ghi theo batch (write-behind), nhiều worker
+  trên cùng host có thể dùng chung một file
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Protocol, Tuple
+
+from microsoft.teams.ai import FunctionCall, FunctionMessage, Message, ModelMessage, SystemMessage, UserMessage
+
+logger = logging.getLogger(__name__)
+
+
+def message_to_dict(message: Message) -> Dict[str, Any]:
+    """Chuyển message thành dict để lưu JSON"""
+    data: Dict[str, Any] = {"role": message.role, "content": message.content}
+    if isinstance(message, ModelMessage):
+        data["id"] = message.id
+        if message.function_calls:
+            data["function_calls"] = [
+                {"id": call.id, "name": call.name, "arguments": call.arguments}
+                for call in message.function_calls
+            ]
+    elif isinstance(message, FunctionMessage):
+        data["function_id"] = message.function_id
+    return data
+
+
+def message_from_dict(data: Dict[str, Any]) -> Message:
+    """Khôi phục message từ dict đã lưu"""
+    role = data.get("role")
+    if role == "model":
+        calls = data.get("function_calls")
+        return ModelMessage(
+            content=data.get("content"),
+            function_calls=[FunctionCall(**call) for call in calls] if calls else None,
+            id=data.get("id"),
+        )
+    if role == "function":
+        return FunctionMessage(content=data.get("content"), function_id=data["function_id"])
+    if role == "system":
+        return SystemMessage(content=data.get("content") or "")
+    return UserMessage(content=data.get("content") or "")
+
+
+class ConversationStorage(Protocol):
+    """
+    Interface lưu conversation history
+
+    `shared` = True nghĩa là process khác có thể ghi vào cùng storage, khi đó
+    memory trong process cần gọi `load_since` để lấy message mới của worker khác.
+    """
+
+    shared: bool
+
+    async def load(self, conversation_id: str, limit: int) -> Tuple[List[Message], int]:
+        """Lấy tối đa `limit` message mới nhất và cursor (id lớn nhất đã đọc)"""
+        ...
+
+    async def load_since(self, conversation_id: str, cursor: int) -> Tuple[List[Message], int]:
+        """Lấy message do worker khác ghi sau `cursor`"""
+        ...
+
+    async def append(self, conversation_id: str, messages: List[Message]) -> None:
+        """Thêm message vào cuối history"""
+        ...
+
+    async def replace(self, conversation_id: str, messages: List[Message]) -> None:
+        """Thay toàn bộ history"""
+        ...
+
+    async def delete(self, conversation_id: str) -> None:
+        """Xoá history"""
+        ...
+
+    async def flush(self) -> None:
+        """Ghi các thay đổi đang chờ"""
+        ...
+
+    async def close(self) -> None:
+        """Flush và đóng storage"""
+        ...
+
+    def stats(self) -> Dict[str, Any]:
+        """Thống kê storage"""
+        ...
+
+
+class InMemoryConversationStorage:
+    """
+    Storage trong process, giữ tham chiếu tới chính các message object
+
+    Giới hạn `max_conversations` (LRU) và `max_messages` mỗi conversation.
+    """
+
+    shared = False
+
+    def __init__(self, max_conversations: int = 10000, max_messages: int = 200):
+        self.max_conversations = max_conversations
+        self.max_messages = max_messages
+        self._conversations: "OrderedDict[str, List[Message]]" = OrderedDict()
+        self._stats: Dict[str, int] = {"loads": 0, "appends": 0, "evicted": 0}
+
+    async def load(self, conversation_id: str, limit: int) -> Tuple[List[Message], int]:
+        self._stats["loads"] += 1
+        messages = self._conversations.get(conversation_id, [])
+        return list(messages[-limit:]), 0
+
+    async def load_since(self, conversation_id: str, cursor: int) -> Tuple[List[Message], int]:
+        return [], cursor
+
+    async def append(self, conversation_id: str, messages: List[Message]) -> None:
+        self._stats["appends"] += len(messages)
+        history = self._conversations.setdefault(conversation_id, [])
+        self._conversations.move_to_end(conversation_id)
+        history.extend(messages)
+        del history[:-self.max_messages]
+        while len(self._conversations) > self.max_conversations:
+            self._conversations.popitem(last=False)
+            self._stats["evicted"] += 1
+
+    async def replace(self, conversation_id: str, messages: List[Message]) -> None:
+        self._conversations.pop(conversation_id, None)
+        await self.append(conversation_id, messages)
+
+    async def delete(self, conversation_id: str) -> None:
+        self._conversations.pop(conversation_id, None)
+
+    async def flush(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        self._conversations.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = dict(self._stats)
+        stats["conversations"] = len(self._conversations)
+        return stats
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversation_messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    conversation_id TEXT NOT NULL,
+    writer TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_conversation_messages_conv
+    ON conversation_messages (conversation_id, id);
+CREATE INDEX IF NOT EXISTS idx_conversation_messages_created
+    ON conversation_messages (created_at);
+"""
+
+
+class SQLiteConversationStorage:
+    """
+    Storage SQLite (WAL mode) cho nhiều worker trên cùng host
+
+    - Mọi thao tác SQLite chạy trên một thread riêng, không block event loop
+    - `append` chỉ đưa message vào buffer; buffer được ghi theo batch sau
+      `flush_interval` giây hoặc khi đủ `batch_size` message
+    - Message quá `retention_seconds` được xoá định kỳ
+    """
+
+    shared = True
+
+    def __init__(
+        self,
+        path: str,
+        flush_interval: float = 0.2,
+        batch_size: int = 100,
+        retention_seconds: float = 7 * 24 * 3600,
+    ):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.retention_seconds = retention_seconds
+        # Mỗi process có writer id riêng để phân biệt message của worker khác
+        self.writer_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="conversation-sqlite")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pending: List[Tuple[str, str, str, float]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self._last_retention_run = 0.0
+        self._stats: Dict[str, int] = {
+            "loads": 0,
+            "rows_loaded": 0,
+            "rows_written": 0,
+            "batches_written": 0,
+            "rows_expired": 0,
+        }
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # File chứa nội dung conversation của user → tạo với quyền 0600 (file WAL/SHM theo quyền của file này)
+            if not os.path.exists(self.path):
+                os.close(os.open(self.path, os.O_CREAT | os.O_WRONLY, 0o600))
+            conn = sqlite3.connect(self.path, timeout=10.0, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _load(self, conversation_id: str, limit: int) -> Tuple[List[Dict[str, Any]], int]:
+        conn = self._connection()
+        rows = conn.execute(
+            "SELECT id, payload FROM conversation_messages WHERE conversation_id = ? ORDER BY id DESC LIMIT ?",
+            (conversation_id, limit),
+        ).fetchall()
+        rows.reverse()
+        cursor = rows[-1][0] if rows else 0
+        return [json.loads(payload) for _, payload in rows], cursor
+
+    def _load_since(self, conversation_id: str, cursor: int) -> Tuple[List[Dict[str, Any]], int]:
+        conn = self._connection()
+        rows = conn.execute(
+            "SELECT id, writer, payload FROM conversation_messages WHERE conversation_id = ? AND id > ? ORDER BY id",
+            (conversation_id, cursor),
+        ).fetchall()
+        new_cursor = rows[-1][0] if rows else cursor
+        return [json.loads(payload) for _, writer, payload in rows if writer != self.writer_id], new_cursor
+
+    async def load(self, conversation_id: str, limit: int) -> Tuple[List[Message], int]:
+        # Flush trước để đọc được cả message vừa ghi trong process này
+        await self.flush()
+        self._stats["loads"] += 1
+        rows, cursor = await self._run(self._load, conversation_id, limit)
+        self._stats["rows_loaded"] += len(rows)
+        return [message_from_dict(row) for row in rows], cursor
+
+    async def load_since(self, conversation_id: str, cursor: int) -> Tuple[List[Message], int]:
+        rows, new_cursor = await self._run(self._load_since, conversation_id, cursor)
+        self._stats["rows_loaded"] += len(rows)
+        return [message_from_dict(row) for row in rows], new_cursor
+
+    async def append(self, conversation_id: str, messages: List[Message]) -> None:
+        now = time.time()
+        for message in messages:
+            self._pending.append((conversation_id, self.writer_id, json.dumps(message_to_dict(message)), now))
+        if len(self._pending) >= self.batch_size:
+            await self.flush()
+        elif self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._delayed_flush())
+
+    async def _delayed_flush(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Lỗi khi ghi conversation xuống SQLite: {e}", exc_info=True)
+
+    def _write(self, rows: List[Tuple[str, str, str, float]], expire_before: Optional[float]) -> int:
+        conn = self._connection()
+        expired = 0
+        with conn:
+            if rows:
+                conn.executemany(
+                    "INSERT INTO conversation_messages (conversation_id, writer, payload, created_at) VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+            if expire_before is not None:
+                expired = conn.execute(
+                    "DELETE FROM conversation_messages WHERE created_at < ?", (expire_before,)
+                ).rowcount
+        return expired
+
+    async def flush(self) -> None:
+        now = time.time()
+        expire_before = None
+        if now - self._last_retention_run > 3600:
+            self._last_retention_run = now
+            expire_before = now - self.retention_seconds
+        if not self._pending and expire_before is None:
+            return
+        rows, self._pending = self._pending, []
+        try:
+            expired = await self._run(self._write, rows, expire_before)
+        except Exception:
+            # Ghi lỗi → đưa lại vào buffer để lần flush sau thử lại
+            self._pending[:0] = rows
+            raise
+        if rows:
+            self._stats["rows_written"] += len(rows)
+            self._stats["batches_written"] += 1
+        self._stats["rows_expired"] += expired
+
+    def _delete(self, conversation_id: str) -> None:
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM conversation_messages WHERE conversation_id = ?", (conversation_id,))
+
+    async def replace(self, conversation_id: str, messages: List[Message]) -> None:
+        await self.delete(conversation_id)
+        await self.append(conversation_id, messages)
+
+    async def delete(self, conversation_id: str) -> None:
+        await self.flush()
+        await self._run(self._delete, conversation_id)
+
+    async def close(self) -> None:
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self.flush()
+        if self._conn is not None:
+            await self._run(self._conn.close)
+            self._conn = None
+        self._executor.shutdown(wait=False)
+
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = dict(self._stats)
+        stats["pending_rows"] = len(self._pending)
+        return stats
+
+
+def create_conversation_storage(
+    backend: str,
+    sqlite_path: str = "",
+    max_conversations: int = 10000,
+    max_messages: int = 200,
+) -> Optional[ConversationStorage]:
+    """
+    Tạo storage theo cấu hình CONVERSATION_STORAGE
+
+    Args:
+        backend: "none" (chỉ giữ trong ConversationStore), "memory" hoặc "sqlite"
+        sqlite_path: Đường dẫn file SQLite
+        max_conversations: Giới hạn conversation cho storage in-memory
+        max_messages: Giới hạn message mỗi conversation cho storage in-memory
+
+    Returns:
+        Storage hoặc None
+    """
+    backend = (backend or "none").lower()
+    if backend == "none":
+        return None
+    if backend == "memory":
+        return InMemoryConversationStorage(max_conversations=max_conversations, max_messages=max_messages)
+    if backend == "sqlite":
+        return SQLiteConversationStorage(sqlite_path)
+    raise ValueError(f"CONVERSATION_STORAGE không hợp lệ: {backend} (hỗ trợ: none, memory, sqlite)")
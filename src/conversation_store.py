@@ -0,0 +1,280 @@
+"""
+Conversation Store
+Lưu memory theo conversation với giới hạn: LRU + idle TTL, số message tối đa
+mỗi conversation và thống kê dung lượng xấp xỉ
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+from microsoft.teams.ai import Message, ModelMessage, UserMessage
+
+from conversation_storage import ConversationStorage
+
+logger = logging.getLogger(__name__)
+
+# Overhead ước lượng cho mỗi message object (dataclass + list slot)
+_MESSAGE_OVERHEAD_BYTES = 200
+
+
+def estimate_message_bytes(message: Message) -> int:
+    """Ước lượng dung lượng (bytes) của một message"""
+    size = _MESSAGE_OVERHEAD_BYTES
+    content = getattr(message, "content", None)
+    if content:
+        size += len(content.encode("utf-8"))
+    if isinstance(message, ModelMessage) and message.function_calls:
+        for call in message.function_calls:
+            size += _MESSAGE_OVERHEAD_BYTES + len(call.name) + len(json.dumps(call.arguments, default=str))
+    return size
+
+
+class BoundedListMemory:
+    """
+    Memory (cùng interface với ListMemory) giới hạn số message
+
+    Khi vượt `max_messages`, các message cũ nhất bị bỏ và history luôn bắt đầu
+    bằng một UserMessage để không để lại function result mồ côi.
+
+    Nếu có `storage`, memory này là tầng "hot": history được load lazily từ
+    storage ở lần dùng đầu tiên và mọi message mới được ghi xuống storage.
+    """
+
+    def __init__(
+        self,
+        max_messages: int,
+        on_change: Optional[Callable[[int, int], None]] = None,
+        storage: Optional[ConversationStorage] = None,
+        conversation_id: Optional[str] = None,
+    ):
+        self.max_messages = max_messages
+        self.approx_bytes = 0
+        self._messages: list[Message] = []
+        # on_change(delta_bytes, trimmed_messages) để store cập nhật thống kê
+        self._on_change = on_change
+        self._storage = storage
+        self._conversation_id = conversation_id
+        self._loaded = storage is None
+        self._cursor = 0
+        # Các request cùng conversation chạy song song → chỉ một lần load / refresh từ storage
+        # được đọc và ghép vào history tại một thời điểm (không ghép trùng message)
+        self._sync_lock = asyncio.Lock()
+
+    async def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        async with self._sync_lock:
+            if self._loaded:
+                return
+            messages, self._cursor = await self._storage.load(self._conversation_id, self.max_messages)
+            self._loaded = True
+            self._messages[:0] = messages
+            self._account(sum(estimate_message_bytes(m) for m in messages), 0)
+            self._trim()
+
+    async def _refresh_shared(self) -> None:
+        """Lấy message do worker khác ghi vào cùng conversation"""
+        if self._storage is None or not self._storage.shared:
+            return
+        async with self._sync_lock:
+            messages, self._cursor = await self._storage.load_since(self._conversation_id, self._cursor)
+            if messages:
+                self._messages.extend(messages)
+                self._account(sum(estimate_message_bytes(m) for m in messages), 0)
+                self._trim()
+
+    async def push(self, message: Message) -> None:
+        """Thêm message và cắt bớt history nếu vượt giới hạn"""
+        await self._ensure_loaded()
+        self._messages.append(message)
+        self._account(estimate_message_bytes(message), 0)
+        self._trim()
+        if self._storage is not None:
+            await self._storage.append(self._conversation_id, [message])
+
+    async def get_all(self) -> list[Message]:
+        """Trả về bản sao history theo thứ tự thời gian"""
+        if self._loaded:
+            await self._refresh_shared()
+        else:
+            await self._ensure_loaded()
+        return list(self._messages)
+
+    async def set_all(self, messages: list[Message]) -> None:
+        """Thay toàn bộ history"""
+        async with self._sync_lock:
+            self._loaded = True
+            old_bytes = self.approx_bytes
+            self._messages = list(messages)
+            self._account(sum(estimate_message_bytes(m) for m in self._messages) - old_bytes, 0)
+            self._trim()
+            if self._storage is not None:
+                await self._storage.replace(self._conversation_id, self._messages)
+                # replace đã xoá mọi row cũ → đọc lại từ đầu, chỉ còn row ghi sau history mới
+                self._cursor = 0
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def detach(self) -> None:
+        """Ngừng báo thống kê về store (khi memory bị evict nhưng request cũ vẫn đang dùng)"""
+        self._on_change = None
+
+    def _trim(self) -> None:
+        if len(self._messages) <= self.max_messages:
+            return
+        drop = len(self._messages) - self.max_messages
+        while drop < len(self._messages) and not isinstance(self._messages[drop], UserMessage):
+            drop += 1
+        # Không có UserMessage nào phía sau → giữ nguyên giới hạn cứng
+        if drop >= len(self._messages):
+            drop = len(self._messages) - self.max_messages
+        removed = self._messages[:drop]
+        del self._messages[:drop]
+        self._account(-sum(estimate_message_bytes(m) for m in removed), len(removed))
+
+    def _account(self, delta_bytes: int, trimmed: int) -> None:
+        self.approx_bytes += delta_bytes
+        if self._on_change:
+            self._on_change(delta_bytes, trimmed)
+
+
+@dataclass
+class _StoreEntry:
+    memory: BoundedListMemory
+    last_access: float
+
+
+class ConversationStore:
+    """
+    Store memory theo conversation_id
+
+    - Tối đa `max_conversations` conversation, vượt quá thì bỏ conversation ít dùng nhất (LRU)
+    - Conversation không hoạt động quá `idle_ttl` giây sẽ bị bỏ
+    - Mỗi conversation giữ tối đa `max_messages` message
+    - Nếu có `storage`, store chỉ là tầng hot: conversation bị evict vẫn
+      được load lại từ storage ở lần dùng sau
+    - `memory_factory` cho phép dùng subclass của BoundedListMemory
+      (ví dụ SummarizingMemory)
+    """
+
+    def __init__(
+        self,
+        max_conversations: int = 5000,
+        idle_ttl: float = 3600.0,
+        max_messages: int = 50,
+        storage: Optional[ConversationStorage] = None,
+        memory_factory: Callable[..., BoundedListMemory] = BoundedListMemory,
+    ):
+        self.max_conversations = max_conversations
+        self.idle_ttl = idle_ttl
+        self.max_messages = max_messages
+        self.storage = storage
+        self.memory_factory = memory_factory
+        self._entries: "OrderedDict[str, _StoreEntry]" = OrderedDict()
+        self._resident_bytes = 0
+        self._stats: Dict[str, int] = {
+            "created": 0,
+            "evicted_lru": 0,
+            "evicted_idle": 0,
+            "messages_trimmed": 0,
+            "peak_conversations": 0,
+            "peak_bytes": 0,
+        }
+
+    def get_or_create(self, conversation_id: str) -> BoundedListMemory:
+        """
+        Lấy memory của conversation, tạo mới nếu chưa có
+
+        Args:
+            conversation_id: Conversation ID
+
+        Returns:
+            Memory của conversation
+        """
+        now = time.monotonic()
+        self._evict_idle(now)
+
+        entry = self._entries.get(conversation_id)
+        if entry is not None:
+            entry.last_access = now
+            self._entries.move_to_end(conversation_id)
+            return entry.memory
+
+        while len(self._entries) >= self.max_conversations:
+            self._evict_oldest("evicted_lru")
+
+        memory = self.memory_factory(
+            self.max_messages,
+            on_change=self._on_memory_change,
+            storage=self.storage,
+            conversation_id=conversation_id,
+        )
+        self._entries[conversation_id] = _StoreEntry(memory=memory, last_access=now)
+        self._stats["created"] += 1
+        self._stats["peak_conversations"] = max(self._stats["peak_conversations"], len(self._entries))
+        return memory
+
+    def remove(self, conversation_id: str) -> None:
+        """Xoá memory của conversation"""
+        entry = self._entries.pop(conversation_id, None)
+        if entry is not None:
+            entry.memory.detach()
+            self._resident_bytes -= entry.memory.approx_bytes
+
+    def evict_idle(self) -> int:
+        """
+        Bỏ các conversation đã idle quá TTL
+
+        Returns:
+            Số conversation bị bỏ
+        """
+        return self._evict_idle(time.monotonic())
+
+    def _evict_idle(self, now: float) -> int:
+        # Entry đầu OrderedDict là entry truy cập lâu nhất → chỉ cần kiểm tra từ đầu
+        evicted = 0
+        while self._entries:
+            entry = next(iter(self._entries.values()))
+            if now - entry.last_access < self.idle_ttl:
+                break
+            self._evict_oldest("evicted_idle")
+            evicted += 1
+        return evicted
+
+    def _evict_oldest(self, reason: str) -> None:
+        conversation_id, entry = self._entries.popitem(last=False)
+        entry.memory.detach()
+        self._resident_bytes -= entry.memory.approx_bytes
+        self._stats[reason] += 1
+        logger.debug(f"Bỏ conversation memory {conversation_id} ({reason})")
+
+    def _on_memory_change(self, delta_bytes: int, trimmed: int) -> None:
+        self._resident_bytes += delta_bytes
+        self._stats["messages_trimmed"] += trimmed
+        self._stats["peak_bytes"] = max(self._stats["peak_bytes"], self._resident_bytes)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, conversation_id: object) -> bool:
+        return conversation_id in self._entries
+
+    def stats(self) -> Dict[str, Any]:
+        """Thống kê số conversation, dung lượng và eviction"""
+        stats: Dict[str, Any] = dict(self._stats)
+        stats["conversations"] = len(self._entries)
+        stats["resident_bytes"] = self._resident_bytes
+        stats["messages"] = sum(len(entry.memory) for entry in self._entries.values())
+        if self.storage is not None:
+            stats["storage"] = self.storage.stats()
+        return stats
+
+    async def close(self) -> None:
+        """Ghi các thay đổi đang chờ và đóng storage"""
+        if self.storage is not None:
+            await self.storage.close()
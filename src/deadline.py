@@ -0,0 +1,127 @@
+"""
+Deadline
+Ngân sách thời gian end-to-end cho mỗi activity: tạo một lần trong handle_message,
+các stage (token, Backend, LLM) lấy timeout từ thời gian còn lại thay vì timeout cố định
+"""
+import asyncio
+import contextvars
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Dict, Iterator, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Header gửi xuống Backend: số millisecond còn lại trước khi bot bỏ cuộc
+DEADLINE_HEADER = "X-Request-Deadline-Ms"
+
+_current_deadline: contextvars.ContextVar[Optional["Deadline"]] = contextvars.ContextVar("deadline", default=None)
+
+# Số lần mỗi stage hết ngân sách thời gian
+_exhausted: Dict[str, int] = {}
+
+
+class DeadlineExceeded(Exception):
+    """Exception khi activity hết ngân sách thời gian ở một stage"""
+
+    def __init__(self, stage: str, budget: float):
+        super().__init__(f"Hết thời gian xử lý ở bước '{stage}' (ngân sách {budget:.1f}s)")
+        self.stage = stage
+        self.budget = budget
+
+
+class Deadline:
+    """Thời điểm (monotonic) mà activity phải trả lời xong"""
+
+    def __init__(self, budget: float):
+        self.budget = budget
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + budget
+
+    def remaining(self) -> float:
+        """Số giây còn lại (không âm)"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def timeout(self, stage: str, cap: Optional[float] = None) -> float:
+        """
+        Timeout cho một stage: thời gian còn lại, không vượt quá `cap`
+
+        Raises:
+            DeadlineExceeded: Nếu đã hết thời gian trước khi bắt đầu stage
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise self.exceeded(stage)
+        return min(cap, remaining) if cap is not None else remaining
+
+    def header_value(self) -> str:
+        return str(int(self.remaining() * 1000))
+
+    def exceeded(self, stage: str) -> DeadlineExceeded:
+        """Ghi nhận stage hết ngân sách và trả về exception tương ứng"""
+        _exhausted[stage] = _exhausted.get(stage, 0) + 1
+        elapsed = time.monotonic() - self.started_at
+        logger.warning(f"Deadline exceeded ở stage '{stage}' sau {elapsed:.2f}s (ngân sách {self.budget:.1f}s)")
+        return DeadlineExceeded(stage, self.budget)
+
+
+def current_deadline() -> Optional[Deadline]:
+    """Deadline của activity đang xử lý (None nếu không có)"""
+    return _current_deadline.get()
+
+
+@contextmanager
+def use_deadline(deadline: Deadline) -> Iterator[Deadline]:
+    """Đặt deadline cho context hiện tại (và các task được tạo bên trong)"""
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def stage_timeout(stage: str, cap: float) -> float:
+    """Timeout cho stage theo deadline hiện tại, hoặc `cap` nếu không có deadline"""
+    deadline = current_deadline()
+    return deadline.timeout(stage, cap) if deadline is not None else cap
+
+
+def deadline_headers() -> Dict[str, str]:
+    """Header deadline để Backend có thể bỏ qua công việc không kịp trả lời"""
+    deadline = current_deadline()
+    return {DEADLINE_HEADER: deadline.header_value()} if deadline is not None else {}
+
+
+async def with_deadline(stage: str, awaitable: Awaitable[T], cap: Optional[float] = None) -> T:
+    """
+    Chờ `awaitable` trong thời gian còn lại của deadline hiện tại
+
+    Raises:
+        DeadlineExceeded: Nếu hết thời gian
+    """
+    deadline = current_deadline()
+    if deadline is None:
+        return await (asyncio.wait_for(awaitable, cap) if cap is not None else awaitable)
+    try:
+        timeout = deadline.timeout(stage, cap)
+    except DeadlineExceeded:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        if deadline.expired:
+            raise deadline.exceeded(stage)
+        raise
+
+
+def get_deadline_stats() -> Dict[str, Any]:
+    """Số lần mỗi stage hết ngân sách thời gian"""
+    return {"exhausted": dict(_exhausted)}
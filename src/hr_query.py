@@ -0,0 +1,241 @@
+"""
+HR Query
+Các lớp phía trước call_backend_hr_api: answer cache theo tenant/user (trong process,
+dùng chung giữa các worker qua shared state), semantic cache cho các câu hỏi gần nghĩa
+và gộp các câu hỏi giống nhau đang chờ Backend (single flight)
+"""
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Optional, Tuple
+
+from config import Config
+from answer_cache import AnswerCache, SCOPE_TENANT, SCOPE_USER, get_cache_policy, normalize_query
+from backend_service import call_backend_hr_api, AuthenticationError
+from backend_models import HRQueryResponse
+from backend_session import with_backend_session
+from single_flight import SingleFlight
+from deadline import DeadlineExceeded, with_deadline
+from metrics import track_stage
+from shared_state import get_shared_state, make_key
+
+if TYPE_CHECKING:
+    from semantic_cache import SemanticCache
+
+config = Config()
+logger = logging.getLogger(__name__)
+
+SHARED_NAMESPACE = "answer"
+SHARED_MAX_TTL = 86400.0
+
+shared_state = get_shared_state()
+
+answer_cache = AnswerCache(
+    max_entries=config.ANSWER_CACHE_MAX_ENTRIES,
+    default_ttl=config.ANSWER_CACHE_TTL_SECONDS,
+    # Có shared state → bản trong process chỉ sống ngắn, nguồn chính là shared state
+    max_ttl=config.SHARED_STATE_LOCAL_TTL_SECONDS if shared_state is not None else SHARED_MAX_TTL
+)
+
+
+def _create_semantic_cache() -> Optional["SemanticCache"]:
+    if not config.SEMANTIC_CACHE_ENABLED:
+        return None
+    if not (config.LITELLM_BASE_URL and config.LITELLM_API_KEY and config.LITELLM_DEFAULT_EMBEDDING_MODEL):
+        logger.warning("SEMANTIC_CACHE_ENABLED nhưng chưa cấu hình LiteLLM embedding model, bỏ qua semantic cache")
+        return None
+    # Import khi bật: semantic_cache kéo theo NumPy
+    from semantic_cache import SemanticCache, create_litellm_embedding_fn
+
+    return SemanticCache(
+        embed=create_litellm_embedding_fn(
+            config.LITELLM_BASE_URL,
+            config.LITELLM_API_KEY,
+            config.LITELLM_DEFAULT_EMBEDDING_MODEL
+        ),
+        threshold=config.SEMANTIC_CACHE_THRESHOLD,
+        max_entries=config.SEMANTIC_CACHE_MAX_ENTRIES,
+        ttl=config.ANSWER_CACHE_TTL_SECONDS
+    )
+
+
+semantic_cache = _create_semantic_cache()
+
+backend_single_flight = SingleFlight()
+
+# Câu hỏi mà lần trả lời gần nhất Backend cho cache ở mức tenant → được gộp giữa các user của tenant
+_tenant_shareable: "OrderedDict[Tuple[str, str], None]" = OrderedDict()
+
+
+def _remember_share_policy(key: Tuple[str, str], response: HRQueryResponse) -> None:
+    scope, _ = get_cache_policy(response)
+    if scope != SCOPE_TENANT:
+        _tenant_shareable.pop(key, None)
+        return
+    _tenant_shareable[key] = None
+    _tenant_shareable.move_to_end(key)
+    while len(_tenant_shareable) > config.ANSWER_CACHE_MAX_ENTRIES:
+        _tenant_shareable.popitem(last=False)
+
+
+async def _get_shared_answer(tenant_id: str, user_id: str, query: str) -> Optional[HRQueryResponse]:
+    """Answer do worker khác lưu (answer riêng của user trước, sau đó answer chung của tenant)"""
+    normalized = normalize_query(query)
+    for key_user in (user_id or "", ""):
+        data = await shared_state.get(SHARED_NAMESPACE, make_key(tenant_id, key_user, normalized))
+        if data is not None:
+            response = HRQueryResponse.from_dict(data)
+            answer_cache.put(tenant_id, user_id, query, response)
+            return response
+    return None
+
+
+async def _put_shared_answer(tenant_id: str, user_id: str, query: str, response: HRQueryResponse) -> None:
+    scope, ttl = get_cache_policy(response)
+    ttl = min(ttl if ttl is not None else config.ANSWER_CACHE_TTL_SECONDS, SHARED_MAX_TTL)
+    key = make_key(tenant_id, user_id if scope == SCOPE_USER else "", normalize_query(query))
+    await shared_state.set(SHARED_NAMESPACE, key, response.to_dict(), ttl)
+
+
+async def get_cached_answer(query: str, tenant_id: Optional[str], user_id: str) -> Optional[HRQueryResponse]:
+    """Tìm answer trong cache chính xác, sau đó trong semantic cache (None nếu chưa có)"""
+    if config.ANSWER_CACHE_ENABLED:
+        cached = answer_cache.get(tenant_id or "", user_id, query)
+        if cached is None and shared_state is not None:
+            cached = await _get_shared_answer(tenant_id or "", user_id, query)
+        if cached is not None:
+            return cached
+    if semantic_cache is not None:
+        try:
+            return await with_deadline(
+                "semantic_cache",
+                semantic_cache.lookup(tenant_id or "", query),
+                cap=config.SEMANTIC_CACHE_TIMEOUT_SECONDS
+            )
+        except (asyncio.TimeoutError, DeadlineExceeded):
+            # Embedding chậm → coi như miss, không để cache làm chậm lời gọi Backend
+            logger.debug("Semantic cache lookup quá thời gian, bỏ qua")
+    return None
+
+
+async def remember_answer(query: str, tenant_id: Optional[str], user_id: str, response: HRQueryResponse) -> None:
+    """Lưu answer vào cache nếu Backend đánh dấu cacheable"""
+    if config.ANSWER_CACHE_ENABLED:
+        if answer_cache.put(tenant_id or "", user_id, query, response) and shared_state is not None:
+            await _put_shared_answer(tenant_id or "", user_id, query, response)
+    if semantic_cache is not None:
+        try:
+            await with_deadline(
+                "semantic_cache",
+                semantic_cache.add(tenant_id or "", query, response),
+                cap=config.SEMANTIC_CACHE_TIMEOUT_SECONDS
+            )
+        except (asyncio.TimeoutError, DeadlineExceeded):
+            # Answer đã có, không giữ user chờ chỉ để index câu hỏi
+            logger.debug("Semantic cache add quá thời gian, bỏ qua")
+
+
+async def invalidate_answers(tenant_id: Optional[str] = None, user_id: Optional[str] = None) -> int:
+    """
+    Xoá answer đã cache (ví dụ khi chính sách HR thay đổi) ở mọi tầng: cache trong process,
+    semantic cache và shared state. Worker khác còn giữ bản trong process tối đa
+    SHARED_STATE_LOCAL_TTL_SECONDS giây (semantic cache của worker khác: đến hết TTL).
+
+    Args:
+        tenant_id: Chỉ xoá answer của tenant này (None = toàn bộ)
+        user_id: Chỉ xoá answer riêng của user này trong tenant (cần tenant_id)
+
+    Returns:
+        Số entry bị xoá (trong process + shared state)
+    """
+    if user_id is not None and tenant_id is None:
+        raise ValueError("Xoá answer riêng của user cần tenant_id")
+    removed = answer_cache.invalidate(tenant_id=tenant_id, user_id=user_id)
+    if semantic_cache is not None and user_id is None:
+        # Semantic cache chỉ chứa answer chung của tenant
+        semantic_cache.invalidate(tenant_id)
+    if shared_state is not None:
+        if tenant_id is None:
+            prefix = ""
+        elif user_id is None:
+            # Answer chung (tenant||query) và answer riêng (tenant|user|query) của tenant
+            prefix = make_key(tenant_id, "")
+        else:
+            prefix = make_key(tenant_id, user_id, "")
+        removed += await shared_state.delete_prefix(SHARED_NAMESPACE, prefix)
+    return removed
+
+
+async def query_hr_backend(
+    query: str,
+    teams_token: str,
+    user_id: str,
+    conversation_id: Optional[str] = None,
+    tenant_id: Optional[str] = None
+) -> HRQueryResponse:
+    """
+    Lấy answer cho HR query: dùng cache nếu có, nếu không thì gọi Backend
+    
+    Args:
+        query: Câu hỏi của user
+        teams_token: Teams token để authenticate
+        user_id: User ID
+        conversation_id: Conversation ID (optional)
+        tenant_id: Tenant ID để scope cache (optional)
+    
+    Returns:
+        Response từ Backend (cùng format với call_backend_hr_api)
+    
+    Raises:
+        AuthenticationError: Nếu token invalid (401)
+        BackendServiceError: Nếu có lỗi khác
+        DeadlineExceeded: Nếu hết ngân sách thời gian của activity
+    """
+    cached = await get_cached_answer(query, tenant_id, user_id)
+    if cached is not None:
+        logger.debug("HR answer lấy từ cache")
+        return cached
+    
+    async def call_backend() -> HRQueryResponse:
+        with track_stage("backend"):
+            # Dùng session token của Backend nếu có (BACKEND_SESSION_ENABLED)
+            return await with_backend_session(user_id, teams_token, lambda session_token: call_backend_hr_api(
+                query=query,
+                teams_token=teams_token,
+                user_id=user_id,
+                conversation_id=conversation_id,
+                session_token=session_token
+            ), tenant_id=tenant_id)
+    
+    if not config.BACKEND_SINGLE_FLIGHT_ENABLED:
+        response = await call_backend()
+        await remember_answer(query, tenant_id, user_id, response)
+        return response
+    
+    # Các câu hỏi giống nhau đang chờ Backend dùng chung một lời gọi. Chỉ gộp giữa các user
+    # khi Backend đã cho cache câu hỏi này ở mức tenant, còn lại chỉ gộp request của cùng user
+    # (không để user chờ một answer cá nhân của user khác rồi phải tự gọi lại Backend)
+    policy_key = (tenant_id or "", normalize_query(query))
+    tenant_wide = policy_key in _tenant_shareable
+    key = policy_key if tenant_wide else policy_key + (user_id or "",)
+    follower = backend_single_flight.has(key)
+    try:
+        # Follower có deadline riêng, không chờ lâu hơn ngân sách của mình
+        response, shared = await with_deadline("backend", backend_single_flight.do(key, call_backend))
+    except AuthenticationError:
+        # Token của request khác bị từ chối không có nghĩa token của user này cũng vậy
+        if follower:
+            return await call_backend()
+        raise
+    
+    if shared:
+        if tenant_wide and get_cache_policy(response)[0] != SCOPE_TENANT:
+            # Backend vừa đổi policy của câu hỏi: answer cá nhân của user khác → tự gọi Backend
+            response = await call_backend()
+            _remember_share_policy(policy_key, response)
+            await remember_answer(query, tenant_id, user_id, response)
+        return response
+    
+    _remember_share_policy(policy_key, response)
+    await remember_answer(query, tenant_id, user_id, response)
+    return response
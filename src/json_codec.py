@@ -0,0 +1,52 @@
+"""
+JSON Codec
+Encode/decode JSON cho payload của Backend: dùng orjson nếu đã cài (nhanh hơn nhiều
+so với json của stdlib), nếu không thì fallback về stdlib với cùng output compact
+"""
+import json
+from typing import Any, Dict
+
+try:
+    import orjson
+except ImportError:  # orjson là optional
+    orjson = None
+
+CODEC = "orjson" if orjson is not None else "json"
+
+_stats: Dict[str, int] = {
+    "encoded": 0,
+    "encoded_bytes": 0,
+    "decoded": 0,
+    "decoded_bytes": 0,
+}
+
+
+def dumps(value: Any) -> bytes:
+    """JSON UTF-8 compact (giống body httpx tạo với `json=`)"""
+    if orjson is not None:
+        data = orjson.dumps(value)
+    else:
+        data = json.dumps(value, ensure_ascii=False, separators=(",", ":"), allow_nan=False).encode("utf-8")
+    _stats["encoded"] += 1
+    _stats["encoded_bytes"] += len(data)
+    return data
+
+
+def loads(data: Any) -> Any:
+    """
+    Decode JSON từ bytes hoặc str
+
+    Raises:
+        ValueError: JSON không hợp lệ (orjson.JSONDecodeError cũng là ValueError)
+    """
+    _stats["decoded"] += 1
+    _stats["decoded_bytes"] += len(data)
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def get_json_codec_stats() -> Dict[str, Any]:
+    stats: Dict[str, Any] = dict(_stats)
+    stats["orjson"] = int(orjson is not None)
+    return stats
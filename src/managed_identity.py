@@ -0,0 +1,111 @@
+"""
+Managed Identity Token Provider
+Giữ một ManagedIdentityCredential duy nhất, cache access token theo scope
+và refresh nền trước khi hết hạn - không block event loop
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+ScopeKey = Tuple[str, ...]
+
+
+@dataclass
+class _CachedAccessToken:
+    token: str
+    expires_on: float
+
+
+class ManagedIdentityTokenProvider:
+    """
+    Token provider cho App(token=...) khi bot chạy với User Assigned Managed Identity
+
+    - `get_token` là coroutine: IMDS round trip chạy trong thread pool
+    - Token được dùng lại đến `expiry_margin` giây trước khi hết hạn
+    - Khi còn dưới `refresh_margin` giây, token cũ vẫn được trả về và
+      một task nền sẽ lấy token mới
+    """
+
+    def __init__(self, client_id: str, refresh_margin: float = 300.0, expiry_margin: float = 30.0):
+        self.client_id = client_id
+        self.refresh_margin = refresh_margin
+        self.expiry_margin = expiry_margin
+        self._credential: Any = None
+        self._tokens: Dict[ScopeKey, _CachedAccessToken] = {}
+        self._inflight: Dict[ScopeKey, asyncio.Task] = {}
+        self._stats: Dict[str, int] = {
+            "hits": 0,
+            "fetches": 0,
+            "background_refreshes": 0,
+            "refresh_failures": 0,
+        }
+
+    def _get_credential(self) -> Any:
+        if self._credential is None:
+            from azure.identity import ManagedIdentityCredential
+            self._credential = ManagedIdentityCredential(client_id=self.client_id)
+        return self._credential
+
+    async def get_token(self, scopes: Union[str, List[str]], tenant_id: Optional[str] = None) -> str:
+        """
+        Lấy access token cho scope (signature khớp với App(token=...))
+
+        Args:
+            scopes: Scope hoặc danh sách scope
+            tenant_id: Không dùng với Managed Identity (giữ cho đúng signature)
+
+        Returns:
+            Access token
+        """
+        key: ScopeKey = (scopes,) if isinstance(scopes, str) else tuple(scopes)
+        entry = self._tokens.get(key)
+        now = time.time()
+
+        if entry is not None and now < entry.expires_on - self.expiry_margin:
+            self._stats["hits"] += 1
+            if now >= entry.expires_on - self.refresh_margin and key not in self._inflight:
+                self._stats["background_refreshes"] += 1
+                self._start_fetch(key)
+            return entry.token
+
+        task = self._inflight.get(key) or self._start_fetch(key)
+        return await asyncio.shield(task)
+
+    def _start_fetch(self, key: ScopeKey) -> asyncio.Task:
+        task = asyncio.get_running_loop().create_task(self._fetch(key))
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._on_fetch_done(key, t))
+        return task
+
+    def _on_fetch_done(self, key: ScopeKey, task: asyncio.Task) -> None:
+        self._inflight.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            self._stats["refresh_failures"] += 1
+            logger.warning(f"Không lấy được Managed Identity token cho {key}: {task.exception()}")
+
+    async def _fetch(self, key: ScopeKey) -> str:
+        self._stats["fetches"] += 1
+        credential = self._get_credential()
+        # ManagedIdentityCredential.get_token là blocking I/O → chạy trong thread pool
+        access_token = await asyncio.to_thread(credential.get_token, *key)
+        self._tokens[key] = _CachedAccessToken(token=access_token.token, expires_on=float(access_token.expires_on))
+        return access_token.token
+
+    async def close(self) -> None:
+        """Huỷ các task refresh đang chạy và đóng credential"""
+        for task in list(self._inflight.values()):
+            task.cancel()
+        self._inflight.clear()
+        if self._credential is not None:
+            await asyncio.to_thread(self._credential.close)
+            self._credential = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Thống kê cache token"""
+        stats: Dict[str, Any] = dict(self._stats)
+        stats["cached_scopes"] = len(self._tokens)
+        return stats
@@ -0,0 +1,287 @@
+"""
+Metrics
+Histogram / Counter / Gauge tối giản (không cần prometheus_client) và render
+theo Prometheus text format cho route /metrics
+"""
+import logging
+import re
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Bucket mặc định (giây) cho latency của các stage
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+Sample = Tuple[str, Dict[str, str], float]
+
+_INVALID_NAME_CHARS = re.compile(r"[^a-zA-Z0-9_]")
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels.items():
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{key}="{escaped}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value != value:
+        return "NaN"
+    if value == float("inf"):
+        return "+Inf"
+    if value == float("-inf"):
+        return "-Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    type_name = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key: LabelValues) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def samples(self) -> List[Sample]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Counter chỉ tăng"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[Sample]:
+        return [(self.name, self._labels(key), value) for key, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    """Gauge có thể tăng / giảm"""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels: str) -> Iterator[None]:
+        """Tăng gauge trong lúc block đang chạy (in-flight)"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def samples(self) -> List[Sample]:
+        return [(self.name, self._labels(key), value) for key, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    """Histogram với bucket cố định (cumulative khi render)"""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [count theo bucket (không cumulative, bucket cuối là +Inf), sum]
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        entry = self._values.get(key)
+        if entry is None:
+            entry = ([0] * (len(self.buckets) + 1), [0.0])
+            self._values[key] = entry
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1][0] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Đo thời gian chạy của block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> List[Sample]:
+        samples: List[Sample] = []
+        for key, (counts, total) in self._values.items():
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+            samples.append((f"{self.name}_sum", labels, total[0]))
+            samples.append((f"{self.name}_count", labels, cumulative))
+        return samples
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _flatten_stats(name: str, value: Any, labels: Dict[str, str]) -> Iterator[Sample]:
+    """
+    Chuyển dict stats() của các component thành sample:
+    - số → một sample
+    - chuỗi (ví dụ trạng thái circuit breaker) → sample giá trị 1 với label `value`
+    - dict chỉ chứa số → label `key`
+    - dict chỉ chứa dict → label `name`
+    - dict khác → nối key vào tên metric
+    """
+    if value is None:
+        return
+    if isinstance(value, bool):
+        yield name, labels, float(value)
+    elif isinstance(value, (int, float)):
+        yield name, labels, float(value)
+    elif isinstance(value, str):
+        yield name, {**labels, "value": value}, 1.0
+    elif isinstance(value, dict):
+        for key, child in value.items():
+            child_name = f"{name}_{_INVALID_NAME_CHARS.sub('_', str(key))}"
+            if isinstance(child, dict) and child and all(isinstance(v, dict) for v in child.values()):
+                for inner_key, inner in child.items():
+                    yield from _flatten_stats(child_name, inner, {**labels, "name": str(inner_key)})
+            elif isinstance(child, dict) and child and all(_is_number(v) for v in child.values()):
+                for inner_key, inner in child.items():
+                    yield from _flatten_stats(child_name, inner, {**labels, "key": str(inner_key)})
+            else:
+                yield from _flatten_stats(child_name, child, labels)
+
+
+class MetricsRegistry:
+    """
+    Registry các metric và collector
+
+    Collector là hàm stats() sẵn có của các component (cache, admission,
+    circuit breaker...), chỉ được gọi khi /metrics được scrape nên không
+    tốn chi phí trên đường xử lý request.
+    """
+
+    def __init__(self, namespace: str = "bot"):
+        self.namespace = namespace
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Tuple[str, Callable[[], Optional[Dict[str, Any]]]]] = []
+
+    def _name(self, name: str) -> str:
+        return f"{self.namespace}_{name}" if self.namespace else name
+
+    def counter(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(self._name(name), help_text, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        metric = Gauge(self._name(name), help_text, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        metric = Histogram(self._name(name), help_text, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_stats(self, prefix: str, collect: Callable[[], Optional[Dict[str, Any]]]) -> None:
+        """Đăng ký hàm stats() của một component, render thành gauge `<namespace>_<prefix>_*`"""
+        self._collectors.append((self._name(prefix), collect))
+
+    def render(self) -> str:
+        """Render toàn bộ metric theo Prometheus text exposition format 0.0.4"""
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        for prefix, collect in self._collectors:
+            try:
+                stats = collect()
+            except Exception as e:
+                logger.warning(f"Không lấy được stats cho {prefix}: {e}")
+                continue
+            seen = set()
+            for name, labels, value in _flatten_stats(prefix, stats or {}, {}):
+                if name not in seen:
+                    seen.add(name)
+                    lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# Latency từng stage xử lý message (token, backend, llm, send...)
+stage_duration = registry.histogram(
+    "stage_duration_seconds",
+    "Thời gian xử lý từng stage của một message",
+    ("stage",),
+)
+
+# Kết quả xử lý message theo handler
+request_outcomes = registry.counter(
+    "requests_total",
+    "Số message đã xử lý theo handler và kết quả",
+    ("handler", "outcome"),
+)
+
+# Số message đang xử lý theo handler
+requests_in_flight = registry.gauge(
+    "requests_in_flight",
+    "Số message đang được xử lý",
+    ("handler",),
+)
+
+
+def track_stage(stage: str):
+    """Context manager đo thời gian một stage: `with track_stage("backend"): ...`"""
+    return stage_duration.time(stage=stage)
@@ -0,0 +1,239 @@
+"""
+Model Router
+Định tuyến chat completion giữa nhiều endpoint (LiteLLM Proxy, Azure OpenAI) theo
+latency và tỉ lệ lỗi gần đây, tự chuyển sang endpoint khác khi endpoint đang dùng lỗi
+"""
+import logging
+import random
+import time
+from dataclasses import dataclass, field, replace
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import openai
+from pydantic import BaseModel
+
+from microsoft.teams.ai import Function, ListMemory, Memory, Message, ModelMessage, SystemMessage
+from microsoft.teams.ai.ai_model import AIModel
+
+from resilience import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+
+class NoModelEndpointAvailable(Exception):
+    """Exception khi mọi endpoint đều đang bị circuit breaker chặn"""
+    pass
+
+
+class _StagedMemory:
+    """
+    Memory tạm cho một lần thử: đọc history từ memory thật, message mới chỉ được
+    ghi vào memory thật khi endpoint trả lời thành công (tránh push trùng khi failover)
+    """
+
+    def __init__(self, memory: Memory):
+        self._memory = memory
+        self._staged: List[Message] = []
+
+    async def push(self, message: Message) -> None:
+        self._staged.append(message)
+
+    async def get_all(self) -> list[Message]:
+        return list(await self._memory.get_all()) + self._staged
+
+    async def set_all(self, messages: list[Message]) -> None:
+        # Chỉ giữ phần mới so với history hiện tại
+        existing = await self._memory.get_all()
+        self._staged = list(messages[len(existing):])
+
+    async def commit(self) -> None:
+        for message in self._staged:
+            await self._memory.push(message)
+        self._staged = []
+
+
+@dataclass
+class ModelEndpoint:
+    """Một endpoint chat completion cùng thống kê latency và lỗi"""
+
+    name: str
+    model: AIModel
+    breaker: CircuitBreaker
+    ewma_latency: Optional[float] = None
+    ewma_error_rate: float = 0.0
+    stats: Dict[str, int] = field(default_factory=lambda: {
+        "requests": 0,
+        "successes": 0,
+        "failures": 0,
+        "failovers_from": 0,
+    })
+
+    def score(self) -> Optional[float]:
+        """Điểm càng thấp càng tốt: latency phạt thêm theo tỉ lệ lỗi"""
+        if self.ewma_latency is None:
+            return None
+        return self.ewma_latency * (1.0 + 4.0 * self.ewma_error_rate)
+
+
+def is_failover_error(error: BaseException) -> bool:
+    """Lỗi do endpoint (timeout, mất kết nối, 429, 5xx) → thử endpoint khác"""
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError, openai.RateLimitError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code >= 500
+    return False
+
+
+class ModelRouter:
+    """
+    AIModel định tuyến giữa các endpoint
+
+    - Endpoint đầu tiên là endpoint ưu tiên; router chỉ chuyển sang endpoint khác
+      khi endpoint ưu tiên chậm hơn `switch_ratio` lần (theo EWMA latency có phạt lỗi)
+      hoặc circuit breaker của nó đang mở
+    - Một phần nhỏ request (`probe_rate`) đi tới endpoint còn lại để có số liệu latency
+    - Khi endpoint lỗi (timeout, 429, 5xx) trước khi stream chunk nào và trước khi
+      gọi function nào, request được chạy lại trên endpoint kế tiếp
+    """
+
+    def __init__(
+        self,
+        endpoints: List[ModelEndpoint],
+        switch_ratio: float = 1.5,
+        probe_rate: float = 0.05,
+        ewma_alpha: float = 0.2,
+    ):
+        if not endpoints:
+            raise ValueError("ModelRouter cần ít nhất một endpoint")
+        self.endpoints = endpoints
+        self.switch_ratio = switch_ratio
+        self.probe_rate = probe_rate
+        self.ewma_alpha = ewma_alpha
+        self._stats: Dict[str, int] = {
+            "requests": 0,
+            "failovers": 0,
+            "probes": 0,
+        }
+
+    def _ordered_endpoints(self) -> List[ModelEndpoint]:
+        """Thứ tự thử endpoint cho request tiếp theo"""
+        available = [e for e in self.endpoints if e.breaker.state != "open"]
+        unavailable = [e for e in self.endpoints if e.breaker.state == "open"]
+        if len(available) < 2:
+            return available + unavailable
+
+        primary, others = available[0], available[1:]
+        best = min(others, key=lambda e: e.score() if e.score() is not None else float("inf"))
+        primary_score, best_score = primary.score(), best.score()
+        if primary_score is not None and best_score is not None and primary_score > best_score * self.switch_ratio:
+            chosen = best
+        elif random.random() < self.probe_rate:
+            chosen = random.choice(others)
+            self._stats["probes"] += 1
+        else:
+            chosen = primary
+        return [chosen] + [e for e in available if e is not chosen] + unavailable
+
+    def _record(self, endpoint: ModelEndpoint, latency: Optional[float], failed: bool) -> None:
+        alpha = self.ewma_alpha
+        endpoint.ewma_error_rate = (1 - alpha) * endpoint.ewma_error_rate + alpha * (1.0 if failed else 0.0)
+        if latency is not None:
+            if endpoint.ewma_latency is None:
+                endpoint.ewma_latency = latency
+            else:
+                endpoint.ewma_latency = (1 - alpha) * endpoint.ewma_latency + alpha * latency
+        if failed:
+            endpoint.stats["failures"] += 1
+            endpoint.breaker.record_failure()
+        else:
+            endpoint.stats["successes"] += 1
+            endpoint.breaker.record_success()
+
+    async def generate_text(
+        self,
+        input: Message,
+        *,
+        system: SystemMessage | None = None,
+        memory: Memory | None = None,
+        functions: dict[str, Function[BaseModel]] | None = None,
+        on_chunk: Callable[[str], Awaitable[None]] | None = None,
+    ) -> ModelMessage:
+        self._stats["requests"] += 1
+        memory = memory if memory is not None else ListMemory()
+
+        # Đã stream chunk hoặc đã gọi function → không thể chạy lại trên endpoint khác
+        side_effects = False
+        first_chunk_at: Optional[float] = None
+
+        async def tracked_chunk(chunk: str) -> None:
+            nonlocal side_effects, first_chunk_at
+            side_effects = True
+            if first_chunk_at is None:
+                first_chunk_at = time.monotonic()
+            await on_chunk(chunk)
+
+        def track_function(function: Function[BaseModel]) -> Function[BaseModel]:
+            handler = function.handler
+
+            def tracked_handler(*args: Any) -> Any:
+                nonlocal side_effects
+                side_effects = True
+                return handler(*args)
+
+            return replace(function, handler=tracked_handler)
+
+        tracked_functions = {name: track_function(f) for name, f in functions.items()} if functions else functions
+
+        last_error: Optional[BaseException] = None
+        for attempt, endpoint in enumerate(self._ordered_endpoints()):
+            if not endpoint.breaker.allow():
+                continue
+            if attempt > 0:
+                self._stats["failovers"] += 1
+                logger.warning(f"Failover LLM sang endpoint '{endpoint.name}' sau lỗi: {last_error}")
+
+            endpoint.stats["requests"] += 1
+            staged = _StagedMemory(memory)
+            started = time.monotonic()
+            first_chunk_at = None
+            try:
+                response = await endpoint.model.generate_text(
+                    input,
+                    system=system,
+                    memory=staged,
+                    functions=tracked_functions,
+                    on_chunk=tracked_chunk if on_chunk else None,
+                )
+            except Exception as e:
+                if not is_failover_error(e):
+                    raise
+                self._record(endpoint, None, failed=True)
+                last_error = e
+                if side_effects:
+                    raise
+                endpoint.stats["failovers_from"] += 1
+                continue
+
+            # Streaming: đo time-to-first-token, không phụ thuộc độ dài answer
+            latency = (first_chunk_at or time.monotonic()) - started
+            self._record(endpoint, latency, failed=False)
+            await staged.commit()
+            return response
+
+        if last_error is not None:
+            raise last_error
+        raise NoModelEndpointAvailable("Không có LLM endpoint khả dụng (circuit breaker đang mở)")
+
+    def stats(self) -> Dict[str, Any]:
+        """Thống kê router và từng endpoint"""
+        stats: Dict[str, Any] = dict(self._stats)
+        stats["endpoints"] = {
+            endpoint.name: {
+                **endpoint.stats,
+                "ewma_latency": endpoint.ewma_latency,
+                "ewma_error_rate": endpoint.ewma_error_rate,
+                "breaker_state": endpoint.breaker.state,
+            }
+            for endpoint in self.endpoints
+        }
+        return stats
@@ -0,0 +1,89 @@
+"""
+Request Tracker
+Theo dõi request đang chạy của mỗi conversation: message mới huỷ công việc
+(Backend/LLM) còn dang dở của message trước để không gửi answer cũ
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Tracked:
+    task: Optional[asyncio.Task] = None
+    superseded: bool = False
+
+
+class RequestTracker:
+    """
+    Mỗi key (conversation, user) chỉ có một request đang chạy.
+
+    Khi request mới đến, request cũ bị cancel - CancelledError lan xuống
+    httpx/OpenAI client nên connection và slot Backend được giải phóng ngay.
+    Request mới chờ tối đa `grace_period` giây cho request cũ dọn dẹp
+    (trả admission slot, đóng stream) trước khi bắt đầu.
+    """
+
+    def __init__(self, grace_period: float = 1.0):
+        self.grace_period = grace_period
+        self._current: Dict[Hashable, _Tracked] = {}
+        self._stats: Dict[str, int] = {
+            "started": 0,
+            "superseded": 0,
+            "skipped": 0,
+            "grace_timeouts": 0,
+        }
+
+    async def run(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> bool:
+        """
+        Chạy `fn` như request mới nhất của key, huỷ request cũ nếu còn chạy
+
+        Args:
+            key: Key nhận diện luồng hội thoại (ví dụ (conversation_id, user_id))
+            fn: Coroutine factory xử lý request
+
+        Returns:
+            True nếu chạy xong, False nếu bị request mới hơn thay thế
+        """
+        tracked = _Tracked()
+        previous = self._current.get(key)
+        self._current[key] = tracked
+        try:
+            if previous is not None:
+                previous.superseded = True
+                if previous.task is not None and not previous.task.done():
+                    self._stats["superseded"] += 1
+                    previous.task.cancel()
+                    done, _ = await asyncio.wait({previous.task}, timeout=self.grace_period)
+                    if not done:
+                        self._stats["grace_timeouts"] += 1
+                        logger.warning(f"Request cũ của {key} chưa dừng sau {self.grace_period}s")
+
+            if tracked.superseded:
+                # Đã có message mới hơn trong lúc chờ → bỏ qua message này
+                self._stats["skipped"] += 1
+                return False
+
+            tracked.task = asyncio.get_running_loop().create_task(fn())
+            self._stats["started"] += 1
+            try:
+                await tracked.task
+            except asyncio.CancelledError:
+                current = asyncio.current_task()
+                if tracked.superseded and not (current and current.cancelling()):
+                    logger.info(f"Request của {key} bị thay thế bởi message mới hơn")
+                    return False
+                raise
+            return True
+        finally:
+            if self._current.get(key) is tracked:
+                del self._current[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Số request đang chạy và số request bị thay thế"""
+        stats: Dict[str, Any] = dict(self._stats)
+        stats["in_flight"] = len(self._current)
+        return stats
@@ -0,0 +1,183 @@
+"""
+Resilience
+Circuit breaker, retry với jittered exponential backoff và hedged request
+cho các lời gọi xuống Backend
+"""
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker 3 trạng thái
+
+    - closed: cho phép mọi request, đếm lỗi liên tiếp
+    - open: sau `failure_threshold` lỗi liên tiếp, từ chối request ngay trong
+      `recovery_timeout` giây
+    - half_open: cho tối đa `half_open_max_calls` request thử; thành công thì
+      đóng lại, lỗi thì mở lại
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 30.0, half_open_max_calls: int = 1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._state = STATE_CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._state_since = time.monotonic()
+        self._time_in_state: Dict[str, float] = {STATE_CLOSED: 0.0, STATE_OPEN: 0.0, STATE_HALF_OPEN: 0.0}
+        self._stats: Dict[str, int] = {
+            "successes": 0,
+            "failures": 0,
+            "rejected": 0,
+            "opened": 0,
+            "half_opened": 0,
+            "closed": 0,
+        }
+
+    @property
+    def state(self) -> str:
+        if self._state == STATE_OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._transition(STATE_HALF_OPEN)
+        return self._state
+
+    def _transition(self, state: str) -> None:
+        now = time.monotonic()
+        self._time_in_state[self._state] += now - self._state_since
+        self._state_since = now
+        self._state = state
+        if state == STATE_OPEN:
+            self._opened_at = now
+            self._stats["opened"] += 1
+            logger.warning(f"Circuit breaker '{self.name}' mở sau {self._consecutive_failures} lỗi liên tiếp")
+        elif state == STATE_HALF_OPEN:
+            self._half_open_calls = 0
+            self._stats["half_opened"] += 1
+        else:
+            self._consecutive_failures = 0
+            self._stats["closed"] += 1
+            logger.info(f"Circuit breaker '{self.name}' đóng lại")
+
+    def allow(self) -> bool:
+        """Request có được phép gọi xuống không (False = fail fast)"""
+        state = self.state
+        if state == STATE_CLOSED:
+            return True
+        if state == STATE_HALF_OPEN:
+            # Request thử bị cancel sẽ không báo kết quả → cho thử lại sau recovery_timeout
+            if self._half_open_calls >= self.half_open_max_calls and time.monotonic() - self._state_since >= self.recovery_timeout:
+                self._half_open_calls = 0
+                self._state_since = time.monotonic()
+            if self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                return True
+        self._stats["rejected"] += 1
+        return False
+
+    def release(self) -> None:
+        """Request đã được allow() nhưng kết thúc không có kết quả (bị cancel / đóng giữa chừng) → trả lại slot thử"""
+        if self._state == STATE_HALF_OPEN and self._half_open_calls > 0:
+            self._half_open_calls -= 1
+
+    def record_success(self) -> None:
+        self._stats["successes"] += 1
+        self._consecutive_failures = 0
+        if self._state == STATE_HALF_OPEN:
+            self._transition(STATE_CLOSED)
+
+    def record_failure(self) -> None:
+        self._stats["failures"] += 1
+        self._consecutive_failures += 1
+        if self._state == STATE_HALF_OPEN:
+            self._transition(STATE_OPEN)
+        elif self._state == STATE_CLOSED and self._consecutive_failures >= self.failure_threshold:
+            self._transition(STATE_OPEN)
+
+    def stats(self) -> Dict[str, Any]:
+        """Trạng thái hiện tại, số lần chuyển trạng thái và thời gian ở mỗi trạng thái"""
+        state = self.state
+        stats: Dict[str, Any] = dict(self._stats)
+        stats["state"] = state
+        stats["consecutive_failures"] = self._consecutive_failures
+        time_in_state = dict(self._time_in_state)
+        time_in_state[state] += time.monotonic() - self._state_since
+        stats["seconds_in_state"] = time_in_state
+        return stats
+
+
+class LatencyTracker:
+    """Giữ latency của `window` request gần nhất để tính percentile"""
+
+    def __init__(self, window: int = 200):
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """
+    Delay trước lần retry thứ `attempt` (bắt đầu từ 0) - exponential backoff
+    với full jitter để các client không retry cùng lúc
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+async def hedged_call(fn: Callable[[], Awaitable[T]], delay: Optional[float], on_hedge: Optional[Callable[[], None]] = None) -> T:
+    """
+    Gọi `fn`; nếu sau `delay` giây chưa có kết quả thì gọi thêm một request
+    song song và lấy kết quả thành công đầu tiên. Request còn lại bị cancel.
+
+    Args:
+        fn: Coroutine factory thực hiện request
+        delay: Thời gian chờ trước khi hedge (None = không hedge)
+        on_hedge: Callback khi request thứ hai được gửi
+    """
+    if delay is None:
+        return await fn()
+
+    tasks = {asyncio.ensure_future(fn())}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            if on_hedge:
+                on_hedge()
+            tasks.add(asyncio.ensure_future(fn()))
+
+        error: Optional[BaseException] = None
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        assert error is not None
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,240 @@
+"""
+Semantic Cache
+Cache answer theo độ tương đồng ngữ nghĩa: embed câu hỏi và tìm câu hỏi gần nhất
+(cosine similarity, NumPy) trong các câu hỏi đã trả lời gần đây
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+import numpy as np
+
+from answer_cache import SCOPE_TENANT, get_cache_policy, normalize_query
+from backend_models import HRQueryResponse
+
+logger = logging.getLogger(__name__)
+
+# embed(texts) -> một vector cho mỗi text
+EmbedFn = Callable[[List[str]], Awaitable[Sequence[Sequence[float]]]]
+
+
+class LiteLLMEmbedder:
+    """Embed function gọi endpoint /embeddings (OpenAI-compatible) của LiteLLM Proxy, giữ một AsyncClient"""
+
+    def __init__(self, base_url: str, api_key: str, model: str, timeout: float = 10.0):
+        self.endpoint = f"{base_url.rstrip('/')}/embeddings"
+        self.api_key = api_key
+        self.model = model
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def __call__(self, texts: List[str]) -> List[List[float]]:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        response = await self._client.post(
+            self.endpoint,
+            json={"model": self.model, "input": texts},
+            headers={"Authorization": f"Bearer {self.api_key}"}
+        )
+        response.raise_for_status()
+        data = sorted(response.json()["data"], key=lambda item: item.get("index", 0))
+        return [item["embedding"] for item in data]
+
+    async def aclose(self) -> None:
+        """Đóng connection pool tới LiteLLM (gọi khi app stop)"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+
+def create_litellm_embedding_fn(base_url: str, api_key: str, model: str, timeout: float = 10.0) -> LiteLLMEmbedder:
+    """
+    Tạo embed function gọi endpoint /embeddings (OpenAI-compatible) của LiteLLM Proxy
+
+    Args:
+        base_url: LiteLLM base URL
+        api_key: LiteLLM API key
+        model: Tên embedding model
+        timeout: Timeout mỗi request (giây)
+    """
+    return LiteLLMEmbedder(base_url, api_key, model, timeout)
+
+
+class SemanticCache:
+    """
+    Index embedding trong memory với số entry cố định
+
+    - Vector được chuẩn hoá (L2) và lưu trong một ma trận float32, lookup là
+      một phép nhân ma trận-vector
+    - Chỉ tìm trong entry cùng tenant, còn hạn TTL
+    - Khi đầy, entry ít được dùng gần đây nhất bị thay thế
+    - Chỉ answer có scope tenant (không phải answer riêng của user) được lưu
+    """
+
+    def __init__(
+        self,
+        embed: EmbedFn,
+        threshold: float = 0.92,
+        max_entries: int = 2000,
+        ttl: float = 600.0,
+        embed_timeout: float = 2.0,
+    ):
+        self.embed = embed
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.embed_timeout = embed_timeout
+
+        self._vectors: Optional[np.ndarray] = None
+        self._tenants = np.full(max_entries, -1, dtype=np.int32)
+        self._expires = np.zeros(max_entries, dtype=np.float64)
+        self._last_used = np.zeros(max_entries, dtype=np.float64)
+        self._responses: List[Optional[HRQueryResponse]] = [None] * max_entries
+        self._queries: List[Optional[str]] = [None] * max_entries
+        self._tenant_codes: Dict[str, int] = {}
+        # Vector của các câu hỏi vừa lookup, dùng lại khi add để không phải embed lại
+        self._recent_vectors: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._stats: Dict[str, int] = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evicted": 0,
+            "embed_errors": 0,
+        }
+
+    async def _embed_query(self, tenant_id: str, query: str) -> Optional[np.ndarray]:
+        key = (tenant_id, normalize_query(query))
+        vector = self._recent_vectors.get(key)
+        if vector is not None:
+            return vector
+        try:
+            vectors = await asyncio.wait_for(self.embed([key[1]]), timeout=self.embed_timeout)
+        except Exception as e:
+            # Embedding lỗi không được làm hỏng request → coi như cache miss
+            self._stats["embed_errors"] += 1
+            logger.warning(f"Không embed được câu hỏi cho semantic cache: {e}")
+            return None
+        vector = np.asarray(vectors[0], dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        if norm == 0.0:
+            return None
+        vector = vector / norm
+        self._recent_vectors[key] = vector
+        while len(self._recent_vectors) > 256:
+            self._recent_vectors.popitem(last=False)
+        return vector
+
+    def _tenant_code(self, tenant_id: str) -> int:
+        code = self._tenant_codes.get(tenant_id)
+        if code is None:
+            code = len(self._tenant_codes)
+            self._tenant_codes[tenant_id] = code
+        return code
+
+    async def lookup(self, tenant_id: str, query: str) -> Optional[HRQueryResponse]:
+        """
+        Tìm answer của câu hỏi gần nghĩa nhất
+
+        Returns:
+            Response đã cache nếu similarity >= threshold, ngược lại None
+        """
+        code = self._tenant_codes.get(tenant_id or "")
+        if self._vectors is None or code is None:
+            self._stats["misses"] += 1
+            # Vẫn embed trước để add() sau khi gọi Backend không phải chờ
+            await self._embed_query(tenant_id or "", query)
+            return None
+
+        vector = await self._embed_query(tenant_id or "", query)
+        if vector is None:
+            self._stats["misses"] += 1
+            return None
+
+        now = time.monotonic()
+        similarities = self._vectors @ vector
+        valid = (self._tenants == code) & (self._expires > now)
+        similarities = np.where(valid, similarities, -np.inf)
+        index = int(np.argmax(similarities))
+        if similarities[index] < self.threshold:
+            self._stats["misses"] += 1
+            return None
+
+        self._last_used[index] = now
+        self._stats["hits"] += 1
+        logger.debug(f"Semantic cache hit (similarity={similarities[index]:.3f}): {self._queries[index]!r}")
+        return self._responses[index]
+
+    async def add(self, tenant_id: str, query: str, response: HRQueryResponse) -> bool:
+        """
+        Thêm answer vào index nếu Backend cho phép cache dùng chung trong tenant
+
+        Returns:
+            True nếu answer được lưu
+        """
+        scope, ttl = get_cache_policy(response)
+        if scope != SCOPE_TENANT or not response.answer:
+            return False
+        vector = await self._embed_query(tenant_id or "", query)
+        if vector is None:
+            return False
+
+        if self._vectors is None:
+            self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+        elif self._vectors.shape[1] != vector.shape[0]:
+            logger.warning("Embedding dimension thay đổi, reset semantic cache")
+            self.clear()
+            self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+
+        now = time.monotonic()
+        free = np.flatnonzero((self._tenants < 0) | (self._expires <= now))
+        if free.size:
+            index = int(free[0])
+        else:
+            index = int(np.argmin(self._last_used))
+            self._stats["evicted"] += 1
+
+        self._vectors[index] = vector
+        self._tenants[index] = self._tenant_code(tenant_id or "")
+        self._expires[index] = now + (ttl if ttl is not None else self.ttl)
+        self._last_used[index] = now
+        self._responses[index] = response
+        self._queries[index] = normalize_query(query)
+        self._stats["stores"] += 1
+        return True
+
+    def invalidate(self, tenant_id: Optional[str] = None) -> None:
+        """Xoá các entry của tenant (hoặc toàn bộ nếu không truyền tenant)"""
+        if tenant_id is None:
+            self.clear()
+            return
+        code = self._tenant_codes.get(tenant_id)
+        if code is None:
+            return
+        for index in np.flatnonzero(self._tenants == code):
+            self._tenants[index] = -1
+            self._responses[index] = None
+            self._queries[index] = None
+
+    async def aclose(self) -> None:
+        """Đóng client của embed function nếu có (gọi khi app stop)"""
+        aclose = getattr(self.embed, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+    def clear(self) -> None:
+        """Xoá toàn bộ index"""
+        self._tenants[:] = -1
+        self._responses = [None] * self.max_entries
+        self._queries = [None] * self.max_entries
+        self._recent_vectors.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Thống kê hit rate và số entry"""
+        stats: Dict[str, Any] = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["entries"] = int(np.count_nonzero((self._tenants >= 0) & (self._expires > time.monotonic())))
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
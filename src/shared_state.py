@@ -0,0 +1,259 @@
+"""
+Shared State
+State dùng chung giữa các worker trên cùng host (WORKERS > 1), SQLite WAL:
+- Key-value có TTL: tầng L2 phía sau answer cache và session Backend trong process
+- Bảng worker: heartbeat và health của từng worker (supervisor và /workers đọc bảng này)
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Protocol
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Ngăn cách các phần của key (tenant, user, câu hỏi...)
+KEY_SEPARATOR = "\x1f"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS shared_kv (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS idx_shared_kv_expires ON shared_kv (expires_at);
+CREATE TABLE IF NOT EXISTS worker_health (
+    pid INTEGER PRIMARY KEY,
+    slot INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+def make_key(*parts: str) -> str:
+    return KEY_SEPARATOR.join(parts)
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """Mở file shared state (tạo schema nếu chưa có), chỉ user chạy bot đọc được file"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # File chứa user token → tạo với quyền 0600
+    if not os.path.exists(path):
+        os.close(os.open(path, os.O_CREAT | os.O_WRONLY, 0o600))
+    conn = sqlite3.connect(path, timeout=10.0, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def read_worker_health(conn: sqlite3.Connection) -> List[Dict[str, Any]]:
+    """Health mới nhất của các worker (dùng được cả từ supervisor không có event loop)"""
+    now = time.time()
+    workers = []
+    for pid, slot, status, updated_at in conn.execute(
+        "SELECT pid, slot, status, updated_at FROM worker_health ORDER BY slot, pid"
+    ):
+        worker = json.loads(status)
+        worker.update({"pid": pid, "slot": slot, "heartbeat_age": round(now - updated_at, 3)})
+        workers.append(worker)
+    return workers
+
+
+def delete_worker_health(conn: sqlite3.Connection, pid: int) -> None:
+    with conn:
+        conn.execute("DELETE FROM worker_health WHERE pid = ?", (pid,))
+
+
+class SharedState(Protocol):
+    """Interface state dùng chung giữa các worker"""
+
+    async def get(self, namespace: str, key: str) -> Optional[Any]:
+        """Giá trị còn hạn hoặc None"""
+        ...
+
+    async def set(self, namespace: str, key: str, value: Any, ttl: float) -> None:
+        """Lưu giá trị (JSON) trong `ttl` giây"""
+        ...
+
+    async def delete_prefix(self, namespace: str, prefix: str) -> int:
+        """Xoá các key bắt đầu bằng `prefix`, trả về số key bị xoá"""
+        ...
+
+    async def report_worker(self, pid: int, slot: int, status: Dict[str, Any]) -> None:
+        """Ghi heartbeat + health của worker"""
+        ...
+
+    async def list_workers(self) -> List[Dict[str, Any]]:
+        """Health của tất cả worker"""
+        ...
+
+    async def close(self) -> None:
+        ...
+
+    def stats(self) -> Dict[str, Any]:
+        ...
+
+
+class SQLiteSharedState:
+    """
+    Shared state trên một file SQLite (WAL) cho các worker cùng host
+
+    Mọi thao tác SQLite chạy trên một thread riêng, không block event loop.
+    Key hết hạn bị bỏ qua khi đọc và được xoá định kỳ.
+    """
+
+    def __init__(self, path: str, purge_interval: float = 300.0):
+        self.path = path
+        self.purge_interval = purge_interval
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shared-state-sqlite")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._last_purge = time.monotonic()
+        self._stats: Dict[str, int] = {
+            "gets": 0,
+            "hits": 0,
+            "sets": 0,
+            "deletes": 0,
+            "expired_purged": 0,
+            "errors": 0,
+        }
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = connect(self.path)
+        return self._conn
+
+    def _get(self, namespace: str, key: str) -> Optional[str]:
+        row = self._connection().execute(
+            "SELECT value FROM shared_kv WHERE namespace = ? AND key = ? AND expires_at > ?",
+            (namespace, key, time.time()),
+        ).fetchone()
+        return row[0] if row else None
+
+    def _set(self, namespace: str, key: str, value: str, expires_at: float, purge: bool) -> int:
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO shared_kv (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, value, expires_at),
+            )
+            if purge:
+                return conn.execute("DELETE FROM shared_kv WHERE expires_at <= ?", (time.time(),)).rowcount
+        return 0
+
+    def _delete_prefix(self, namespace: str, prefix: str) -> int:
+        conn = self._connection()
+        with conn:
+            # So sánh theo khoảng thay vì LIKE để không phải escape ký tự đặc biệt trong key
+            return conn.execute(
+                "DELETE FROM shared_kv WHERE namespace = ? AND key >= ? AND key < ?",
+                (namespace, prefix, prefix + "\U0010ffff"),
+            ).rowcount
+
+    def _report_worker(self, pid: int, slot: int, status: str) -> None:
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO worker_health (pid, slot, status, updated_at) VALUES (?, ?, ?, ?)",
+                (pid, slot, status, time.time()),
+            )
+
+    async def get(self, namespace: str, key: str) -> Optional[Any]:
+        self._stats["gets"] += 1
+        try:
+            value = await self._run(self._get, namespace, key)
+        except sqlite3.Error as e:
+            # Shared state lỗi → coi như miss, worker vẫn chạy với cache trong process
+            self._stats["errors"] += 1
+            logger.warning(f"Không đọc được shared state: {e}")
+            return None
+        if value is None:
+            return None
+        self._stats["hits"] += 1
+        return json.loads(value)
+
+    async def set(self, namespace: str, key: str, value: Any, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        purge = time.monotonic() - self._last_purge > self.purge_interval
+        if purge:
+            self._last_purge = time.monotonic()
+        self._stats["sets"] += 1
+        try:
+            purged = await self._run(self._set, namespace, key, json.dumps(value), time.time() + ttl, purge)
+        except sqlite3.Error as e:
+            self._stats["errors"] += 1
+            logger.warning(f"Không ghi được shared state: {e}")
+            return
+        self._stats["expired_purged"] += purged
+
+    async def delete_prefix(self, namespace: str, prefix: str) -> int:
+        try:
+            removed = await self._run(self._delete_prefix, namespace, prefix)
+        except sqlite3.Error as e:
+            self._stats["errors"] += 1
+            logger.warning(f"Không xoá được shared state: {e}")
+            return 0
+        self._stats["deletes"] += removed
+        return removed
+
+    async def report_worker(self, pid: int, slot: int, status: Dict[str, Any]) -> None:
+        await self._run(self._report_worker, pid, slot, json.dumps(status))
+
+    async def list_workers(self) -> List[Dict[str, Any]]:
+        return await self._run(lambda: read_worker_health(self._connection()))
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            await self._run(self._conn.close)
+            self._conn = None
+        self._executor.shutdown(wait=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self._stats)
+
+
+def create_shared_state(backend: str, sqlite_path: str = "") -> Optional[SharedState]:
+    """
+    Tạo shared state theo cấu hình SHARED_STATE
+
+    Args:
+        backend: "none" (mỗi worker chỉ dùng cache trong process) hoặc "sqlite"
+        sqlite_path: Đường dẫn file SQLite
+
+    Returns:
+        Shared state hoặc None
+    """
+    backend = (backend or "none").lower()
+    if backend == "none":
+        return None
+    if backend == "sqlite":
+        return SQLiteSharedState(sqlite_path)
+    raise ValueError(f"SHARED_STATE không hợp lệ: {backend} (hỗ trợ: none, sqlite)")
+
+
+_shared_state: Optional[SharedState] = None
+_shared_state_created = False
+
+
+def get_shared_state() -> Optional[SharedState]:
+    """Shared state dùng chung trong process theo cấu hình (None khi SHARED_STATE=none)"""
+    global _shared_state, _shared_state_created
+    if not _shared_state_created:
+        config = Config()
+        _shared_state = create_shared_state(config.SHARED_STATE, config.SHARED_STATE_PATH)
+        _shared_state_created = True
+    return _shared_state
@@ -0,0 +1,89 @@
+"""
+Single Flight
+Gộp các request giống nhau đang chạy đồng thời thành một lời gọi duy nhất
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass
+class _Call:
+    task: asyncio.Task
+    waiters: int = 1
+
+
+class SingleFlight:
+    """
+    Request đầu tiên cho một key (leader) chạy `fn`; các request cùng key đến
+    trong lúc đó (follower) chờ và nhận cùng kết quả hoặc exception.
+
+    Lời gọi chỉ bị huỷ khi tất cả các request đang chờ đều bị cancel.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._stats: Dict[str, int] = {
+            "leaders": 0,
+            "collapsed": 0,
+            "abandoned": 0,
+        }
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """
+        Chạy `fn` hoặc chờ lời gọi đang chạy với cùng key
+
+        Args:
+            key: Key nhận diện request giống nhau
+            fn: Coroutine factory thực hiện request
+
+        Returns:
+            (kết quả, shared) - shared = True nếu kết quả lấy từ lời gọi của request khác
+        """
+        call = self._calls.get(key)
+        shared = call is not None
+        if call is None:
+            task = asyncio.get_running_loop().create_task(fn())
+            call = _Call(task=task)
+            self._calls[key] = call
+            task.add_done_callback(lambda _: self._forget(key, call))
+            self._stats["leaders"] += 1
+        else:
+            call.waiters += 1
+            self._stats["collapsed"] += 1
+
+        try:
+            return await asyncio.shield(call.task), shared
+        except asyncio.CancelledError:
+            if call.task.cancelled():
+                raise
+            # Request này bị cancel → chỉ huỷ lời gọi chung khi không còn ai chờ
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                self._stats["abandoned"] += 1
+                call.task.cancel()
+            raise
+
+    def _forget(self, key: Hashable, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        # Đánh dấu exception đã được đọc khi không còn ai chờ
+        if not call.task.cancelled():
+            call.task.exception()
+
+    def has(self, key: Hashable) -> bool:
+        """Có lời gọi đang chạy với key này không"""
+        return key in self._calls
+
+    def stats(self) -> Dict[str, Any]:
+        """Thống kê số request được gộp"""
+        stats: Dict[str, Any] = dict(self._stats)
+        stats["in_flight"] = len(self._calls)
+        total = stats["leaders"] + stats["collapsed"]
+        stats["collapse_rate"] = stats["collapsed"] / total if total else 0.0
+        return stats
@@ -0,0 +1,79 @@
+"""
+Startup
+Đo thời gian khởi động theo từng phase và bind port sớm: socket được listen trước khi
+import Teams SDK/OpenAI (vài giây khi cold start), connection tới trong lúc đó nằm chờ
+ở backlog của kernel thay vì bị từ chối
+"""
+import logging
+import socket
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Mốc thời gian: lúc app.py import module này (dòng đầu tiên)
+_started = time.perf_counter()
+_last_mark = _started
+_phases: List[Tuple[str, float]] = []
+_milestones: Dict[str, float] = {}
+
+
+def mark(phase: str) -> float:
+    """Kết thúc phase `phase` (tính từ lần mark trước), trả về số giây của phase"""
+    global _last_mark
+    now = time.perf_counter()
+    duration = now - _last_mark
+    _phases.append((phase, duration))
+    _last_mark = now
+    return duration
+
+
+def milestone(name: str) -> float:
+    """Ghi lại thời điểm (giây kể từ lúc bắt đầu) của một mốc như listener_bound, http_ready"""
+    elapsed = time.perf_counter() - _started
+    _milestones.setdefault(name, elapsed)
+    return elapsed
+
+
+def bind_listener(port: int, host: str = "0.0.0.0", backlog: int = 2048) -> socket.socket:
+    """Bind và listen ngay, uvicorn sẽ accept trên socket này khi app sẵn sàng"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    milestone("listener_bound")
+    return sock
+
+
+def create_http_plugin(sock: socket.socket, app_id: Optional[str]) -> Any:
+    """
+    HttpPlugin chạy uvicorn trên socket đã bind
+
+    HttpPlugin.on_start tự tạo uvicorn.Server mới khi port của server_factory trùng port
+    của App, nên phải override on_start thay vì dùng server_factory
+    """
+    import uvicorn
+    from microsoft.teams.apps import HttpPlugin
+
+    class PreboundHttpPlugin(HttpPlugin):
+        async def on_start(self, event: Any) -> None:
+            self._port = event.port
+            self._server = uvicorn.Server(uvicorn.Config(app=self.app, port=event.port, log_level="info"))
+            self.logger.info("Starting HTTP server on pre-bound port %d", event.port)
+            await self._server.serve(sockets=[sock])
+
+    return PreboundHttpPlugin(app_id)
+
+
+def get_startup_stats() -> Dict[str, Any]:
+    """Thời gian từng phase và các mốc (giây)"""
+    return {
+        "phase_seconds": {phase: round(duration, 4) for phase, duration in _phases},
+        "milestone_seconds": {name: round(elapsed, 4) for name, elapsed in _milestones.items()},
+    }
+
+
+def log_startup_report() -> None:
+    phases = ", ".join(f"{phase}={duration * 1000:.0f}ms" for phase, duration in _phases)
+    milestones = ", ".join(f"{name}={elapsed * 1000:.0f}ms" for name, elapsed in _milestones.items())
+    logger.info(f"⏱️ Startup: {phases} | {milestones}")
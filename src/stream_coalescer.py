@@ -0,0 +1,105 @@
+"""
+Stream Coalescer
+Gộp các chunk nhỏ (token của LLM, delta của Backend) trước khi emit qua ctx.stream,
+để mỗi answer chỉ emit vài lần thay vì hàng trăm lần vào hàng đợi của HttpStream
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Tổng số chunk nhận vào và số emit thực sự, cộng dồn cho mọi stream
+_totals: Dict[str, int] = {
+    "streams": 0,
+    "chunks_in": 0,
+    "emits_out": 0,
+}
+
+
+class StreamCoalescer:
+    """
+    Buffer chunk và flush khi:
+    - là chunk đầu tiên (để timer 0.5s của HttpStream trong SDK bắt đầu chạy ngay)
+    - đã qua `interval` giây kể từ lần flush trước (timer chạy trên event loop)
+    - buffer vượt quá `max_chars` ký tự
+
+    HttpStream của SDK đã gom các emit trong 0.5s thành một update, nên `interval`
+    mặc định bằng đúng khoảng đó: coalescer chỉ giảm số emit xếp hàng trong SDK,
+    không làm chậm thêm update gửi lên Teams.
+
+    Dùng trực tiếp làm `on_chunk` callback; gọi `close()` khi stream kết thúc
+    để flush phần còn lại.
+    """
+
+    def __init__(self, emit: Callable[[str], Any], interval: float = 0.5, max_chars: int = 500):
+        self._emit = emit
+        self.interval = interval
+        self.max_chars = max_chars
+        self._buffer: List[str] = []
+        self._buffered_chars = 0
+        self._last_flush: Optional[float] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._closed = False
+        self.chunks_in = 0
+        self.emits_out = 0
+        _totals["streams"] += 1
+
+    def __call__(self, chunk: str) -> None:
+        self.push(chunk)
+
+    def push(self, chunk: str) -> None:
+        """Thêm một chunk vào buffer, flush nếu tới hạn"""
+        if not chunk or self._closed:
+            return
+        self.chunks_in += 1
+        _totals["chunks_in"] += 1
+        self._buffer.append(chunk)
+        self._buffered_chars += len(chunk)
+
+        if self._last_flush is None or self._buffered_chars >= self.max_chars:
+            self.flush()
+            return
+        elapsed = time.monotonic() - self._last_flush
+        if elapsed >= self.interval:
+            self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.interval - elapsed, self.flush)
+
+    def flush(self) -> None:
+        """Emit toàn bộ buffer thành một update"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._buffer:
+            return
+        text = "".join(self._buffer)
+        self._buffer.clear()
+        self._buffered_chars = 0
+        self._last_flush = time.monotonic()
+        self.emits_out += 1
+        _totals["emits_out"] += 1
+        self._emit(text)
+
+    def close(self) -> None:
+        """Flush phần còn lại và dừng timer"""
+        self.flush()
+        self._closed = True
+
+    def __enter__(self) -> "StreamCoalescer":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is asyncio.CancelledError:
+            # Request bị huỷ (ví dụ bị message mới thay thế) → không emit phần còn lại
+            self._buffer.clear()
+            self._buffered_chars = 0
+        self.close()
+
+
+def get_stream_coalescer_stats() -> Dict[str, Any]:
+    """Số chunk nhận vào, số update đã emit và số update tiết kiệm được"""
+    stats: Dict[str, Any] = dict(_totals)
+    stats["emits_saved"] = stats["chunks_in"] - stats["emits_out"]
+    return stats
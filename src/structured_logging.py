@@ -0,0 +1,182 @@
+"""
+Structured Logging
+Logger nhận field key/value (`logger.info("...", user_id=...)`), format JSON lines
+hoặc text, ghi qua queue + thread nền để log I/O không block event loop
+"""
+import copy
+import json
+import logging
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, MutableMapping, Optional, Tuple
+
+# Keyword argument chuẩn của logging, các keyword khác được coi là field
+_LOGGING_KWARGS = {"exc_info", "stack_info", "stacklevel", "extra"}
+
+_stats: Dict[str, int] = {
+    "dropped_queue_full": 0,
+    "sampled_out": 0,
+}
+
+_listener: Optional[QueueListener] = None
+
+
+class StructuredLogger(logging.LoggerAdapter):
+    """
+    LoggerAdapter cho phép truyền field dạng keyword:
+
+        logger.info("Gọi Backend HR API", user_id=user_id, conversation_id=conversation_id)
+
+    Field được gắn vào record (`record.fields`) để formatter ghi ra.
+    """
+
+    def __init__(self, logger: logging.Logger, fields: Optional[Dict[str, Any]] = None):
+        super().__init__(logger, fields or {})
+
+    def process(self, msg: Any, kwargs: MutableMapping[str, Any]) -> Tuple[Any, MutableMapping[str, Any]]:
+        fields = dict(self.extra) if self.extra else {}
+        for key in list(kwargs):
+            if key not in _LOGGING_KWARGS:
+                fields[key] = kwargs.pop(key)
+        if fields:
+            extra = dict(kwargs.get("extra") or {})
+            extra["fields"] = {**extra.get("fields", {}), **fields}
+            kwargs["extra"] = extra
+        return msg, kwargs
+
+    def bind(self, **fields: Any) -> "StructuredLogger":
+        """Logger con luôn kèm các field cho trước (ví dụ conversation_id)"""
+        return StructuredLogger(self.logger, {**(self.extra or {}), **fields})
+
+
+def get_logger(name: str) -> StructuredLogger:
+    """Lấy structured logger theo tên module"""
+    return StructuredLogger(logging.getLogger(name))
+
+
+class JsonFormatter(logging.Formatter):
+    """Mỗi record là một dòng JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            payload.update(fields)
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload["exc"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class KeyValueFormatter(logging.Formatter):
+    """Format text giống logging.basicConfig, field được nối dạng key=value"""
+
+    def __init__(self):
+        super().__init__("%(levelname)s:%(name)s:%(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{key}={value!r}" for key, value in fields.items())
+        return line
+
+
+class DebugSamplingFilter(logging.Filter):
+    """Chỉ giữ một tỉ lệ `rate` các record DEBUG (log nhiều, ít giá trị từng dòng)"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate >= 1.0:
+            return True
+        if random.random() < self.rate:
+            return True
+        _stats["sampled_out"] += 1
+        return False
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """
+    QueueHandler không block khi queue đầy (bỏ record và đếm) và giữ lại
+    field/traceback để formatter ở thread nền format
+    """
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _stats["dropped_queue_full"] += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # Traceback phải format ngay, trước khi frame thay đổi
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(
+    level: str = "INFO",
+    fmt: str = "text",
+    debug_sample_rate: float = 1.0,
+    queue_size: int = 10000,
+) -> QueueListener:
+    """
+    Cấu hình root logger: QueueHandler → QueueListener (thread nền) → stdout
+
+    Args:
+        level: Log level của root logger
+        fmt: "json" (JSON lines) hoặc "text"
+        debug_sample_rate: Tỉ lệ record DEBUG được giữ lại
+        queue_size: Số record tối đa chờ ghi, vượt quá thì bỏ
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter() if fmt == "json" else KeyValueFormatter())
+
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=queue_size)
+    queue_handler = _NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(DebugSamplingFilter(debug_sample_rate))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper())
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging() -> None:
+    """Ghi hết log đang chờ và dừng thread nền"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logging_stats() -> Dict[str, Any]:
+    """Số record bị bỏ do queue đầy hoặc do sampling"""
+    stats: Dict[str, Any] = dict(_stats)
+    stats["queue_size"] = _listener.queue.qsize() if _listener is not None else 0
+    return stats
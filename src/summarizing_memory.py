@@ -0,0 +1,276 @@
+"""
+Summarizing Memory
+Memory giới hạn theo token: giữ nguyên văn N lượt hỏi-đáp gần nhất, các lượt cũ
+hơn được gộp vào một bản tóm tắt chạy nền (không nằm trên đường xử lý request)
+"""
+import asyncio
+import contextvars
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from microsoft.teams.ai import FunctionMessage, Message, ModelMessage, SystemMessage, UserMessage
+
+from conversation_store import BoundedListMemory
+from shared_state import SharedState
+
+logger = logging.getLogger(__name__)
+
+# summarize(bản tóm tắt trước đó, các message cần gộp) -> bản tóm tắt mới
+SummarizeFn = Callable[[Optional[str], List[Message]], Awaitable[str]]
+
+# Overhead ước lượng (token) cho mỗi message trong prompt (role, separator)
+_MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PREFIX = "Tóm tắt phần trước của cuộc trò chuyện:\n"
+
+SHARED_NAMESPACE = "summary"
+
+# Thống kê cộng dồn cho mọi conversation
+_totals: Dict[str, int] = {
+    "prompts": 0,
+    "prompt_tokens_full": 0,
+    "prompt_tokens_sent": 0,
+    "summaries": 0,
+    "summary_errors": 0,
+    "messages_summarized": 0,
+    "shared_summaries_used": 0,
+}
+
+# Giữ reference tới các task tóm tắt đang chạy để không bị garbage collect
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def estimate_tokens(message: Message) -> int:
+    """Ước lượng số token của một message (~4 ký tự / token)"""
+    tokens = _MESSAGE_OVERHEAD_TOKENS
+    content = getattr(message, "content", None)
+    if content:
+        tokens += len(content) // 4 + 1
+    if isinstance(message, ModelMessage) and message.function_calls:
+        for call in message.function_calls:
+            tokens += _MESSAGE_OVERHEAD_TOKENS + (len(call.name) + len(str(call.arguments))) // 4
+    return tokens
+
+
+def _marker(message: Message) -> Tuple[str, str]:
+    """Nhận diện message theo nội dung (message load từ storage là object khác)"""
+    return type(message).__name__, getattr(message, "content", None) or ""
+
+
+def _index_of(messages: List[Message], message: Message) -> Optional[int]:
+    for i in range(len(messages) - 1, -1, -1):
+        if messages[i] is message:
+            return i
+    return None
+
+
+def format_transcript(messages: List[Message]) -> str:
+    """Chuyển message thành transcript dạng text để đưa vào prompt tóm tắt"""
+    lines = []
+    for message in messages:
+        if isinstance(message, UserMessage):
+            lines.append(f"User: {message.content}")
+        elif isinstance(message, ModelMessage) and message.content:
+            lines.append(f"Assistant: {message.content}")
+        elif isinstance(message, FunctionMessage) and message.content:
+            lines.append(f"Function result: {message.content}")
+    return "\n".join(lines)
+
+
+class SummarizingMemory(BoundedListMemory):
+    """
+    BoundedListMemory với prompt view giới hạn token
+
+    - `get_all()` (history gửi cho model) = bản tóm tắt (SystemMessage) + các
+      lượt gần nhất; luôn giữ nguyên văn `keep_turns` lượt cuối, các lượt cũ hơn
+      chỉ được giữ nếu còn trong `token_budget`
+    - Khi có đủ `summarize_every_turns` lượt nằm ngoài các lượt giữ nguyên văn
+      (hoặc history vượt budget), một task nền gộp chúng vào bản tóm tắt;
+      request hiện tại không phải chờ
+    - History đầy đủ vẫn được lưu (và ghi xuống storage) như BoundedListMemory
+    - Có `shared` → bản tóm tắt dùng chung giữa các worker, worker nhận lượt tiếp
+      theo của conversation không phải tóm tắt lại từ đầu
+    """
+
+    def __init__(
+        self,
+        max_messages: int,
+        summarize: SummarizeFn,
+        token_budget: int = 3000,
+        keep_turns: int = 4,
+        summarize_every_turns: int = 2,
+        shared: Optional[SharedState] = None,
+        shared_ttl: float = 3600.0,
+        **kwargs: Any,
+    ):
+        super().__init__(max_messages, **kwargs)
+        self.summarize = summarize
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.summarize_every_turns = summarize_every_turns
+        self.shared = shared
+        self.shared_ttl = shared_ttl
+        self.summary: Optional[str] = None
+        # Message cuối cùng đã được gộp vào bản tóm tắt (và nội dung của nó)
+        self._summarized_until: Optional[Message] = None
+        self._summarized_marker: Optional[Tuple[str, str]] = None
+        self._summary_task: Optional[asyncio.Task] = None
+
+    async def push(self, message: Message) -> None:
+        await super().push(message)
+        self._maybe_schedule_summary()
+
+    async def get_all(self) -> list[Message]:
+        """History đã cắt theo token budget, bắt đầu bằng bản tóm tắt nếu có"""
+        messages = await super().get_all()
+        if self.shared is not None and self._summarized_index(messages) < self._recent_start(messages):
+            await self._load_shared_summary()
+        view = self._build_view(messages)
+        full_tokens = sum(estimate_tokens(m) for m in messages)
+        sent_tokens = sum(estimate_tokens(m) for m in view)
+        _totals["prompts"] += 1
+        _totals["prompt_tokens_full"] += full_tokens
+        _totals["prompt_tokens_sent"] += sent_tokens
+        self._maybe_schedule_summary()
+        return view
+
+    async def set_all(self, messages: list[Message]) -> None:
+        await super().set_all(messages)
+        self.summary = None
+        self._summarized_until = None
+        self._summarized_marker = None
+        if self.shared is not None:
+            await self.shared.set(SHARED_NAMESPACE, self._conversation_id, {}, self.shared_ttl)
+
+    def _turn_starts(self, messages: List[Message]) -> List[int]:
+        return [i for i, m in enumerate(messages) if isinstance(m, UserMessage)]
+
+    def _recent_start(self, messages: List[Message]) -> int:
+        """Index bắt đầu của `keep_turns` lượt gần nhất"""
+        starts = self._turn_starts(messages)
+        if len(starts) <= self.keep_turns:
+            return 0
+        return starts[-self.keep_turns]
+
+    def _summarized_index(self, messages: List[Message]) -> int:
+        """Số message đầu history đã nằm trong bản tóm tắt"""
+        if self._summarized_until is not None:
+            index = _index_of(messages, self._summarized_until)
+            if index is not None:
+                return index + 1
+        if self._summarized_marker is not None:
+            # History được load lại hoặc bản tóm tắt do worker khác tạo → tìm theo nội dung
+            for i in range(len(messages) - 1, -1, -1):
+                if _marker(messages[i]) == self._summarized_marker:
+                    self._summarized_until = messages[i]
+                    return i + 1
+        # Message mốc đã bị trim → coi như chưa tóm tắt
+        return 0
+
+    async def _load_shared_summary(self) -> None:
+        """Dùng bản tóm tắt do worker khác tạo nếu nó phủ nhiều history hơn bản hiện có"""
+        if self.shared is None or not self._conversation_id:
+            return
+        value = await self.shared.get(SHARED_NAMESPACE, self._conversation_id)
+        if not value or not value.get("summary"):
+            return
+        marker = tuple(value["until"])
+        if marker == self._summarized_marker:
+            return
+        covered = self._summarized_index(self._messages)
+        for i in range(len(self._messages) - 1, covered - 1, -1):
+            if _marker(self._messages[i]) == marker:
+                self.summary = value["summary"]
+                self._summarized_until = self._messages[i]
+                self._summarized_marker = marker
+                _totals["shared_summaries_used"] += 1
+                return
+
+    def _build_view(self, messages: List[Message]) -> List[Message]:
+        recent_start = self._recent_start(messages)
+        covered = min(self._summarized_index(messages), recent_start)
+
+        view: List[Message] = []
+        used = 0
+        if self.summary:
+            summary_message = SystemMessage(content=SUMMARY_PREFIX + self.summary)
+            view.append(summary_message)
+            used += estimate_tokens(summary_message)
+
+        # Các lượt giữ nguyên văn luôn có trong prompt
+        recent = messages[recent_start:]
+        used += sum(estimate_tokens(m) for m in recent)
+
+        # Lượt cũ hơn chưa được tóm tắt: thêm từ mới → cũ khi còn budget, cắt theo ranh giới lượt
+        older: List[Message] = []
+        turn_starts = [i for i in self._turn_starts(messages) if covered <= i < recent_start]
+        end = recent_start
+        for start in reversed(turn_starts):
+            turn = messages[start:end]
+            tokens = sum(estimate_tokens(m) for m in turn)
+            if used + tokens > self.token_budget:
+                break
+            older[:0] = turn
+            used += tokens
+            end = start
+
+        return view + older + recent
+
+    def _maybe_schedule_summary(self) -> None:
+        if self._summary_task is not None and not self._summary_task.done():
+            return
+        messages = self._messages
+        recent_start = self._recent_start(messages)
+        covered = self._summarized_index(messages)
+        if covered >= recent_start:
+            return
+        pending = messages[covered:recent_start]
+        # Gộp nhiều lượt vào một lần tóm tắt, trừ khi history đã vượt budget
+        pending_turns = sum(1 for m in pending if isinstance(m, UserMessage))
+        total_tokens = sum(estimate_tokens(m) for m in messages[covered:])
+        if pending_turns < self.summarize_every_turns and total_tokens <= self.token_budget:
+            return
+        # Chạy trong context mới: không mang deadline / cancellation của request hiện tại
+        self._summary_task = asyncio.get_running_loop().create_task(
+            self._summarize(pending), context=contextvars.Context()
+        )
+        _background_tasks.add(self._summary_task)
+        self._summary_task.add_done_callback(_background_tasks.discard)
+
+    async def _summarize(self, pending: List[Message]) -> None:
+        if self.shared is not None:
+            await self._load_shared_summary()
+            covered = self._summarized_index(self._messages)
+            end = _index_of(self._messages, pending[-1])
+            if end is None or end < covered:
+                # Worker khác đã tóm tắt các lượt này
+                return
+            pending = self._messages[covered:end + 1]
+        try:
+            summary = await self.summarize(self.summary, pending)
+        except Exception as e:
+            _totals["summary_errors"] += 1
+            logger.warning(f"Không tạo được bản tóm tắt conversation: {e}")
+            return
+        if not summary:
+            return
+        self.summary = summary.strip()
+        self._summarized_until = pending[-1]
+        self._summarized_marker = _marker(pending[-1])
+        _totals["summaries"] += 1
+        _totals["messages_summarized"] += len(pending)
+        if self.shared is not None:
+            await self.shared.set(
+                SHARED_NAMESPACE,
+                self._conversation_id,
+                {"summary": self.summary, "until": list(self._summarized_marker)},
+                self.shared_ttl
+            )
+
+
+def get_summarizing_memory_stats() -> Dict[str, Any]:
+    """Số token prompt tiết kiệm được và số lần tóm tắt"""
+    stats: Dict[str, Any] = dict(_totals)
+    stats["prompt_tokens_saved"] = stats["prompt_tokens_full"] - stats["prompt_tokens_sent"]
+    stats["summaries_in_flight"] = len(_background_tasks)
+    return stats
@@ -27,13 +27,14 @@ async def send_token_to_backend(
         additional_data: Dữ liệu bổ sung (optional)
     
     Returns:
-        Response từ backend
+        Response từ backend dạng dict như trước ({"error": ...} nếu lỗi)
     """
     logger.warning("send_token_to_backend() is deprecated, use backend_service.send_teams_token_to_backend() instead")
-    return await send_teams_token_to_backend(
+    response = await send_teams_token_to_backend(
         user_id=user_id,
         token=token,
         tenant_id=tenant_id,
         additional_data=additional_data
     )
+    return response.to_dict()
 
@@ -0,0 +1,172 @@
+"""
+Trace Capture
+Ghi lại "hình dạng" traffic thật đã ẩn danh (khoảng cách giữa các message, độ dài câu hỏi,
+độ dài conversation, latency Backend) vào file JSON lines để replay khi benchmark
+(test_helpers/loadtest/replay.py)
+"""
+import contextvars
+import hashlib
+import hmac
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+TRACE_VERSION = 1
+
+# Event của message đang xử lý, các tầng bên dưới (Backend...) ghi thêm field vào đây
+_current_event: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar(
+    "trace_event", default=None
+)
+
+
+def annotate_trace(**fields: Any) -> None:
+    """Gắn thêm field vào trace event của message hiện tại (không làm gì nếu không capture)"""
+    event = _current_event.get()
+    if event is not None:
+        event.update(fields)
+
+
+class TraceRecorder:
+    """
+    Ghi trace event ra file JSON lines qua thread nền
+
+    - Không lưu nội dung câu hỏi, chỉ độ dài; user/conversation ID được hash bằng HMAC với `salt`
+    - Sampling theo conversation (giữ trọn conversation để replay đúng số lượt)
+    - Queue đầy thì bỏ event thay vì block event loop
+    """
+
+    def __init__(
+        self,
+        path: str,
+        sample_rate: float = 1.0,
+        salt: Optional[str] = None,
+        max_queue: int = 10000,
+        max_conversations: int = 10000,
+    ):
+        self.path = path
+        self.sample_rate = sample_rate
+        # Không có salt → salt ngẫu nhiên theo process, ID không thể đối chiếu lại
+        self._salt = (salt or os.urandom(16).hex()).encode()
+        self.max_conversations = max_conversations
+        self._started = time.monotonic()
+        # conversation hash -> số lượt đã ghi (LRU)
+        self._turns: "OrderedDict[str, int]" = OrderedDict()
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=max_queue)
+        self._stats: Dict[str, int] = {
+            "recorded": 0,
+            "sampled_out": 0,
+            "dropped_queue_full": 0,
+            "write_errors": 0,
+        }
+        self._thread = threading.Thread(target=self._writer, name="trace-writer", daemon=True)
+        self._thread.start()
+
+    def anonymize(self, value: Optional[str]) -> Optional[str]:
+        if not value:
+            return None
+        return hmac.new(self._salt, value.encode(), hashlib.sha256).hexdigest()[:16]
+
+    def _sampled(self, conversation: Optional[str]) -> bool:
+        if self.sample_rate >= 1.0:
+            return True
+        if not conversation:
+            return False
+        return int(conversation[:8], 16) / 0xFFFFFFFF < self.sample_rate
+
+    @contextmanager
+    def capture(
+        self,
+        handler: str,
+        user_id: Optional[str],
+        conversation_id: Optional[str],
+        text: Optional[str],
+    ) -> Iterator[Optional[Dict[str, Any]]]:
+        """Bao quanh việc xử lý một message; event được ghi khi block kết thúc"""
+        conversation = self.anonymize(conversation_id)
+        if not self._sampled(conversation):
+            self._stats["sampled_out"] += 1
+            yield None
+            return
+
+        text = text or ""
+        started = time.monotonic()
+        event: Dict[str, Any] = {
+            "type": "message",
+            "t": round(started - self._started, 4),
+            "handler": handler,
+            "user": self.anonymize(user_id),
+            "conversation": conversation,
+            "turn": self._next_turn(conversation),
+            "query_chars": len(text),
+            "query_words": len(text.split()),
+        }
+        token = _current_event.set(event)
+        try:
+            yield event
+        finally:
+            _current_event.reset(token)
+            event["duration"] = round(time.monotonic() - started, 4)
+            event.setdefault("outcome", "ok")
+            self._enqueue(event)
+
+    def _next_turn(self, conversation: Optional[str]) -> int:
+        if not conversation:
+            return 0
+        turn = self._turns.pop(conversation, 0)
+        self._turns[conversation] = turn + 1
+        while len(self._turns) > self.max_conversations:
+            self._turns.popitem(last=False)
+        return turn
+
+    def _enqueue(self, event: Dict[str, Any]) -> None:
+        try:
+            self._queue.put_nowait(event)
+            self._stats["recorded"] += 1
+        except queue.Full:
+            self._stats["dropped_queue_full"] += 1
+
+    def _writer(self) -> None:
+        header = {
+            "type": "header",
+            "version": TRACE_VERSION,
+            "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "sample_rate": self.sample_rate,
+        }
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(header) + "\n")
+                f.flush()
+                while True:
+                    event = self._queue.get()
+                    if event is None:
+                        return
+                    f.write(json.dumps(event, ensure_ascii=False) + "\n")
+                    # Flush khi queue rỗng: gộp nhiều event vào một lần ghi
+                    if self._queue.empty():
+                        f.flush()
+        except OSError as e:
+            self._stats["write_errors"] += 1
+            logger.error(f"Không ghi được trace file {self.path}: {e}")
+
+    def close(self) -> None:
+        """Ghi hết event đang chờ và dừng thread nền"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = dict(self._stats)
+        stats["queue_size"] = self._queue.qsize()
+        return stats
@@ -0,0 +1,268 @@
+"""
+User Token Cache
+Cache token có hạn (JWT `exp`) trong process, có thể dùng chung giữa các worker qua shared state.
+Dùng cho session Backend; Teams user token không cache ở đây mà luôn lấy từ SDK
+"""
+import asyncio
+import base64
+import json
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple, Union
+
+from shared_state import KEY_SEPARATOR, SharedState, make_key
+
+logger = logging.getLogger(__name__)
+
+TokenKey = Tuple[str, str, str]
+
+# Token đọc được `exp` (JWT), hoặc (token, thời điểm hết hạn) cho token không phải JWT
+FetchResult = Union[str, Tuple[str, float], None]
+
+SHARED_NAMESPACE = "user_token"
+
+
+def decode_jwt_exp(token: str) -> Optional[float]:
+    """
+    Đọc claim `exp` từ JWT (không verify chữ ký - chỉ dùng để biết khi nào hết hạn)
+
+    Args:
+        token: JWT dạng header.payload.signature
+
+    Returns:
+        Thời điểm hết hạn (epoch seconds) hoặc None nếu không đọc được
+    """
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+        exp = claims.get("exp")
+        return float(exp) if exp is not None else None
+    except (IndexError, ValueError, TypeError, AttributeError):
+        return None
+
+
+def _split_fetch_result(result: FetchResult) -> Tuple[Optional[str], Optional[float]]:
+    if isinstance(result, tuple):
+        return result
+    return result, None
+
+
+@dataclass
+class _CachedToken:
+    token: str
+    expires_at: float
+    # Dùng token trong process đến thời điểm này (trước exp - safety margin, hoặc sớm hơn khi có shared state)
+    fresh_until: float
+
+
+class UserTokenCache:
+    """
+    Cache token theo (user_id, connection, scope)
+
+    - Token được dùng lại cho đến `safety_margin` giây trước `exp`
+    - Nhiều request đồng thời của cùng một user chỉ gọi token service một lần
+    - Token không đọc được `exp` sẽ không được cache (trừ khi `fetch` trả về kèm thời điểm hết hạn)
+    - Có `shared`: token được ghi vào shared state để worker khác dùng lại; bản trong
+      process chỉ dùng trong `local_ttl` giây để invalidation của worker khác có hiệu lực nhanh
+    """
+
+    def __init__(
+        self,
+        safety_margin: float = 300.0,
+        max_entries: int = 10000,
+        shared: Optional[SharedState] = None,
+        local_ttl: float = 5.0,
+        namespace: str = SHARED_NAMESPACE,
+    ):
+        self.safety_margin = safety_margin
+        self.max_entries = max_entries
+        self.shared = shared
+        self.local_ttl = local_ttl
+        self.namespace = namespace
+        self._entries: Dict[TokenKey, _CachedToken] = {}
+        self._inflight: Dict[TokenKey, asyncio.Future] = {}
+        self._shared_tasks: Set[asyncio.Task] = set()
+        self._stats: Dict[str, int] = {
+            "hits": 0,
+            "shared_hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "expired": 0,
+            "uncacheable": 0,
+            "invalidations": 0,
+        }
+
+    async def get_token(
+        self,
+        user_id: str,
+        connection_name: str,
+        scope: str,
+        fetch: Callable[[], Awaitable[FetchResult]]
+    ) -> Optional[str]:
+        """
+        Lấy token từ cache, hoặc gọi `fetch` nếu chưa có / sắp hết hạn
+
+        Args:
+            user_id: User ID trong Teams
+            connection_name: Tên OAuth connection
+            scope: Scope của token
+            fetch: Coroutine lấy token mới từ token service (trả về None nếu user chưa authenticate),
+                hoặc (token, expires_at) khi token không phải JWT
+
+        Returns:
+            Token hoặc None nếu user chưa authenticate
+        """
+        key = (user_id, connection_name, scope)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if time.time() < entry.fresh_until:
+                self._stats["hits"] += 1
+                return entry.token
+            if time.time() >= entry.expires_at - self.safety_margin:
+                self._stats["expired"] += 1
+            del self._entries[key]
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self._stats["coalesced"] += 1
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+                # Request đang lấy token bị cancel → tự lấy token
+                return await self.get_token(user_id, connection_name, scope, fetch)
+
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            token, expires_at = await self._get_shared(key)
+            if token is not None:
+                self._stats["shared_hits"] += 1
+            else:
+                self._stats["misses"] += 1
+                token, expires_at = _split_fetch_result(await fetch())
+                await self._put_shared(key, token, expires_at)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Tránh warning "exception was never retrieved" khi không có waiter nào khác
+            future.exception()
+            raise
+        else:
+            self._store(key, token, expires_at)
+            future.set_result(token)
+            return token
+        finally:
+            self._inflight.pop(key, None)
+
+    async def put(
+        self,
+        user_id: str,
+        connection_name: str,
+        scope: str,
+        token: str,
+        expires_at: Optional[float] = None
+    ) -> None:
+        """Lưu token vừa lấy được ngoài `get_token` (ví dụ sau khi user authenticate lại)"""
+        key = (user_id, connection_name, scope)
+        expires_at = expires_at if expires_at is not None else decode_jwt_exp(token)
+        await self._put_shared(key, token, expires_at)
+        self._store(key, token, expires_at)
+
+    async def _get_shared(self, key: TokenKey) -> Tuple[Optional[str], Optional[float]]:
+        if self.shared is None:
+            return None, None
+        value = await self.shared.get(self.namespace, make_key(*key))
+        if not isinstance(value, dict):
+            return None, None
+        token, expires_at = value.get("token"), value.get("expires_at")
+        if not token or expires_at is None or time.time() >= expires_at - self.safety_margin:
+            return None, None
+        return token, expires_at
+
+    async def _put_shared(self, key: TokenKey, token: Optional[str], expires_at: Optional[float]) -> None:
+        if self.shared is None or not token:
+            return
+        expires_at = expires_at if expires_at is not None else decode_jwt_exp(token)
+        if expires_at is not None:
+            await self.shared.set(
+                self.namespace,
+                make_key(*key),
+                {"token": token, "expires_at": expires_at},
+                expires_at - self.safety_margin - time.time()
+            )
+
+    def _store(self, key: TokenKey, token: Optional[str], expires_at: Optional[float] = None) -> None:
+        if not token:
+            return
+        expires_at = expires_at if expires_at is not None else decode_jwt_exp(token)
+        if expires_at is None:
+            self._stats["uncacheable"] += 1
+            return
+        if len(self._entries) >= self.max_entries:
+            self._prune()
+        fresh_until = expires_at - self.safety_margin
+        if self.shared is not None:
+            fresh_until = min(fresh_until, time.time() + self.local_ttl)
+        self._entries[key] = _CachedToken(token=token, expires_at=expires_at, fresh_until=fresh_until)
+
+    def _prune(self) -> None:
+        """Xoá token đã hết hạn, nếu vẫn đầy thì xoá token cũ nhất"""
+        now = time.time()
+        for key in [k for k, v in self._entries.items() if v.fresh_until <= now]:
+            del self._entries[key]
+        while len(self._entries) >= self.max_entries:
+            del self._entries[next(iter(self._entries))]
+
+    def invalidate(
+        self,
+        user_id: str,
+        connection_name: Optional[str] = None,
+        scope: Optional[str] = None
+    ) -> Optional[asyncio.Task]:
+        """
+        Xoá token của user khỏi cache (ví dụ khi Backend trả về 401)
+
+        Args:
+            user_id: User ID
+            connection_name: Chỉ xoá token của connection này (optional)
+            scope: Chỉ xoá token của scope này (optional)
+
+        Returns:
+            Task xoá token trong shared state (await nếu cần lấy token mới ngay sau đó), None nếu không có
+        """
+        for key in list(self._entries):
+            if key[0] != user_id:
+                continue
+            if connection_name is not None and key[1] != connection_name:
+                continue
+            if scope is not None and key[2] != scope:
+                continue
+            del self._entries[key]
+            self._stats["invalidations"] += 1
+        if self.shared is not None:
+            # Xoá cả bản trong shared state để worker khác không dùng lại token bị từ chối
+            parts = [user_id]
+            if connection_name is not None:
+                parts.append(connection_name)
+                if scope is not None:
+                    parts.append(scope)
+            prefix = make_key(*parts) + (KEY_SEPARATOR if len(parts) < 3 else "")
+            task = asyncio.get_running_loop().create_task(self.shared.delete_prefix(self.namespace, prefix))
+            self._shared_tasks.add(task)
+            task.add_done_callback(self._shared_tasks.discard)
+            return task
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        """Thống kê hit/miss của cache"""
+        stats: Dict[str, Any] = dict(self._stats)
+        lookups = stats["hits"] + stats["shared_hits"] + stats["misses"] + stats["coalesced"]
+        stats["entries"] = len(self._entries)
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,114 @@
+"""
+Warm-up
+Chạy đồng thời các bước làm nóng khi start (DNS + TLS tới Backend và LLM, lấy token)
+để request đầu tiên sau deploy/scale-out không phải trả chi phí này;
+readiness (/ready) chỉ xanh khi warm-up xong hoặc hết thời gian chờ
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+WarmupStep = Callable[[], Awaitable[Any]]
+
+STATE_PENDING = "pending"
+STATE_WARMING = "warming"
+STATE_READY = "ready"
+STATE_TIMED_OUT = "timed_out"
+STATE_SKIPPED = "skipped"
+
+
+class Warmup:
+    """
+    Các bước warm-up chạy song song, có timeout chung
+
+    - Bước lỗi không chặn readiness, chỉ được log và ghi vào stats
+    - Hết `timeout` → các bước chưa xong bị huỷ, app vẫn chuyển sang ready
+    """
+
+    def __init__(self, timeout: float = 20.0, enabled: bool = True):
+        self.timeout = timeout
+        self.enabled = enabled
+        self._steps: List[Tuple[str, WarmupStep]] = []
+        self._results: Dict[str, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._state = STATE_PENDING if enabled else STATE_SKIPPED
+        self._seconds: Optional[float] = None
+
+    def add(self, name: str, step: WarmupStep) -> None:
+        self._steps.append((name, step))
+
+    @property
+    def ready(self) -> bool:
+        return self._state in (STATE_READY, STATE_TIMED_OUT, STATE_SKIPPED)
+
+    def start(self) -> Optional[asyncio.Task]:
+        """Chạy warm-up nền (gọi nhiều lần chỉ chạy một lần)"""
+        if self._task is None and self._state == STATE_PENDING:
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def _run_step(self, name: str, step: WarmupStep) -> None:
+        started = time.perf_counter()
+        try:
+            await step()
+            self._results[name] = {"status": "ok"}
+        except asyncio.CancelledError:
+            self._results[name] = {"status": "timeout"}
+            raise
+        except Exception as e:
+            self._results[name] = {"status": "error", "error": str(e)}
+            logger.warning(f"Warm-up '{name}' lỗi: {e}")
+        finally:
+            self._results[name]["seconds"] = round(time.perf_counter() - started, 4)
+
+    async def run(self) -> None:
+        self._state = STATE_WARMING
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(self._run_step(name, step)) for name, step in self._steps]
+        timed_out = False
+        if tasks:
+            try:
+                _, pending = await asyncio.wait(tasks, timeout=self.timeout)
+            except asyncio.CancelledError:
+                for task in tasks:
+                    task.cancel()
+                raise
+            for task in pending:
+                task.cancel()
+            if pending:
+                timed_out = True
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        self._seconds = round(time.perf_counter() - started, 4)
+        self._state = STATE_TIMED_OUT if timed_out else STATE_READY
+        steps = ", ".join(
+            f"{name}={result['status']} {result['seconds'] * 1000:.0f}ms" for name, result in self._results.items()
+        )
+        log = logger.warning if timed_out else logger.info
+        log(f"🔥 Warm-up {self._state} sau {self._seconds * 1000:.0f}ms: {steps or 'không có bước nào'}")
+
+    def cancel(self) -> None:
+        """Huỷ warm-up đang chạy (khi app shutdown)"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    def status(self) -> Dict[str, Any]:
+        """Trạng thái cho /ready"""
+        return {
+            "ready": self.ready,
+            "state": self._state,
+            "seconds": self._seconds,
+            "steps": {name: dict(result) for name, result in self._results.items()},
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "state": self._state,
+            "seconds": self._seconds,
+            "step_seconds": {name: result["seconds"] for name, result in self._results.items()},
+            "step_ok": {name: int(result["status"] == "ok") for name, result in self._results.items()},
+        }
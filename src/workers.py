@@ -0,0 +1,307 @@
+"""
+Workers
+Multi-worker mode (WORKERS > 1): supervisor bind port một lần rồi start N worker process
+dùng chung listening socket (truyền fd), theo dõi heartbeat và restart từng worker.
+
+- Worker crash/exit → start lại (backoff nếu crash liên tục)
+- Worker không ghi heartbeat quá WORKER_HEARTBEAT_TIMEOUT_SECONDS → SIGTERM, quá grace → SIGKILL
+- SIGTERM một worker (pid ở /workers) → worker dừng gracefully và được start lại
+- SIGHUP supervisor → rolling restart: start worker mới, chờ ready rồi mới dừng worker cũ
+- SIGTERM/SIGINT supervisor → dừng tất cả worker
+
+Chỉ import stdlib ở top level: supervisor không cần Teams SDK.
+"""
+import asyncio
+import logging
+import os
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+import startup
+from shared_state import SharedState, connect, delete_worker_health, read_worker_health
+
+logger = logging.getLogger(__name__)
+
+WORKER_SLOT_ENV = "BOT_WORKER_SLOT"
+LISTEN_FD_ENV = "BOT_LISTEN_FD"
+
+# Worker mới có tối đa chừng này giây để ready trong rolling restart
+ROLLING_READY_TIMEOUT = 60.0
+# Worker chết trong khoảng này sau khi start → tính là crash, tăng backoff
+CRASH_WINDOW_SECONDS = 10.0
+MAX_RESTART_BACKOFF = 30.0
+
+
+def worker_slot() -> Optional[int]:
+    """Slot của worker hiện tại (None khi không chạy dưới supervisor)"""
+    value = os.environ.get(WORKER_SLOT_ENV)
+    return int(value) if value else None
+
+
+def worker_path(path: str) -> str:
+    """File riêng cho mỗi worker, ví dụ traces/prod.jsonl → traces/prod.w1.jsonl"""
+    slot = worker_slot()
+    if slot is None or not path:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.w{slot}{ext}"
+
+
+def max_rss_kb() -> Optional[int]:
+    """RSS cao nhất của process (KB)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS trả về byte, Linux trả về KB
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def inherited_listener() -> Optional[socket.socket]:
+    """Listening socket supervisor truyền cho worker"""
+    fd = os.environ.get(LISTEN_FD_ENV)
+    if not fd:
+        return None
+    sock = socket.socket(fileno=int(fd))
+    startup.milestone("listener_bound")
+    return sock
+
+
+class WorkerHealthReporter:
+    """Worker ghi health (`collect()`) vào shared state mỗi `interval` giây"""
+
+    def __init__(
+        self,
+        state: SharedState,
+        slot: int,
+        interval: float,
+        collect: Callable[[], Dict[str, Any]],
+    ):
+        self.state = state
+        self.slot = slot
+        self.interval = interval
+        self.collect = collect
+        self._started_at = time.time()
+        self._task: Optional[asyncio.Task] = None
+        self._errors = 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            await self.report()
+            await asyncio.sleep(self.interval)
+
+    async def report(self) -> None:
+        status = {"started_at": self._started_at, "uptime": round(time.time() - self._started_at, 1)}
+        try:
+            status.update(self.collect())
+            await self.state.report_worker(os.getpid(), self.slot, status)
+        except Exception as e:
+            self._errors += 1
+            logger.warning(f"Không ghi được health của worker {self.slot}: {e}")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"slot": self.slot, "uptime": round(time.time() - self._started_at, 1), "report_errors": self._errors}
+
+
+@dataclass
+class _WorkerProcess:
+    slot: int
+    process: subprocess.Popen
+    started_at: float
+    terminate_sent_at: Optional[float] = None
+    # Worker mới thay thế worker này trong rolling restart
+    replaced_by: Optional["_WorkerProcess"] = None
+
+
+class Supervisor:
+    """Start và giám sát các worker process dùng chung một listening socket"""
+
+    def __init__(
+        self,
+        command: List[str],
+        workers: int,
+        port: int,
+        state_path: Optional[str],
+        heartbeat_timeout: float = 30.0,
+        shutdown_grace: float = 30.0,
+    ):
+        self.command = command
+        self.workers = workers
+        self.port = port
+        self.state_path = state_path
+        self.heartbeat_timeout = heartbeat_timeout
+        self.shutdown_grace = shutdown_grace
+        self._processes: List[_WorkerProcess] = []
+        self._backoff: Dict[int, float] = {}
+        self._respawn_at: Dict[int, float] = {}
+        self._rolling: List[int] = []
+        self._stopping = False
+        self._sock: Optional[socket.socket] = None
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _spawn(self, slot: int) -> _WorkerProcess:
+        assert self._sock is not None
+        env = dict(os.environ)
+        env[WORKER_SLOT_ENV] = str(slot)
+        env[LISTEN_FD_ENV] = str(self._sock.fileno())
+        process = subprocess.Popen(self.command, env=env, pass_fds=(self._sock.fileno(),))
+        worker = _WorkerProcess(slot=slot, process=process, started_at=time.monotonic())
+        self._processes.append(worker)
+        logger.info(f"▶️ Worker {slot} started (pid {process.pid})")
+        return worker
+
+    def _terminate(self, worker: _WorkerProcess, reason: str) -> None:
+        if worker.terminate_sent_at is None and worker.process.poll() is None:
+            logger.info(f"⏹️ Dừng worker {worker.slot} (pid {worker.process.pid}): {reason}")
+            worker.process.send_signal(signal.SIGTERM)
+            worker.terminate_sent_at = time.monotonic()
+
+    def _health(self) -> Dict[int, Dict[str, Any]]:
+        if self.state_path is None:
+            return {}
+        try:
+            if self._conn is None:
+                self._conn = connect(self.state_path)
+            return {worker["pid"]: worker for worker in read_worker_health(self._conn)}
+        except sqlite3.Error as e:
+            logger.warning(f"Không đọc được health của worker: {e}")
+            return {}
+
+    def _forget(self, pid: int) -> None:
+        if self._conn is not None:
+            try:
+                delete_worker_health(self._conn, pid)
+            except sqlite3.Error:
+                pass
+
+    def _reap(self) -> None:
+        now = time.monotonic()
+        for worker in list(self._processes):
+            code = worker.process.poll()
+            if code is None:
+                continue
+            self._processes.remove(worker)
+            self._forget(worker.process.pid)
+            logger.info(f"Worker {worker.slot} (pid {worker.process.pid}) đã dừng, exit code {code}")
+            if self._stopping or any(p.slot == worker.slot for p in self._processes):
+                # Đang shutdown, hoặc slot đã có worker thay thế (rolling restart)
+                continue
+            crashed = code != 0 and now - worker.started_at < CRASH_WINDOW_SECONDS
+            backoff = min(self._backoff.get(worker.slot, 0.5) * 2, MAX_RESTART_BACKOFF) if crashed else 0.0
+            self._backoff[worker.slot] = backoff or 0.5
+            self._respawn_at[worker.slot] = now + backoff
+
+    def _check_heartbeats(self, health: Dict[int, Dict[str, Any]]) -> None:
+        if self.state_path is None:
+            return
+        now = time.monotonic()
+        for worker in self._processes:
+            if now - worker.started_at < self.heartbeat_timeout:
+                continue
+            status = health.get(worker.process.pid)
+            if status is None or status["heartbeat_age"] > self.heartbeat_timeout:
+                self._terminate(worker, "không có heartbeat")
+
+    def _advance_rolling_restart(self, health: Dict[int, Dict[str, Any]]) -> None:
+        retiring = [worker for worker in self._processes if worker.replaced_by is not None]
+        for worker in retiring:
+            new = worker.replaced_by
+            status = health.get(new.process.pid) or {}
+            new_ready = status.get("ready") or (self.state_path is None and new.process.poll() is None)
+            timed_out = time.monotonic() - new.started_at > ROLLING_READY_TIMEOUT
+            if new.process.poll() is not None or new_ready or timed_out:
+                self._terminate(worker, "rolling restart")
+        if retiring or not self._rolling:
+            return
+        slot = self._rolling.pop(0)
+        old = next((worker for worker in self._processes if worker.slot == slot and worker.terminate_sent_at is None), None)
+        new = self._spawn(slot)
+        if old is not None:
+            old.replaced_by = new
+
+    def _kill_overdue(self) -> None:
+        now = time.monotonic()
+        for worker in self._processes:
+            if worker.terminate_sent_at is not None and now - worker.terminate_sent_at > self.shutdown_grace:
+                if worker.process.poll() is None:
+                    logger.warning(f"Worker {worker.slot} (pid {worker.process.pid}) không dừng sau {self.shutdown_grace:.0f}s, kill")
+                    worker.process.kill()
+
+    def _handle_stop(self, signum, frame) -> None:
+        self._stopping = True
+
+    def _handle_reload(self, signum, frame) -> None:
+        logger.info("🔄 Rolling restart tất cả worker")
+        self._rolling = list(range(self.workers))
+
+    def run(self) -> int:
+        self._sock = startup.bind_listener(self.port)
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGHUP, self._handle_reload)
+        logger.info(f"🧩 Supervisor (pid {os.getpid()}) start {self.workers} worker trên port {self.port}")
+        for slot in range(self.workers):
+            self._spawn(slot)
+
+        while not self._stopping:
+            time.sleep(0.5)
+            self._reap()
+            now = time.monotonic()
+            for slot, respawn_at in list(self._respawn_at.items()):
+                if now >= respawn_at:
+                    del self._respawn_at[slot]
+                    self._spawn(slot)
+            health = self._health()
+            self._check_heartbeats(health)
+            self._advance_rolling_restart(health)
+            self._kill_overdue()
+
+        logger.info("Đang dừng tất cả worker...")
+        for worker in self._processes:
+            self._terminate(worker, "supervisor shutdown")
+        while self._processes:
+            time.sleep(0.2)
+            self._reap()
+            self._kill_overdue()
+        self._sock.close()
+        if self._conn is not None:
+            self._conn.close()
+        return 0
+
+
+def run_supervisor(config: Any) -> int:
+    """Entry point của supervisor khi `python app.py` chạy với WORKERS > 1"""
+    from structured_logging import setup_logging, stop_logging
+
+    setup_logging(level=config.LOG_LEVEL, fmt=config.LOG_FORMAT, queue_size=config.LOG_QUEUE_SIZE)
+    if sys.platform == "win32":
+        logger.error("Multi-worker mode cần truyền socket cho process con (chỉ hỗ trợ Linux/macOS)")
+        return 1
+    supervisor = Supervisor(
+        command=[sys.executable] + sys.argv,
+        workers=config.WORKERS,
+        port=config.PORT,
+        state_path=config.SHARED_STATE_PATH if config.SHARED_STATE.lower() == "sqlite" else None,
+        heartbeat_timeout=config.WORKER_HEARTBEAT_TIMEOUT_SECONDS,
+        shutdown_grace=config.WORKER_SHUTDOWN_GRACE_SECONDS,
+    )
+    try:
+        return supervisor.run()
+    finally:
+        stop_logging()
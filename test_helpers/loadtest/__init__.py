@@ -0,0 +1,9 @@
+"""
+Load test local cho Bot Teams
+
+- fake_services: giả lập Bot Framework connector + token service, Backend HR API
+  (/api/v1/hr/query, auth) và OpenAI-compatible API (chat completions streaming, embeddings)
+- driver: bắn hàng nghìn activity đồng thời vào bot, báo cáo throughput và p50/p95/p99 theo handler
+
+Chạy: python -m test_helpers.loadtest.driver --spawn-bot --requests 2000 --concurrency 200
+"""
@@ -0,0 +1,113 @@
+"""
+So sánh hai benchmark report của replay.py (baseline vs candidate)
+
+In bảng chênh lệch latency p50/p95/p99, error rate, số lời gọi ra ngoài mỗi message
+và RSS của bot; exit code 1 khi có regression vượt ngưỡng (dùng được trong CI).
+
+    python -m test_helpers.loadtest.compare bench-v1.4.json bench-v1.5.json --tolerance 0.1
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+# (tên, giá trị baseline, giá trị candidate, regression?)
+Row = Tuple[str, Optional[float], Optional[float], bool]
+
+
+def _relative_regression(baseline: Optional[float], candidate: Optional[float], tolerance: float, floor: float) -> bool:
+    """Candidate tệ hơn baseline quá `tolerance` (tương đối) và quá `floor` (tuyệt đối)"""
+    if baseline is None or candidate is None:
+        return False
+    return candidate - baseline > max(abs(baseline) * tolerance, floor)
+
+
+def compare_reports(
+    baseline: Dict[str, Any],
+    candidate: Dict[str, Any],
+    tolerance: float = 0.1,
+    latency_floor: float = 0.02,
+    error_rate_floor: float = 0.01,
+    rss_floor_kb: float = 2048,
+) -> List[Row]:
+    """Các dòng so sánh giữa hai report"""
+    rows: List[Row] = []
+    if baseline.get("benchmark", {}).get("trace_sha256") != candidate.get("benchmark", {}).get("trace_sha256"):
+        print("⚠️  Hai report không replay cùng một trace, kết quả chỉ mang tính tham khảo", file=sys.stderr)
+
+    handlers = sorted(set(baseline.get("handlers", {})) | set(candidate.get("handlers", {})))
+    for handler in handlers:
+        base = baseline.get("handlers", {}).get(handler, {})
+        cand = candidate.get("handlers", {}).get(handler, {})
+        for p in ("p50", "p95", "p99"):
+            b = base.get("reply_latency", {}).get(p)
+            c = cand.get("reply_latency", {}).get(p)
+            rows.append((f"{handler} {p} (s)", b, c, _relative_regression(b, c, tolerance, latency_floor)))
+        b, c = base.get("error_rate"), cand.get("error_rate")
+        rows.append((f"{handler} error rate", b, c, b is not None and c is not None and c - b > error_rate_floor))
+
+    services = sorted(set(baseline.get("outbound_calls", {})) | set(candidate.get("outbound_calls", {})))
+    for service in services:
+        b = baseline.get("outbound_calls", {}).get(service, {}).get("per_message")
+        c = candidate.get("outbound_calls", {}).get(service, {}).get("per_message")
+        rows.append((f"{service} calls/message", b, c, _relative_regression(b, c, tolerance, 0.01)))
+
+    b = baseline.get("memory", {}).get("rss_growth_kb")
+    c = candidate.get("memory", {}).get("rss_growth_kb")
+    rows.append(("bot RSS growth (KB)", b, c, _relative_regression(b, c, tolerance, rss_floor_kb)))
+
+    base_store = baseline.get("memory", {}).get("conversation_store", {})
+    cand_store = candidate.get("memory", {}).get("conversation_store", {})
+    for name in sorted(set(base_store) | set(cand_store)):
+        rows.append((name, base_store.get(name), cand_store.get(name), False))
+    return rows
+
+
+def print_rows(rows: List[Row]) -> None:
+    def fmt(value: Optional[float]) -> str:
+        if value is None:
+            return "-"
+        return f"{value:.4g}"
+
+    width = max(len(name) for name, _, _, _ in rows) if rows else 10
+    print(f"{'metric':<{width}} {'baseline':>12} {'candidate':>12} {'change':>9}")
+    for name, b, c, regression in rows:
+        change = ""
+        if b is not None and c is not None and b != 0:
+            change = f"{(c - b) / abs(b) * 100:+.1f}%"
+        flag = "  ❌ regression" if regression else ""
+        print(f"{name:<{width}} {fmt(b):>12} {fmt(c):>12} {change:>9}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="So sánh hai benchmark report của trace replay")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Ngưỡng tăng tương đối được chấp nhận (mặc định 10%%)")
+    parser.add_argument("--latency-floor", type=float, default=0.02, help="Bỏ qua chênh lệch latency nhỏ hơn N giây")
+    parser.add_argument("--no-fail", action="store_true", help="Không trả exit code 1 khi có regression")
+    args = parser.parse_args()
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.candidate, encoding="utf-8") as f:
+        candidate = json.load(f)
+
+    print(f"Baseline:  {baseline.get('benchmark', {}).get('git_revision')} ({args.baseline})")
+    print(f"Candidate: {candidate.get('benchmark', {}).get('git_revision')} ({args.candidate})")
+    print()
+    rows = compare_reports(baseline, candidate, tolerance=args.tolerance, latency_floor=args.latency_floor)
+    print_rows(rows)
+
+    regressions = [name for name, _, _, regression in rows if regression]
+    print()
+    if regressions:
+        print(f"❌ {len(regressions)} regression: {', '.join(regressions)}")
+        if not args.no_fail:
+            sys.exit(1)
+    else:
+        print("✅ Không có regression vượt ngưỡng")
+
+
+if __name__ == "__main__":
+    main()
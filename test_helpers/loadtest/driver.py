@@ -0,0 +1,477 @@
+"""
+Load test driver
+
+Bắn activity đồng thời vào /api/messages của bot và đo:
+- latency end-to-end: từ lúc POST activity tới lúc fake connector nhận reply (message đầu tiên)
+- time-to-first-activity: activity đầu tiên bot gửi (typing / stream update)
+- latency HTTP của chính request POST /api/messages
+
+Fake services (connector, token service, Backend, OpenAI) chạy trong thread riêng của
+process này; bot có thể được khởi động tự động với env trỏ tới fake services (--spawn-bot).
+
+    python -m test_helpers.loadtest.driver --spawn-bot --requests 2000 --concurrency 200
+    python -m test_helpers.loadtest.driver --bot-url http://localhost:3978 --mix hr=0.8,auth=0.2 \\
+        --backend "latency=0.5,error_rate=0.05" --json results.json
+
+Khi tự chạy bot (không dùng --spawn-bot), start bot bằng test_helpers/loadtest/run_bot.py
+với env in ra bởi --print-env.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+REPO_ROOT = Path(__file__).resolve().parent.parent.parent
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from test_helpers.loadtest.fake_services import FakeServices, add_profile_arguments, profiles_from_args
+
+HR_QUESTIONS = [
+    "Tôi có bao nhiêu ngày phép năm?",
+    "Chính sách nghỉ ốm như thế nào?",
+    "Làm sao để đăng ký làm việc từ xa?",
+    "Quy định về bảo hiểm sức khoẻ cho người thân?",
+    "Thời gian thử việc là bao lâu?",
+    "Công ty có hỗ trợ chi phí đào tạo không?",
+    "Cách tính lương làm thêm giờ?",
+    "Quy trình xin nghỉ việc gồm những bước nào?",
+]
+
+AUTH_COMMANDS = ["auth", "đăng nhập", "login"]
+
+# Reply bắt đầu bằng các ký hiệu này là lỗi / từ chối của bot
+ERROR_PREFIXES = {
+    "⚠️": "backend_error",
+    "❌": "bot_error",
+    "🔐": "auth_required",
+    "⏱️": "deadline_exceeded",
+    "⏳": "rejected_busy",
+}
+
+
+@dataclass
+class RequestResult:
+    """Kết quả của một activity"""
+
+    handler: str
+    outcome: str
+    http_status: Optional[int] = None
+    http_latency: Optional[float] = None
+    first_activity_latency: Optional[float] = None
+    reply_latency: Optional[float] = None
+
+
+@dataclass
+class _Pending:
+    sent_at: float
+    reply: asyncio.Future
+    first_activity_at: Optional[float] = None
+
+
+def parse_mix(spec: str) -> List[Tuple[str, float]]:
+    """Parse "hr=0.9,auth=0.1" thành [(handler, weight)]"""
+    mix = []
+    for item in spec.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in ("hr", "auth"):
+            raise ValueError(f"Handler không hợp lệ trong --mix: '{name}' (hợp lệ: hr, auth)")
+        mix.append((name, float(weight or 1)))
+    return mix
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """Percentile theo nearest-rank"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(p / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def classify_reply(activity: Dict[str, Any]) -> str:
+    text = (activity.get("text") or "").strip()
+    for prefix, outcome in ERROR_PREFIXES.items():
+        if text.startswith(prefix):
+            return outcome
+    return "ok"
+
+
+def build_activity(service_url: str, conversation_id: str, user_id: str, text: str) -> Dict[str, Any]:
+    """Message activity giống Teams gửi tới bot, reply sẽ đi tới `service_url` (fake connector)"""
+    return {
+        "type": "message",
+        "id": uuid.uuid4().hex,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "channelId": "msteams",
+        "serviceUrl": service_url,
+        "from": {"id": user_id, "name": user_id, "aadObjectId": str(uuid.uuid5(uuid.NAMESPACE_URL, user_id))},
+        "recipient": {"id": "28:loadtest-bot", "name": "HR Bot"},
+        "conversation": {"id": conversation_id, "conversationType": "personal", "tenantId": "loadtest-tenant"},
+        "channelData": {"tenant": {"id": "loadtest-tenant"}},
+        "text": text,
+    }
+
+
+class FakeServicesThread:
+    """Chạy fake services (uvicorn) trên event loop riêng trong một thread"""
+
+    def __init__(self, services: FakeServices, host: str, port: int):
+        import uvicorn
+
+        self.services = services
+        self.host = host
+        self.port = port
+        self.server = uvicorn.Server(uvicorn.Config(
+            services.create_app(),
+            host=host,
+            port=port,
+            log_level="warning",
+            access_log=False,
+        ))
+        self._thread = threading.Thread(target=self.server.run, name="fake-services", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self, timeout: float = 10.0) -> None:
+        self._thread.start()
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError(f"Không start được fake services trên {self.base_url}")
+            time.sleep(0.05)
+
+    def stop(self) -> None:
+        self.server.should_exit = True
+        self._thread.join(timeout=5)
+
+
+def bot_env(fakes_url: str, port: int) -> Dict[str, str]:
+    """Env để bot gọi fake services thay cho Bot Framework / Backend / Azure OpenAI"""
+    return {
+        "PORT": str(port),
+        # Không có CLIENT_ID → SDK bỏ qua JWT validation và không lấy bot token
+        "CLIENT_ID": "",
+        "CLIENT_SECRET": "",
+        # Đọc bởi run_bot.py (token service của SDK không cấu hình được URL)
+        "LOADTEST_TOKEN_SERVICE_URL": f"{fakes_url}/token",
+        "BACKEND_URL": f"{fakes_url}/backend",
+        "BACKEND_AUTH_ENDPOINT": "/api/auth/teams-token",
+        "AZURE_OPENAI_ENDPOINT": f"{fakes_url}/openai",
+        "AZURE_OPENAI_API_KEY": "loadtest",
+        "AZURE_OPENAI_MODEL_DEPLOYMENT_NAME": "gpt-loadtest",
+        "LITELLM_API_KEY": "",
+        "LITELLM_BASE_URL": "",
+        "LITELLM_DEFAULT_CHAT_MODEL": "",
+        "LOG_LEVEL": "WARNING",
+    }
+
+
+class LoadDriver:
+    """Gửi activity, chờ reply qua fake connector và ghi nhận kết quả"""
+
+    def __init__(
+        self,
+        bot_url: str,
+        service_url: str,
+        mix: List[Tuple[str, float]],
+        users: int,
+        reply_timeout: float,
+        distinct_queries: int,
+    ):
+        self.endpoint = f"{bot_url.rstrip('/')}/api/messages"
+        self.service_url = service_url
+        self.handlers = [name for name, _ in mix]
+        self.weights = [weight for _, weight in mix]
+        self.users = users
+        self.reply_timeout = reply_timeout
+        self.distinct_queries = distinct_queries
+        self.results: List[RequestResult] = []
+        self._pending: Dict[str, _Pending] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def on_connector_activity(self, conversation_id: str, activity: Dict[str, Any], received_at: float) -> None:
+        """Listener của fake connector (chạy trên thread của fake services)"""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._record_activity, conversation_id, activity, received_at)
+
+    def _record_activity(self, conversation_id: str, activity: Dict[str, Any], received_at: float) -> None:
+        pending = self._pending.get(conversation_id)
+        if pending is None:
+            return
+        if pending.first_activity_at is None:
+            pending.first_activity_at = received_at
+        if activity.get("type") == "message" and not pending.reply.done():
+            pending.reply.set_result((activity, received_at))
+
+    def _activity(self, index: int, handler: str) -> Tuple[str, Dict[str, Any]]:
+        conversation_id = f"loadtest-conv-{index}-{uuid.uuid4().hex[:8]}"
+        if handler == "auth":
+            text = random.choice(AUTH_COMMANDS)
+        else:
+            question = HR_QUESTIONS[index % len(HR_QUESTIONS)]
+            text = f"{question} (#{index % self.distinct_queries})"
+        user_id = f"loadtest-user-{index % self.users}"
+        return conversation_id, build_activity(self.service_url, conversation_id, user_id, text)
+
+    async def send_one(self, client: httpx.AsyncClient, index: int) -> None:
+        handler = random.choices(self.handlers, self.weights)[0]
+        conversation_id, activity = self._activity(index, handler)
+        await self.send_activity(client, handler, conversation_id, activity)
+
+    async def send_activity(
+        self,
+        client: httpx.AsyncClient,
+        handler: str,
+        conversation_id: str,
+        activity: Dict[str, Any],
+    ) -> RequestResult:
+        """
+        POST activity và chờ reply qua fake connector
+
+        Reply được nhận diện theo conversation, nên mỗi conversation chỉ được có
+        một activity đang chờ reply tại một thời điểm.
+        """
+        self._loop = asyncio.get_running_loop()
+        pending = _Pending(sent_at=time.perf_counter(), reply=self._loop.create_future())
+        self._pending[conversation_id] = pending
+        result = RequestResult(handler=handler, outcome="no_reply")
+
+        try:
+            try:
+                response = await client.post(self.endpoint, json=activity)
+                result.http_status = response.status_code
+                result.http_latency = time.perf_counter() - pending.sent_at
+                if response.status_code >= 400:
+                    result.outcome = f"http_{response.status_code}"
+                    return result
+            except httpx.HTTPError as e:
+                result.outcome = f"http_{type(e).__name__}"
+                return result
+
+            try:
+                remaining = max(0.0, self.reply_timeout - (time.perf_counter() - pending.sent_at))
+                reply, received_at = await asyncio.wait_for(asyncio.shield(pending.reply), remaining)
+            except asyncio.TimeoutError:
+                return result
+            result.reply_latency = received_at - pending.sent_at
+            result.outcome = classify_reply(reply)
+            return result
+        finally:
+            if pending.first_activity_at is not None:
+                result.first_activity_latency = pending.first_activity_at - pending.sent_at
+            self._pending.pop(conversation_id, None)
+            self.results.append(result)
+
+    async def run(self, requests: int, concurrency: int, rate: Optional[float]) -> float:
+        """Chạy load test, trả về tổng thời gian (giây)"""
+        semaphore = asyncio.Semaphore(concurrency)
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        timeout = httpx.Timeout(self.reply_timeout, connect=10.0)
+
+        async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+            async def worker(index: int) -> None:
+                try:
+                    await self.send_one(client, index)
+                finally:
+                    semaphore.release()
+
+            started = time.perf_counter()
+            tasks = []
+            for index in range(requests):
+                if rate:
+                    # Open loop: activity được gửi theo lịch cố định, không chờ reply của activity trước
+                    delay = started + index / rate - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                # Chỉ tạo task khi còn slot để không giữ hàng nghìn coroutine chờ
+                await semaphore.acquire()
+                tasks.append(asyncio.create_task(worker(index)))
+            await asyncio.gather(*tasks)
+            return time.perf_counter() - started
+
+
+def summarize(results: List[RequestResult], duration: float) -> Dict[str, Any]:
+    """Throughput và p50/p95/p99 theo handler (và tổng)"""
+    groups: Dict[str, List[RequestResult]] = {}
+    for result in results:
+        groups.setdefault(result.handler, []).append(result)
+    groups["all"] = list(results)
+
+    def latency_stats(values: List[float]) -> Dict[str, Optional[float]]:
+        return {
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+            "max": max(values) if values else None,
+        }
+
+    report: Dict[str, Any] = {"duration_seconds": duration, "handlers": {}}
+    for handler, items in groups.items():
+        outcomes: Dict[str, int] = {}
+        for item in items:
+            outcomes[item.outcome] = outcomes.get(item.outcome, 0) + 1
+        ok = outcomes.get("ok", 0)
+        report["handlers"][handler] = {
+            "requests": len(items),
+            "ok": ok,
+            "error_rate": (len(items) - ok) / len(items) if items else 0.0,
+            "throughput_rps": ok / duration if duration else 0.0,
+            "outcomes": outcomes,
+            "reply_latency": latency_stats([i.reply_latency for i in items if i.reply_latency is not None]),
+            "first_activity_latency": latency_stats([i.first_activity_latency for i in items if i.first_activity_latency is not None]),
+            "http_latency": latency_stats([i.http_latency for i in items if i.http_latency is not None]),
+        }
+    return report
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    def ms(value: Optional[float]) -> str:
+        return f"{value * 1000:8.0f}" if value is not None else "       -"
+
+    print()
+    print("=" * 96)
+    print(f"📊 Load test: {report['duration_seconds']:.1f}s")
+    print("=" * 96)
+    print(f"{'handler':<8} {'requests':>8} {'ok':>7} {'err%':>6} {'ok/s':>8} | "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} | {'TTFA p50':>8}")
+    for handler, stats in report["handlers"].items():
+        reply = stats["reply_latency"]
+        print(
+            f"{handler:<8} {stats['requests']:>8} {stats['ok']:>7} {stats['error_rate'] * 100:>5.1f}% "
+            f"{stats['throughput_rps']:>8.1f} | {ms(reply['p50'])} {ms(reply['p95'])} {ms(reply['p99'])} "
+            f"{ms(reply['max'])} | {ms(stats['first_activity_latency']['p50'])}"
+        )
+    print()
+    for handler, stats in report["handlers"].items():
+        if handler != "all":
+            outcomes = ", ".join(f"{name}={count}" for name, count in sorted(stats["outcomes"].items()))
+            print(f"   {handler}: {outcomes}")
+    print()
+    print("   p50/p95/p99: POST activity → reply đầu tiên tới connector; TTFA: activity đầu tiên (typing/stream)")
+
+
+def spawn_bot(env: Dict[str, str], log_path: Path) -> subprocess.Popen:
+    log_file = open(log_path, "w")
+    return subprocess.Popen(
+        [sys.executable, str(Path(__file__).resolve().parent / "run_bot.py")],
+        cwd=str(REPO_ROOT / "src"),
+        env={**os.environ, **env},
+        stdout=log_file,
+        stderr=subprocess.STDOUT,
+    )
+
+
+async def wait_for_bot(bot_url: str, timeout: float, process: Optional[subprocess.Popen]) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(timeout=2.0) as client:
+        while True:
+            if process is not None and process.poll() is not None:
+                raise RuntimeError(f"Bot đã dừng (exit code {process.returncode})")
+            try:
+                await client.get(bot_url)
+                return
+            except httpx.HTTPError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"Bot không phản hồi tại {bot_url} sau {timeout:.0f}s")
+                await asyncio.sleep(0.2)
+
+
+async def fetch_fake_stats(fakes_url: str) -> Dict[str, Any]:
+    async with httpx.AsyncClient(timeout=5.0) as client:
+        return (await client.get(f"{fakes_url}/stats")).json()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test Bot Teams với fake connector / Backend / LLM")
+    parser.add_argument("--bot-url", default="http://127.0.0.1:3978", help="URL của bot (không gồm /api/messages)")
+    parser.add_argument("--spawn-bot", action="store_true", help="Tự start bot (run_bot.py) với env trỏ tới fake services")
+    parser.add_argument("--bot-log", default="loadtest-bot.log", help="File log của bot khi dùng --spawn-bot")
+    parser.add_argument("--print-env", action="store_true", help="In env cần set cho bot rồi thoát")
+    parser.add_argument("--fakes-host", default="127.0.0.1")
+    parser.add_argument("--fakes-port", type=int, default=8390)
+    parser.add_argument("--requests", type=int, default=1000, help="Tổng số activity")
+    parser.add_argument("--concurrency", type=int, default=100, help="Số activity đang chờ reply tối đa")
+    parser.add_argument("--rate", type=float, default=None, help="Gửi theo tốc độ cố định (activity/giây) thay vì closed loop")
+    parser.add_argument("--users", type=int, default=None, help="Số user khác nhau (mặc định: mỗi activity một user)")
+    parser.add_argument("--distinct-queries", type=int, default=1000000, help="Số câu hỏi khác nhau (nhỏ → trúng cache / single-flight)")
+    parser.add_argument("--mix", default="hr=0.9,auth=0.1", help="Tỉ lệ handler, ví dụ hr=0.9,auth=0.1")
+    parser.add_argument("--reply-timeout", type=float, default=60.0, help="Thời gian chờ reply tối đa mỗi activity")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", default=None, help="Ghi report (và kết quả từng request) ra file JSON")
+    parser.add_argument("--session-ttl", type=float, default=300.0, help="Thời hạn session token fake Backend cấp (BACKEND_SESSION_ENABLED)")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    fakes = FakeServices(profiles_from_args(args), session_ttl=args.session_ttl)
+    fakes_thread = FakeServicesThread(fakes, args.fakes_host, args.fakes_port)
+    env = bot_env(fakes_thread.base_url, httpx.URL(args.bot_url).port or 3978)
+
+    if args.print_env:
+        for key, value in env.items():
+            print(f"{key}={value}")
+        return
+
+    driver = LoadDriver(
+        bot_url=args.bot_url,
+        service_url=f"{fakes_thread.base_url}/connector",
+        mix=parse_mix(args.mix),
+        users=args.users or args.requests,
+        reply_timeout=args.reply_timeout,
+        distinct_queries=max(1, args.distinct_queries),
+    )
+    fakes.activity_listener = driver.on_connector_activity
+
+    fakes_thread.start()
+    print(f"🧪 Fake services: {fakes_thread.base_url}")
+
+    bot_process = None
+    try:
+        if args.spawn_bot:
+            bot_process = spawn_bot(env, Path(args.bot_log))
+            print(f"🚀 Đã start bot (pid {bot_process.pid}), log: {args.bot_log}")
+        asyncio.run(wait_for_bot(args.bot_url, 60.0, bot_process))
+
+        print(f"🔥 Gửi {args.requests} activity, concurrency={args.concurrency}"
+              + (f", rate={args.rate}/s" if args.rate else "") + f", mix={args.mix}")
+        duration = asyncio.run(driver.run(args.requests, args.concurrency, args.rate))
+
+        report = summarize(driver.results, duration)
+        report["fake_services"] = asyncio.run(fetch_fake_stats(fakes_thread.base_url))
+        print_report(report)
+        print(f"   Fake services: {json.dumps(report['fake_services'])}")
+
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump({**report, "results": [asdict(r) for r in driver.results]}, f, indent=2, ensure_ascii=False)
+            print(f"   Đã ghi report: {args.json}")
+    finally:
+        if bot_process is not None:
+            bot_process.terminate()
+            try:
+                bot_process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                bot_process.kill()
+        fakes_thread.stop()
+
+
+if __name__ == "__main__":
+    main()
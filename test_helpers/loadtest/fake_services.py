@@ -0,0 +1,374 @@
+"""
+Fake services cho load test local
+
+Một FastAPI app giả lập mọi dependency bên ngoài của bot:
+
+    /connector/v3/conversations/{id}/activities   Bot Framework connector (serviceUrl của activity)
+    /token/api/usertoken/GetToken                 Bot Framework token service (LOADTEST_TOKEN_SERVICE_URL, xem run_bot.py)
+    /backend/api/v1/hr/query                      Backend HR API, JSON hoặc SSE khi payload có "stream"
+    /backend/api/auth/teams-token                 Backend auth (BACKEND_AUTH_ENDPOINT), cấp session token khi có "issue_session"
+    /openai/...                                   OpenAI-compatible API (chat completions streaming, embeddings)
+
+Mỗi service có LatencyProfile riêng (xem profiles.py). Có thể chạy độc lập:
+
+    python -m test_helpers.loadtest.fake_services --port 8390 --backend "latency=0.3,error_rate=0.01"
+"""
+import argparse
+import asyncio
+import base64
+import gzip
+import hashlib
+import json
+import math
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from test_helpers.loadtest.profiles import LatencyProfile, parse_profile
+
+# Callback khi connector nhận một activity từ bot: (conversation_id, activity, thời điểm perf_counter)
+ActivityListener = Callable[[str, Dict[str, Any], float], None]
+
+# Hành vi riêng cho một request: (service, payload) -> (delay giây, status lỗi hoặc None), None → dùng profile
+ResponseOverride = Callable[[str, Dict[str, Any]], Optional[Tuple[float, Optional[int]]]]
+
+SERVICES = ("connector", "token", "backend", "auth", "llm")
+
+
+async def _backend_payload(request: Request) -> Dict[str, Any]:
+    """Body JSON của request tới Backend (bot có thể nén gzip/br, BACKEND_REQUEST_COMPRESSION)"""
+    body = await request.body()
+    encoding = request.headers.get("content-encoding", "")
+    if encoding == "gzip":
+        body = gzip.decompress(body)
+    elif encoding == "br":
+        import brotli
+
+        body = brotli.decompress(body)
+    return json.loads(body)
+
+HR_ANSWER = (
+    "Theo chính sách nhân sự hiện hành, nhân viên chính thức có 12 ngày phép năm, "
+    "cộng thêm 1 ngày cho mỗi 5 năm thâm niên. Ngày phép chưa dùng được chuyển sang "
+    "quý I năm sau. Vui lòng đăng ký nghỉ phép trên hệ thống HR trước ít nhất 3 ngày làm việc."
+)
+
+LLM_ANSWER = (
+    "Đây là câu trả lời giả lập từ fake LLM dùng cho load test. "
+    "Nội dung được stream theo từng từ để mô phỏng token streaming."
+)
+
+EMBEDDING_DIMENSIONS = 64
+
+
+def _fake_jwt(subject: str, lifetime: float = 3600.0) -> str:
+    """JWT không có chữ ký, chỉ để bot đọc được claim `exp`"""
+    def encode(data: Dict[str, Any]) -> str:
+        raw = json.dumps(data, separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+    header = encode({"alg": "none", "typ": "JWT"})
+    payload = encode({"sub": subject, "exp": int(time.time() + lifetime)})
+    return f"{header}.{payload}.loadtest"
+
+
+def _fake_embedding(text: str) -> list:
+    """Vector xác định theo từ trong text: câu giống nhau → cosine similarity cao"""
+    vector = [0.0] * EMBEDDING_DIMENSIONS
+    for word in text.lower().split():
+        digest = hashlib.md5(word.encode()).digest()
+        vector[digest[0] % EMBEDDING_DIMENSIONS] += 1.0 if digest[1] % 2 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def _words(text: str) -> list:
+    words = text.split(" ")
+    return [word + (" " if i < len(words) - 1 else "") for i, word in enumerate(words)]
+
+
+class FakeServices:
+    """
+    State của fake services: profile từng service, bộ đếm request và listener
+    nhận activity gửi tới connector (driver dùng để đo latency end-to-end)
+    """
+
+    def __init__(self, profiles: Optional[Dict[str, LatencyProfile]] = None, session_ttl: float = 300.0):
+        self.profiles: Dict[str, LatencyProfile] = {name: LatencyProfile() for name in SERVICES}
+        self.profiles.update(profiles or {})
+        # Session token Backend đã cấp → thời điểm hết hạn
+        self.session_ttl = session_ttl
+        self._sessions: Dict[str, float] = {}
+        self.activity_listener: Optional[ActivityListener] = None
+        # Replay dùng để trả latency / lỗi đã ghi trong trace cho từng câu hỏi
+        self.response_override: Optional[ResponseOverride] = None
+        self._stats: Dict[str, Dict[str, int]] = {
+            name: {"requests": 0, "errors": 0} for name in SERVICES
+        }
+        self._stats["auth"]["sessions_issued"] = 0
+        self._stats["backend"]["session_requests"] = 0
+        self._stats["backend"]["sessions_rejected"] = 0
+
+    def _session_valid(self, authorization: str) -> bool:
+        self._stats["backend"]["session_requests"] += 1
+        token = authorization[len("Bearer "):] if authorization.startswith("Bearer ") else ""
+        if self._sessions.get(token, 0.0) > time.time():
+            return True
+        self._stats["backend"]["sessions_rejected"] += 1
+        return False
+
+    async def _simulate(self, service: str, payload: Optional[Dict[str, Any]] = None) -> Optional[JSONResponse]:
+        """Chờ theo profile (hoặc override); trả về response lỗi nếu request này bị chọn để lỗi"""
+        self._stats[service]["requests"] += 1
+        override = self.response_override(service, payload or {}) if self.response_override else None
+        if override is not None:
+            delay, status = override
+            await asyncio.sleep(delay)
+        else:
+            profile = self.profiles[service]
+            await profile.wait()
+            status = profile.error()
+        if status is not None:
+            self._stats[service]["errors"] += 1
+            return JSONResponse({"error": f"fake {service} error"}, status_code=status)
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: dict(values) for name, values in self._stats.items()}
+
+    def create_app(self) -> FastAPI:
+        app = FastAPI(title="Bot load test fake services")
+
+        # --- Bot Framework connector -------------------------------------------------
+
+        async def receive_activity(conversation_id: str, request: Request):
+            received_at = time.perf_counter()
+            activity = await request.json()
+            if self.activity_listener is not None:
+                self.activity_listener(conversation_id, activity, received_at)
+            error = await self._simulate("connector")
+            if error is not None:
+                return error
+            return {"id": activity.get("id") or uuid.uuid4().hex}
+
+        @app.post("/connector/v3/conversations/{conversation_id}/activities")
+        async def send_to_conversation(conversation_id: str, request: Request):
+            return await receive_activity(conversation_id, request)
+
+        @app.post("/connector/v3/conversations/{conversation_id}/activities/{activity_id}")
+        async def reply_to_activity(conversation_id: str, activity_id: str, request: Request):
+            return await receive_activity(conversation_id, request)
+
+        @app.put("/connector/v3/conversations/{conversation_id}/activities/{activity_id}")
+        async def update_activity(conversation_id: str, activity_id: str, request: Request):
+            return await receive_activity(conversation_id, request)
+
+        # --- Bot Framework token service ---------------------------------------------
+
+        @app.get("/token/api/usertoken/GetToken")
+        async def get_user_token(request: Request):
+            error = await self._simulate("token")
+            if error is not None:
+                # Token service trả 404 khi user chưa đăng nhập
+                return error
+            params = request.query_params
+            return {
+                "channelId": params.get("channelId", "msteams"),
+                "connectionName": params.get("connectionName", "graph"),
+                "token": _fake_jwt(params.get("userId", "user")),
+            }
+
+        # --- Backend -------------------------------------------------------------------
+
+        @app.post("/backend/api/v1/hr/query")
+        async def hr_query(request: Request):
+            payload = await _backend_payload(request)
+            authorization = request.headers.get("Authorization")
+            if authorization is not None:
+                if not self._session_valid(authorization):
+                    return JSONResponse({"error": "session expired"}, status_code=401)
+            elif not request.headers.get("X-Teams-Token"):
+                return JSONResponse({"error": "missing token"}, status_code=401)
+            error = await self._simulate("backend", payload)
+            if error is not None:
+                return error
+
+            response = {
+                "answer": HR_ANSWER,
+                "sources": [{"document_title": "Sổ tay nhân sự 2025"}, {"document_title": "Quy định nghỉ phép"}],
+                "metadata": {"query": payload.get("query"), "fake": True},
+            }
+            if not payload.get("stream"):
+                return response
+
+            chunk_delay = self.profiles["backend"].chunk_delay
+
+            async def events():
+                for word in _words(HR_ANSWER):
+                    yield f"data: {json.dumps({'type': 'delta', 'text': word}, ensure_ascii=False)}\n\n"
+                    await asyncio.sleep(chunk_delay)
+                yield f"data: {json.dumps({'type': 'final', **response}, ensure_ascii=False)}\n\n"
+
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        @app.post("/backend/api/auth/teams-token")
+        @app.post("/backend/api/v1/auth/teams-token")
+        async def teams_token(request: Request):
+            payload = await _backend_payload(request)
+            error = await self._simulate("auth")
+            if error is not None:
+                return error
+            user_id = payload.get("user_id", "user")
+            response = {
+                "success": True,
+                "message": "Authenticated",
+                "user": {"full_name": f"Load Test {user_id}", "email": f"{user_id}@loadtest.local"},
+            }
+            if payload.get("issue_session"):
+                session_token = f"sess-{uuid.uuid4().hex}"
+                self._sessions[session_token] = time.time() + self.session_ttl
+                self._stats["auth"]["sessions_issued"] += 1
+                response.update({"session_token": session_token, "expires_in": self.session_ttl})
+            return response
+
+        # --- OpenAI-compatible API ---------------------------------------------------
+
+        async def chat_completions(request: Request, model: Optional[str] = None):
+            payload = await request.json()
+            error = await self._simulate("llm")
+            if error is not None:
+                return error
+            model = model or payload.get("model", "fake-model")
+            completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+            created = int(time.time())
+
+            if not payload.get("stream"):
+                return {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": model,
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": LLM_ANSWER},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {"prompt_tokens": 100, "completion_tokens": 40, "total_tokens": 140},
+                }
+
+            chunk_delay = self.profiles["llm"].chunk_delay
+
+            def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> str:
+                data = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                }
+                return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+            async def events():
+                yield chunk({"role": "assistant", "content": ""})
+                for word in _words(LLM_ANSWER):
+                    yield chunk({"content": word})
+                    await asyncio.sleep(chunk_delay)
+                yield chunk({}, "stop")
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        async def embeddings(request: Request, model: Optional[str] = None):
+            payload = await request.json()
+            error = await self._simulate("llm")
+            if error is not None:
+                return error
+            inputs = payload.get("input", "")
+            if isinstance(inputs, str):
+                inputs = [inputs]
+            return {
+                "object": "list",
+                "model": model or payload.get("model", "fake-embedding"),
+                "data": [
+                    {"object": "embedding", "index": i, "embedding": _fake_embedding(str(text))}
+                    for i, text in enumerate(inputs)
+                ],
+                "usage": {"prompt_tokens": 10, "total_tokens": 10},
+            }
+
+        @app.post("/openai/chat/completions")
+        @app.post("/openai/v1/chat/completions")
+        async def openai_chat(request: Request):
+            return await chat_completions(request)
+
+        @app.post("/openai/openai/deployments/{deployment}/chat/completions")
+        async def azure_chat(deployment: str, request: Request):
+            return await chat_completions(request, deployment)
+
+        @app.post("/openai/embeddings")
+        @app.post("/openai/v1/embeddings")
+        async def openai_embeddings(request: Request):
+            return await embeddings(request)
+
+        @app.post("/openai/openai/deployments/{deployment}/embeddings")
+        async def azure_embeddings(deployment: str, request: Request):
+            return await embeddings(request, deployment)
+
+        # --- Stats ----------------------------------------------------------------------
+
+        @app.get("/stats")
+        async def get_stats():
+            return self.stats()
+
+        return app
+
+
+DEFAULT_PROFILES = {
+    "connector": "latency=0.02,jitter=0.01",
+    "token": "latency=0.03,jitter=0.01",
+    "backend": "latency=0.4,jitter=0.2,slow_rate=0.01,slow=2",
+    "auth": "latency=0.1,jitter=0.05",
+    "llm": "latency=0.3,jitter=0.1,chunk_delay=0.02",
+}
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser, defaults: Optional[Dict[str, str]] = None) -> None:
+    """Thêm option --<service> "<profile>" cho từng fake service"""
+    defaults = {**DEFAULT_PROFILES, **(defaults or {})}
+    for name in SERVICES:
+        parser.add_argument(
+            f"--{name}",
+            default=defaults[name],
+            help=f"Latency/error profile của fake {name} (mặc định: {defaults[name]})"
+        )
+
+
+def profiles_from_args(args: argparse.Namespace) -> Dict[str, LatencyProfile]:
+    return {name: parse_profile(getattr(args, name)) for name in SERVICES}
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake Bot Framework / Backend / OpenAI cho load test")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8390)
+    parser.add_argument("--session-ttl", type=float, default=300.0, help="Thời hạn session token Backend cấp (giây)")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    services = FakeServices(profiles_from_args(args), session_ttl=args.session_ttl)
+    base = f"http://{args.host}:{args.port}"
+    print(f"🧪 Fake services đang chạy trên {base}")
+    print(f"   serviceUrl cho activity: {base}/connector")
+    print(f"   LOADTEST_TOKEN_SERVICE_URL={base}/token (bot start bằng run_bot.py)")
+    print(f"   BACKEND_URL={base}/backend")
+    print(f"   AZURE_OPENAI_ENDPOINT / LITELLM_BASE_URL={base}/openai")
+    uvicorn.run(services.create_app(), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Latency / error profile cho fake services
+
+Profile được viết dạng chuỗi key=value, ví dụ:
+
+    latency=0.2,jitter=0.05,slow_rate=0.01,slow=3,error_rate=0.02,error_status=503
+
+- latency, jitter: thời gian phản hồi (giây) = latency ± jitter (phân phối đều)
+- slow_rate, slow: một phần request chậm thêm `slow` giây (mô phỏng tail latency)
+- error_rate, error_status: một phần request trả về status lỗi
+- timeout_rate: một phần request không bao giờ trả lời (client phải tự timeout)
+- chunk_delay: khoảng cách giữa các chunk khi stream (SSE)
+"""
+import asyncio
+import random
+from dataclasses import dataclass, fields
+from typing import Optional
+
+
+@dataclass
+class LatencyProfile:
+    """Hành vi của một fake service"""
+
+    latency: float = 0.0
+    jitter: float = 0.0
+    slow_rate: float = 0.0
+    slow: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 503
+    timeout_rate: float = 0.0
+    chunk_delay: float = 0.02
+
+    def delay(self) -> float:
+        """Thời gian chờ cho một request"""
+        value = self.latency
+        if self.jitter:
+            value += random.uniform(-self.jitter, self.jitter)
+        if self.slow_rate and random.random() < self.slow_rate:
+            value += self.slow
+        return max(0.0, value)
+
+    def error(self) -> Optional[int]:
+        """Status lỗi cần trả về cho request này, hoặc None"""
+        if self.error_rate and random.random() < self.error_rate:
+            return self.error_status
+        return None
+
+    async def wait(self) -> None:
+        """Chờ theo profile; với request "timeout" thì treo gần như vô hạn"""
+        if self.timeout_rate and random.random() < self.timeout_rate:
+            await asyncio.sleep(3600)
+        delay = self.delay()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+def parse_profile(spec: str) -> LatencyProfile:
+    """
+    Parse profile từ chuỗi "key=value,key=value"
+
+    Raises:
+        ValueError: Key không hợp lệ hoặc value không phải số
+    """
+    profile = LatencyProfile()
+    if not spec:
+        return profile
+    types = {f.name: f.type for f in fields(LatencyProfile)}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        key, sep, value = item.partition("=")
+        key = key.strip()
+        if not sep or key not in types:
+            raise ValueError(f"Profile không hợp lệ: '{item}' (key hợp lệ: {', '.join(types)})")
+        cast = int if types[key] in (int, "int") else float
+        setattr(profile, key, cast(value))
+    return profile
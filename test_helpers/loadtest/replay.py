@@ -0,0 +1,441 @@
+"""
+Trace replay benchmark
+
+Replay trace ẩn danh (ghi bởi bot khi bật TRACE_CAPTURE_PATH, xem src/trace_capture.py,
+hoặc sinh bằng `synth`) vào bot chạy với fake services:
+
+- activity được gửi đúng thời điểm trong trace (chia cho --speed), các lượt của cùng
+  conversation được gửi tuần tự theo thứ tự trong trace
+- câu hỏi là text ngẫu nhiên có seed với đúng độ dài đã ghi
+- fake Backend trả lời mỗi câu hỏi với latency / lỗi đã ghi trong trace
+
+Report (JSON) gồm latency p50/p95/p99 theo handler, số lời gọi ra ngoài (connector, token,
+Backend, auth, LLM), RSS của bot và stats của conversation_store trước/sau replay.
+So sánh hai report bằng compare.py để bắt regression giữa các release:
+
+    python -m test_helpers.loadtest.replay synth --out traces/synthetic.jsonl --conversations 300 --seed 7
+    python -m test_helpers.loadtest.replay run traces/synthetic.jsonl --spawn-bot --out bench-new.json
+    python -m test_helpers.loadtest.compare bench-old.json bench-new.json
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+REPO_ROOT = Path(__file__).resolve().parent.parent.parent
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from test_helpers.loadtest.driver import (
+    AUTH_COMMANDS,
+    FakeServicesThread,
+    LoadDriver,
+    bot_env,
+    build_activity,
+    print_report,
+    spawn_bot,
+    summarize,
+    wait_for_bot,
+)
+from test_helpers.loadtest.fake_services import FakeServices, add_profile_arguments, profiles_from_args
+
+TRACE_VERSION = 1
+
+# Từ vựng để sinh câu hỏi giả có độ dài bằng câu hỏi thật
+VOCABULARY = (
+    "ngày phép năm nghỉ ốm chính sách lương thưởng bảo hiểm hợp đồng thử việc đào tạo "
+    "làm thêm giờ công tác phí quy trình đăng ký phê duyệt quản lý nhân viên phúc lợi "
+    "thâm niên nghỉ thai sản chấm công làm việc từ xa phụ cấp đánh giá hiệu suất"
+).split()
+
+# Outcome trong trace → status fake Backend trả về khi replay
+OUTCOME_STATUS = {
+    "backend_error": 503,
+    "authentication_error": 401,
+}
+
+# Profile không có jitter / lỗi ngẫu nhiên để các lần replay so sánh được với nhau
+# (latency Backend lấy từ trace)
+REPLAY_PROFILES = {
+    "connector": "latency=0.02",
+    "token": "latency=0.03",
+    "backend": "latency=0.5",
+    "auth": "latency=0.1",
+    "llm": "latency=0.3,chunk_delay=0.02",
+}
+
+# Metric của bot được ghi vào report (prefix của sample trong /metrics)
+BOT_METRIC_PREFIXES = (
+    "bot_conversation_store_",
+    "bot_backend_client_",
+    "bot_backend_single_flight_",
+    "bot_answer_cache_",
+    "bot_backend_session_",
+    "bot_requests_total",
+)
+
+_SAMPLE_LINE = re.compile(r"^([a-zA-Z_:][a-zA-Z0-9_:]*(?:\{[^}]*\})?) (\S+)$")
+
+
+def load_trace(path: str) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """Đọc trace JSON lines: (header, message events sắp xếp theo thời gian)"""
+    header: Dict[str, Any] = {}
+    events: List[Dict[str, Any]] = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if record.get("type") == "header":
+                # File có thể gồm nhiều lần capture nối tiếp, giữ header đầu tiên
+                header = header or record
+            elif record.get("type") == "message":
+                events.append(record)
+    if header.get("version", TRACE_VERSION) > TRACE_VERSION:
+        raise ValueError(f"Trace version {header['version']} mới hơn version replay hỗ trợ ({TRACE_VERSION})")
+    events.sort(key=lambda e: e.get("t", 0.0))
+    return header, events
+
+
+def synthesize_trace(
+    conversations: int,
+    duration: float,
+    seed: int,
+    mean_turns: float = 3.0,
+    think_time: float = 8.0,
+    auth_rate: float = 0.05,
+    backend_median: float = 0.6,
+    backend_error_rate: float = 0.01,
+) -> List[Dict[str, Any]]:
+    """
+    Sinh trace tổng hợp có seed: conversation bắt đầu đều trong `duration` giây,
+    số lượt theo phân phối hình học, độ dài câu hỏi và latency Backend theo log-normal
+    """
+    rng = random.Random(seed)
+    events: List[Dict[str, Any]] = []
+    for c in range(conversations):
+        conversation = hashlib.sha256(f"{seed}-conversation-{c}".encode()).hexdigest()[:16]
+        user = hashlib.sha256(f"{seed}-user-{c}".encode()).hexdigest()[:16]
+        t = rng.uniform(0, duration)
+        turns = 1
+        while rng.random() > 1.0 / mean_turns:
+            turns += 1
+        for turn in range(turns):
+            handler = "auth" if turn == 0 and rng.random() < auth_rate else "hr"
+            chars = 4 if handler == "auth" else int(min(500, max(8, rng.lognormvariate(math.log(60), 0.6))))
+            event: Dict[str, Any] = {
+                "type": "message",
+                "t": round(t, 4),
+                "handler": handler,
+                "user": user,
+                "conversation": conversation,
+                "turn": turn,
+                "query_chars": chars,
+                "query_words": max(1, chars // 6),
+                "outcome": "ok",
+            }
+            if handler == "hr":
+                if rng.random() < backend_error_rate:
+                    event["outcome"] = "backend_error"
+                else:
+                    event["backend_seconds"] = round(rng.lognormvariate(math.log(backend_median), 0.5), 4)
+            events.append(event)
+            t += rng.expovariate(1.0 / think_time)
+    events.sort(key=lambda e: e["t"])
+    return events
+
+
+def write_trace(path: str, events: List[Dict[str, Any]], **header_fields: Any) -> None:
+    header = {
+        "type": "header",
+        "version": TRACE_VERSION,
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        **header_fields,
+    }
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(header) + "\n")
+        for event in events:
+            f.write(json.dumps(event) + "\n")
+
+
+def synthetic_text(rng: random.Random, chars: int) -> str:
+    """Câu hỏi giả dài đúng `chars` ký tự"""
+    words: List[str] = []
+    length = 0
+    while length < chars:
+        word = rng.choice(VOCABULARY)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)[:max(1, chars)].strip() + "?"
+
+
+def parse_metrics(text: str) -> Dict[str, float]:
+    """Sample của Prometheus text format (bỏ bucket của histogram)"""
+    samples: Dict[str, float] = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#") or "_bucket{" in line:
+            continue
+        match = _SAMPLE_LINE.match(line)
+        if match:
+            try:
+                samples[match.group(1)] = float(match.group(2))
+            except ValueError:
+                continue
+    return samples
+
+
+def process_rss_kb(pid: int) -> Optional[int]:
+    """RSS của process (Linux /proc), None nếu không đọc được"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=str(REPO_ROOT), capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class TraceReplayer:
+    """Replay message events của trace vào bot qua LoadDriver"""
+
+    def __init__(
+        self,
+        driver: LoadDriver,
+        fakes: FakeServices,
+        events: List[Dict[str, Any]],
+        seed: int,
+        speed: float,
+    ):
+        self.driver = driver
+        self.events = events
+        self.speed = speed
+        rng = random.Random(seed)
+        self._texts = [
+            rng.choice(AUTH_COMMANDS) if event.get("handler") == "auth" else synthetic_text(rng, int(event.get("query_chars", 40)))
+            for event in events
+        ]
+        latencies = sorted(e["backend_seconds"] for e in events if e.get("backend_seconds") is not None)
+        # Câu hỏi không có latency trong trace (cache hit, lỗi trước khi gọi Backend) dùng median
+        self._default_backend_seconds = latencies[len(latencies) // 2] if latencies else 0.5
+        self._backend_behaviour: Dict[str, Tuple[float, Optional[int]]] = {}
+        for event, text in zip(events, self._texts):
+            if event.get("handler") == "hr":
+                self._backend_behaviour[text] = (
+                    float(event.get("backend_seconds") or self._default_backend_seconds),
+                    OUTCOME_STATUS.get(event.get("outcome", "ok")),
+                )
+        fakes.response_override = self.backend_override
+
+    def backend_override(self, service: str, payload: Dict[str, Any]) -> Optional[Tuple[float, Optional[int]]]:
+        if service != "backend":
+            return None
+        return self._backend_behaviour.get(payload.get("query", ""))
+
+    async def run(self, client: httpx.AsyncClient) -> float:
+        locks: Dict[str, asyncio.Lock] = {}
+        started = time.perf_counter()
+
+        async def replay(index: int, event: Dict[str, Any]) -> None:
+            delay = started + float(event.get("t", 0.0)) / self.speed - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            conversation = event.get("conversation") or f"single-{index}"
+            lock = locks.setdefault(conversation, asyncio.Lock())
+            async with lock:
+                conversation_id = f"replay-conv-{conversation}"
+                user_id = f"replay-user-{event.get('user') or conversation}"
+                activity = build_activity(self.driver.service_url, conversation_id, user_id, self._texts[index])
+                await self.driver.send_activity(client, event.get("handler", "hr"), conversation_id, activity)
+
+        await asyncio.gather(*(replay(i, e) for i, e in enumerate(self.events)))
+        return time.perf_counter() - started
+
+
+async def scrape_bot_metrics(bot_url: str) -> Dict[str, float]:
+    try:
+        async with httpx.AsyncClient(timeout=5.0) as client:
+            # Bot có ADMIN_TOKEN → /metrics cần token, nếu không chỉ cho client trên loopback
+            admin_token = os.environ.get("ADMIN_TOKEN")
+            headers = {"Authorization": f"Bearer {admin_token}"} if admin_token else None
+            response = await client.get(f"{bot_url.rstrip('/')}/metrics", headers=headers)
+            response.raise_for_status()
+    except httpx.HTTPError:
+        return {}
+    return {
+        name: value for name, value in parse_metrics(response.text).items()
+        if name.startswith(BOT_METRIC_PREFIXES)
+    }
+
+
+def run_replay(args: argparse.Namespace) -> None:
+    header, events = load_trace(args.trace)
+    if args.max_events:
+        events = events[:args.max_events]
+    if not events:
+        raise SystemExit(f"Trace {args.trace} không có message event")
+    with open(args.trace, "rb") as f:
+        trace_sha256 = hashlib.sha256(f.read()).hexdigest()
+
+    random.seed(args.seed)
+    fakes = FakeServices(profiles_from_args(args))
+    fakes_thread = FakeServicesThread(fakes, args.fakes_host, args.fakes_port)
+    driver = LoadDriver(
+        bot_url=args.bot_url,
+        service_url=f"{fakes_thread.base_url}/connector",
+        mix=[("hr", 1.0)],
+        users=1,
+        reply_timeout=args.reply_timeout,
+        distinct_queries=1,
+    )
+    fakes.activity_listener = driver.on_connector_activity
+    replayer = TraceReplayer(driver, fakes, events, seed=args.seed, speed=args.speed)
+
+    fakes_thread.start()
+    bot_process = None
+    try:
+        if args.spawn_bot:
+            env = bot_env(fakes_thread.base_url, httpx.URL(args.bot_url).port or 3978)
+            bot_process = spawn_bot(env, Path(args.bot_log))
+            print(f"🚀 Đã start bot (pid {bot_process.pid}), log: {args.bot_log}")
+        asyncio.run(wait_for_bot(args.bot_url, 60.0, bot_process))
+
+        metrics_before = asyncio.run(scrape_bot_metrics(args.bot_url))
+        rss_before = process_rss_kb(bot_process.pid) if bot_process else None
+        print(f"▶️  Replay {len(events)} message ({args.trace}), speed x{args.speed}")
+
+        async def replay() -> float:
+            limits = httpx.Limits(max_connections=args.max_connections)
+            timeout = httpx.Timeout(args.reply_timeout, connect=10.0)
+            async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+                return await replayer.run(client)
+
+        duration = asyncio.run(replay())
+        metrics_after = asyncio.run(scrape_bot_metrics(args.bot_url))
+        rss_after = process_rss_kb(bot_process.pid) if bot_process else None
+    finally:
+        if bot_process is not None:
+            bot_process.terminate()
+            try:
+                bot_process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                bot_process.kill()
+        fakes_thread.stop()
+
+    report = summarize(driver.results, duration)
+    fake_stats = fakes.stats()
+    report["benchmark"] = {
+        "trace": args.trace,
+        "trace_sha256": trace_sha256,
+        "trace_started_at": header.get("started_at"),
+        "events": len(events),
+        "speed": args.speed,
+        "seed": args.seed,
+        "git_revision": git_revision(),
+        "run_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+    report["outbound_calls"] = {
+        service: {**stats, "per_message": stats["requests"] / len(events)}
+        for service, stats in fake_stats.items()
+    }
+    report["memory"] = {
+        "rss_before_kb": rss_before,
+        "rss_after_kb": rss_after,
+        "rss_growth_kb": rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+        "conversation_store": {
+            name: value for name, value in metrics_after.items()
+            if name.startswith("bot_conversation_store_")
+        },
+    }
+    report["bot_metrics_delta"] = {
+        name: value - metrics_before.get(name, 0.0) for name, value in metrics_after.items()
+    }
+
+    print_report(report)
+    calls = ", ".join(f"{s}={v['requests']} ({v['per_message']:.2f}/msg)" for s, v in report["outbound_calls"].items())
+    print(f"   Outbound: {calls}")
+    memory = report["memory"]
+    if memory["rss_growth_kb"] is not None:
+        print(f"   RSS bot: {memory['rss_before_kb']} KB → {memory['rss_after_kb']} KB (+{memory['rss_growth_kb']} KB)")
+
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False, sort_keys=True)
+    print(f"   Đã ghi benchmark report: {args.out}")
+
+
+def run_synth(args: argparse.Namespace) -> None:
+    events = synthesize_trace(
+        conversations=args.conversations,
+        duration=args.duration,
+        seed=args.seed,
+        mean_turns=args.mean_turns,
+        think_time=args.think_time,
+        backend_median=args.backend_median,
+        backend_error_rate=args.backend_error_rate,
+    )
+    write_trace(args.out, events, synthetic=True, seed=args.seed)
+    print(f"✅ Đã sinh trace {args.out}: {len(events)} message, {args.conversations} conversation")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay trace traffic vào bot để benchmark")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    synth = subparsers.add_parser("synth", help="Sinh trace tổng hợp có seed")
+    synth.add_argument("--out", required=True)
+    synth.add_argument("--conversations", type=int, default=200)
+    synth.add_argument("--duration", type=float, default=60.0, help="Khoảng thời gian các conversation bắt đầu (giây)")
+    synth.add_argument("--mean-turns", type=float, default=3.0)
+    synth.add_argument("--think-time", type=float, default=8.0, help="Thời gian trung bình giữa hai lượt (giây)")
+    synth.add_argument("--backend-median", type=float, default=0.6, help="Median latency Backend (giây)")
+    synth.add_argument("--backend-error-rate", type=float, default=0.01)
+    synth.add_argument("--seed", type=int, default=1)
+    synth.set_defaults(func=run_synth)
+
+    run = subparsers.add_parser("run", help="Replay trace vào bot và ghi benchmark report")
+    run.add_argument("trace")
+    run.add_argument("--out", required=True, help="File JSON của benchmark report")
+    run.add_argument("--bot-url", default="http://127.0.0.1:3978")
+    run.add_argument("--spawn-bot", action="store_true", help="Tự start bot (run_bot.py) với env trỏ tới fake services")
+    run.add_argument("--bot-log", default="replay-bot.log")
+    run.add_argument("--fakes-host", default="127.0.0.1")
+    run.add_argument("--fakes-port", type=int, default=8390)
+    run.add_argument("--speed", type=float, default=1.0, help="Replay nhanh hơn N lần so với trace")
+    run.add_argument("--max-events", type=int, default=None)
+    run.add_argument("--max-connections", type=int, default=500)
+    run.add_argument("--reply-timeout", type=float, default=60.0)
+    run.add_argument("--seed", type=int, default=1, help="Seed sinh câu hỏi (giữ cố định giữa các lần so sánh)")
+    add_profile_arguments(run, REPLAY_PROFILES)
+    run.set_defaults(func=run_replay)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Start bot cho load test
+
+Giống `python src/app.py`, nhưng request tới Bot Framework token service được chuyển
+sang fake token service (LOADTEST_TOKEN_SERVICE_URL). SDK hardcode URL
+https://token.botframework.com và client của từng activity không giữ interceptor,
+nên việc chuyển hướng được làm ở tầng httpx - chỉ trong process load test này.
+
+    LOADTEST_TOKEN_SERVICE_URL=http://127.0.0.1:8390/token python test_helpers/loadtest/run_bot.py
+"""
+import os
+import runpy
+import sys
+from pathlib import Path
+
+import httpx
+
+SRC_DIR = Path(__file__).resolve().parent.parent.parent / "src"
+
+TOKEN_SERVICE_HOST = "token.botframework.com"
+
+
+def redirect_token_service(target_url: str) -> None:
+    """Mọi request httpx tới token.botframework.com được gửi tới `target_url`"""
+    target = httpx.URL(target_url.rstrip("/"))
+    original_send = httpx.AsyncClient.send
+
+    async def send(self, request: httpx.Request, **kwargs):
+        if request.url.host == TOKEN_SERVICE_HOST:
+            request.url = request.url.copy_with(
+                scheme=target.scheme,
+                host=target.host,
+                port=target.port,
+                path=target.path.rstrip("/") + request.url.path,
+            )
+            request.headers["Host"] = target.netloc.decode("ascii")
+        return await original_send(self, request, **kwargs)
+
+    httpx.AsyncClient.send = send
+
+
+def main():
+    token_service_url = os.environ.get("LOADTEST_TOKEN_SERVICE_URL")
+    if token_service_url:
+        redirect_token_service(token_service_url)
+        print(f"🧪 Bot Framework token service → {token_service_url}")
+
+    sys.path.insert(0, str(SRC_DIR))
+    runpy.run_path(str(SRC_DIR / "app.py"), run_name="__main__")
+
+
+if __name__ == "__main__":
+    main()
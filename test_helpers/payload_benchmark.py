@@ -0,0 +1,159 @@
+"""
+Microbenchmark encode/decode payload của Backend
+
+So sánh đường cũ (httpx `json=` + `response.json()` + dò `.get()` trên dict như answer cache,
+single flight và handler từng làm) với đường mới (json_codec + HRQueryResponse), và chi phí /
+kích thước khi nén body bằng gzip / br
+
+    python test_helpers/payload_benchmark.py
+    python test_helpers/payload_benchmark.py --sources 10 --answer-chars 4000 --number 20000
+"""
+import argparse
+import gzip
+import json
+import sys
+import timeit
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import json_codec  # noqa: E402
+from backend_models import HRQueryResponse  # noqa: E402
+
+ANSWER_SENTENCE = (
+    "Theo chính sách nhân sự hiện hành, nhân viên chính thức có 12 ngày phép năm, "
+    "cộng thêm 1 ngày cho mỗi 5 năm thâm niên. "
+)
+
+
+def build_payloads(answer_chars: int, sources: int) -> Tuple[Dict[str, Any], bytes]:
+    """(request payload HR query, response body JSON) giống Backend thật"""
+    request = {
+        "query": "Tôi còn bao nhiêu ngày phép năm nay và quy trình xin nghỉ như thế nào?",
+        "user_id": "29:1a2b3c4d5e6f7a8b9c0d1e2f3a4b5c6d7e8f9a0b1c2d3e4f5a6b7c8d9e0f1a2b",
+        "conversation_id": "a:1x2y3z4w5v6u7t8s9r0q1p2o3n4m5l6k7j8i9h0g1f2e3d4c5b6a7",
+        "include_sources": True,
+        "include_metadata": True,
+    }
+    answer = (ANSWER_SENTENCE * (answer_chars // len(ANSWER_SENTENCE) + 1))[:answer_chars]
+    response = {
+        "answer": answer,
+        "conversation_id": request["conversation_id"],
+        "sources": [
+            {
+                "document_title": f"Sổ tay nhân sự 2025 - chương {i + 1}",
+                "document_id": f"doc-{i:04d}",
+                "url": f"https://hr.example.com/handbook/{i + 1}",
+                "page": i + 3,
+                "score": 0.91 - i * 0.03,
+                "snippet": answer[:200],
+            }
+            for i in range(sources)
+        ],
+        "metadata": {
+            "cacheable": True,
+            "cache_scope": "tenant",
+            "cache_ttl": 900,
+            "model": "hr-rag-v3",
+            "latency_ms": 412,
+            "retrieved_chunks": sources * 3,
+        },
+    }
+    body = json.dumps(response, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return request, body
+
+
+def _old_cache_policy(response: Dict[str, Any]) -> Tuple[Optional[str], Optional[float]]:
+    metadata = response.get("metadata") or {}
+    cacheable = metadata.get("cacheable", response.get("cacheable"))
+    scope = metadata.get("cache_scope", response.get("cache_scope"))
+    ttl = metadata.get("cache_ttl", response.get("cache_ttl"))
+    if cacheable is False or scope == "none":
+        return None, None
+    return scope, float(ttl) if ttl is not None else None
+
+
+def _new_cache_policy(response: HRQueryResponse) -> Tuple[Optional[str], Optional[float]]:
+    if response.cacheable is False or response.cache_scope == "none":
+        return None, None
+    return response.cache_scope, float(response.cache_ttl) if response.cache_ttl is not None else None
+
+
+def old_path(request: Dict[str, Any], body: bytes) -> str:
+    # httpx json= (stdlib), response.json(), cache policy đọc 3 lần (answer cache, semantic cache, single flight)
+    json.dumps(request, ensure_ascii=False, separators=(",", ":"), allow_nan=False).encode("utf-8")
+    response = json.loads(body)
+    for _ in range(3):
+        _old_cache_policy(response)
+    titles = [source.get("document_title", "Document") for source in response.get("sources", [])[:3]]
+    return response.get("answer", "") + "".join(titles)
+
+
+def new_path(request: Dict[str, Any], body: bytes) -> str:
+    json_codec.dumps(request)
+    response = HRQueryResponse.from_json(body)
+    for _ in range(3):
+        _new_cache_policy(response)
+    titles = [source.document_title or "Document" for source in response.sources[:3]]
+    return (response.answer or "") + "".join(titles)
+
+
+def _bench(fn: Callable[[], Any], number: int) -> float:
+    """µs mỗi lần gọi (lấy lần nhanh nhất trong 5 lần đo)"""
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+
+def compression_rows(label: str, data: bytes, number: int) -> List[Tuple[str, int, float, float]]:
+    """(tên, số byte sau nén, µs nén, µs giải nén)"""
+    rows = [(f"{label} raw", len(data), 0.0, 0.0)]
+    compressed = gzip.compress(data, compresslevel=6)
+    rows.append((
+        f"{label} gzip",
+        len(compressed),
+        _bench(lambda: gzip.compress(data, compresslevel=6), number),
+        _bench(lambda: gzip.decompress(compressed), number),
+    ))
+    try:
+        import brotli
+    except ImportError:
+        return rows
+    compressed = brotli.compress(data, quality=5)
+    rows.append((
+        f"{label} br",
+        len(compressed),
+        _bench(lambda: brotli.compress(data, quality=5), number),
+        _bench(lambda: brotli.decompress(compressed), number),
+    ))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark encode/decode payload của Backend")
+    parser.add_argument("--answer-chars", type=int, default=1500, help="Độ dài answer")
+    parser.add_argument("--sources", type=int, default=5, help="Số source trong response")
+    parser.add_argument("--number", type=int, default=10000, help="Số lần gọi mỗi lần đo")
+    args = parser.parse_args()
+
+    request, body = build_payloads(args.answer_chars, args.sources)
+    assert old_path(request, body) == new_path(request, body)
+
+    old_us = _bench(lambda: old_path(request, body), args.number)
+    new_us = _bench(lambda: new_path(request, body), args.number)
+    print(f"🧪 Response {len(body)} byte, {args.sources} source, codec: {json_codec.CODEC}\n")
+    print(f"{'path':<40} {'µs/request':>11}")
+    print(f"{'httpx json + dict.get() (cũ)':<40} {old_us:>11.2f}")
+    print(f"{'json_codec + HRQueryResponse (mới)':<40} {new_us:>11.2f}")
+    print(f"{'speedup':<40} {old_us / new_us:>10.2f}x\n")
+
+    print(f"{'body':<24} {'byte':>8} {'nén µs':>9} {'giải nén µs':>12}")
+    request_body = json_codec.dumps(request)
+    for name, size, compress_us, decompress_us in (
+        compression_rows("request", request_body, args.number // 10)
+        + compression_rows("response", body, args.number // 10)
+    ):
+        print(f"{name:<24} {size:>8} {compress_us:>9.1f} {decompress_us:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
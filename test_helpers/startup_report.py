@@ -0,0 +1,154 @@
+"""
+Báo cáo thời gian khởi động của bot
+
+- Import time: chạy `python -X importtime -c "import app"` và gộp theo package
+- Startup: start `python src/app.py`, đo thời gian tới khi port nhận connection (listener bound)
+  và tới khi HTTP trả lời (app sẵn sàng), kèm phase do bot tự đo (`bot_startup_*` ở /metrics)
+
+    python test_helpers/startup_report.py --top 15
+    python test_helpers/startup_report.py --serve --port 3999
+"""
+import argparse
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+
+# Đủ để app.py import được khi chưa cấu hình LLM (không gọi ra ngoài lúc start)
+PLACEHOLDER_ENV = {
+    "AZURE_OPENAI_API_KEY": "startup-report",
+    "AZURE_OPENAI_ENDPOINT": "http://127.0.0.1:9",
+}
+
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$")
+
+
+def bot_env(extra: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    env = dict(os.environ)
+    has_llm = env.get("AZURE_OPENAI_API_KEY") or env.get("LITELLM_API_KEY")
+    if not has_llm:
+        env.update(PLACEHOLDER_ENV)
+    env.update(extra or {})
+    return env
+
+
+def measure_imports(module: str = "app") -> List[Tuple[str, int, int, int]]:
+    """(module, self µs, cumulative µs, độ sâu) theo output của -X importtime"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SRC_DIR,
+        env=bot_env(),
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Import {module} lỗi:\n{result.stderr[-2000:]}")
+    rows = []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return rows
+
+
+def print_import_report(rows: List[Tuple[str, int, int, int]], top: int) -> None:
+    total_us = sum(self_us for _, self_us, _, _ in rows)
+    first_party = {path.stem for path in SRC_DIR.glob("*.py")}
+
+    by_package: Dict[str, int] = defaultdict(int)
+    for name, self_us, _, _ in rows:
+        by_package[name.split(".")[0] if name.split(".")[0] != "microsoft" else ".".join(name.split(".")[:3])] += self_us
+
+    print(f"📦 Tổng import time: {total_us / 1000:.0f} ms ({len(rows)} module)\n")
+    print(f"{'package':<32} {'self ms':>9} {'%':>6}")
+    for package, self_us in sorted(by_package.items(), key=lambda item: -item[1])[:top]:
+        print(f"{package:<32} {self_us / 1000:>9.1f} {self_us / total_us * 100:>5.1f}%")
+
+    print(f"\n{'module của bot (src/)':<32} {'cumulative ms':>14}")
+    own = [(name, cumulative_us) for name, _, cumulative_us, _ in rows if name in first_party]
+    for name, cumulative_us in sorted(own, key=lambda item: -item[1])[:top]:
+        print(f"{name:<32} {cumulative_us / 1000:>14.1f}")
+
+
+def _port_open(port: int) -> bool:
+    try:
+        with socket.create_connection(("127.0.0.1", port), timeout=0.05):
+            return True
+    except OSError:
+        return False
+
+
+def _http_ready(url: str) -> Optional[str]:
+    try:
+        with urllib.request.urlopen(url, timeout=0.5) as response:
+            return response.read().decode("utf-8")
+    except (urllib.error.URLError, OSError):
+        return None
+
+
+def measure_startup(port: int, timeout: float) -> None:
+    """Start bot, đo thời gian tới lúc port mở và lúc /metrics trả lời"""
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, str(SRC_DIR / "app.py")],
+        cwd=SRC_DIR,
+        env=bot_env({"PORT": str(port)}),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    listening: Optional[float] = None
+    metrics: Optional[str] = None
+    try:
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"Bot đã dừng (exit code {process.returncode})")
+            if listening is None and _port_open(port):
+                listening = time.perf_counter() - started
+            if listening is not None:
+                metrics = _http_ready(f"http://127.0.0.1:{port}/metrics")
+                if metrics is not None:
+                    break
+            time.sleep(0.02)
+        ready = time.perf_counter() - started
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    if metrics is None:
+        raise RuntimeError(f"Bot không sẵn sàng sau {timeout:.0f}s")
+    print(f"🚀 Port nhận connection sau: {listening * 1000:.0f} ms")
+    print(f"✅ HTTP sẵn sàng sau:        {ready * 1000:.0f} ms\n")
+    for line in metrics.splitlines():
+        if line.startswith("bot_startup_"):
+            print(f"   {line}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Báo cáo import time / startup time của bot")
+    parser.add_argument("--top", type=int, default=15, help="Số package/module hiển thị")
+    parser.add_argument("--serve", action="store_true", help="Start bot thật và đo thời gian tới khi sẵn sàng")
+    parser.add_argument("--port", type=int, default=3999)
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    print_import_report(measure_imports(), args.top)
+    if args.serve:
+        print()
+        measure_startup(args.port, args.timeout)
+
+
+if __name__ == "__main__":
+    main()
@@ -99,7 +99,7 @@ async def test_model():
         from microsoft.teams.ai import ChatPrompt
         
         # Sử dụng model từ app_module
-        chat_prompt = ChatPrompt(app_module.model)
+        chat_prompt = ChatPrompt(app_module.get_model())
         test_input = "Xin chào, bạn có thể trả lời 'OK' không?"
         
         print(f"📤 Gửi test message: '{test_input}'")
@@ -130,7 +130,7 @@ async def test_app_start():
     try:
         print("\n🔄 Đang kiểm tra app configuration...")
         print(f"  ✅ App đã được khởi tạo: {app_module.app is not None}")
-        print(f"  ✅ Model đã được khởi tạo: {app_module.model is not None}")
+        print(f"  ✅ Model đã được khởi tạo: {app_module.get_model() is not None}")
         print(f"  ✅ Port: {Config().PORT}")
         
         print("\n💡 Để chạy bot:")